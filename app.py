@@ -1,6 +1,7 @@
+import argparse
 import json
 import ollama
-import re
+import requests
 import sys
 import os
 
@@ -8,33 +9,67 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from mcp_client.client import MCPClient
+from chat_pipeline import tracing
+from chat_pipeline.answer_cache import SemanticAnswerCache
+from chat_pipeline.batch import BatchRunner
+from chat_pipeline.direct_answer import DirectAnswerPolicy
+from chat_pipeline.engine import ChatContext, ChatEngine, SyncDriver
+from chat_pipeline.models import ModelRoles
+from chat_pipeline.prompts import PromptBuilder
+from chat_pipeline.router import RulesRouter
+from chat_pipeline.scheduler import FairScheduler, PRIORITY_BATCH, QueueFullError
+from chat_pipeline.timings import TimingLog
 import asyncio
 
-def extract_json_from_response(response_text):
-    """Extract JSON object from response text that may contain other content"""
-    try:
-        # Remove any thinking tags or extra content
-        cleaned_text = re.sub(r'<Thinking>.*?</Thinking>', '', response_text, flags=re.DOTALL | re.IGNORECASE)
-        cleaned_text = re.sub(r'<Thinking>.*?</Thinking>', '', cleaned_text, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Try to find JSON object in the response
-        json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-        matches = re.findall(json_pattern, cleaned_text)
-        
-        for match in matches:
-            try:
-                parsed = json.loads(match)
-                # Check if it's a tool call JSON
-                if "tool_name" in parsed and "parameters" in parsed:
-                    return parsed
-            except json.JSONDecodeError:
-                continue
-        
-        return None
-    except Exception:
-        return None
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI Assistant: interactive chat, or batch answering with --batch")
+    parser.add_argument("--batch", metavar="QUESTIONS_JSONL", help="Answer every question of a JSONL file instead of chatting")
+    parser.add_argument("--output", help="Answers file (default: <questions>.answers.jsonl)")
+    parser.add_argument("--concurrency", type=int, help="Questions answered at once (default: scheduler.max_concurrent)")
+    parser.add_argument("--url", help="Send the questions to a running web app (e.g. http://localhost:5000) with batch priority")
+    parser.add_argument("--restart", action="store_true", help="Ignore answers already in the output file and start over")
+    return parser.parse_args()
+
+def web_app_answerer(url):
+    """Answer questions through a running web app's /api/chat, behind its interactive users"""
+    def answer(question, question_id):
+        response = requests.post(
+            f"{url.rstrip('/')}/api/chat",
+            json={"message": question, "sessionId": "batch", "priority": "batch"},
+            timeout=600
+        )
+        data = response.json()
+        if response.status_code == 503:
+            raise QueueFullError(data.get("error", "Server is busy"))
+        if response.status_code != 200:
+            raise Exception(data.get("error", f"HTTP {response.status_code}"))
+        return data
+    return answer
+
+def pipeline_answerer(pipeline):
+    """Answer questions in this process, at batch priority in its own scheduler"""
+    def answer(question, question_id):
+        done = None
+        for event in pipeline.events(ChatContext(question, session_id="batch", priority=PRIORITY_BATCH)):
+            if event["type"] == "done":
+                done = event
+        return done
+    return answer
+
+def run_batch(args, answer, concurrency):
+    output_path = args.output or os.path.splitext(args.batch)[0] + ".answers.jsonl"
+    print(f"📦 Answering {args.batch} → {output_path} ({concurrency} at a time)")
+    summary = BatchRunner(answer, concurrency).run(args.batch, output_path, resume=not args.restart)
+    print("=" * 60)
+    print(f"✅ {summary['answered']} answered, ❌ {summary['failed']} failed, ⏩ {summary['skipped']} already done")
+    print(f"📄 {output_path}: {summary['output_answered']} answered, {summary['output_failed']} failed")
+    print(f"⏱️ {summary['elapsed_seconds']}s, {summary['questions_per_minute']} questions/min"
+          + (f", p50 {summary['latency_p50_ms']:.0f}ms, p95 {summary['latency_p95_ms']:.0f}ms" if 'latency_p50_ms' in summary else ""))
+    if summary["interrupted"] or summary["failed"]:
+        print("🔁 Run the same command again to answer the remaining questions")
 
 async def main():
+    args = parse_args()
     print("🚀 Starting AI Application with Ollama + Qwen3")
     print("=" * 60)
     
@@ -43,15 +78,27 @@ async def main():
         with open("config/config.json", "r") as f:
             config = json.load(f)
         print("✅ Configuration loaded")
+        tracing.configure(config.get("tracing"), "cli", os.path.dirname(os.path.abspath(__file__)))
     except Exception as e:
         print(f"❌ Failed to load config: {str(e)}")
         return
 
+    concurrency = args.concurrency or config.get("scheduler", {}).get("max_concurrent", 2)
+    if args.batch and args.url:
+        run_batch(args, web_app_answerer(args.url), concurrency)
+        return
+
     # Initialize MCP client
     try:
         mcp_client = MCPClient(config["mcp_server"]["host"])
         tools = mcp_client.get_tools()
         tool_descriptions = "\n".join([f"- {t['name']}: {t['description']}" for t in tools])
+        prompt_builder = PromptBuilder()
+        direct_answers = DirectAnswerPolicy(config.get("direct_answers"))
+        rules_router = RulesRouter(
+            [t["name"] for t in tools],
+            enabled=config.get("router", {}).get("rules_enabled", True)
+        )
         print("✅ Connected to MCP server successfully!")
     except Exception as e:
         print(f"❌ Failed to connect to MCP server: {str(e)}")
@@ -61,7 +108,8 @@ async def main():
     # Configure Ollama
     try:
         ollama_client = ollama.Client(host=config["ollama"]["host"])
-        model = config["ollama"]["model"]
+        model_roles = ModelRoles(config["ollama"])
+        model = model_roles.model("answer")
         
         # Test Ollama connection
         test_response = ollama_client.chat(
@@ -79,13 +127,19 @@ async def main():
         print("3. Run setup: python setup.py")
         return
 
-    ollama_options = {
-        "temperature": config["ollama"]["temperature"],
-        "top_p": config["ollama"]["top_p"],
-        "top_k": config["ollama"]["top_k"],
-        "num_ctx": config["ollama"]["num_ctx"],
-        "num_predict": config["ollama"]["num_predict"]
-    }
+    if args.batch:
+        # Like the web app: scheduler in front of Ollama, answer cache for repeated questions
+        engine = ChatEngine(
+            config, prompt_builder, model_roles, rules_router, direct_answers,
+            SemanticAnswerCache(config.get("answer_cache")), timing_log=TimingLog(config.get("timings"))
+        )
+        scheduler = FairScheduler.from_config(config.get("scheduler"))
+        run_batch(args, pipeline_answerer(SyncDriver(engine, ollama_client, mcp_client, scheduler)), concurrency)
+        return
+
+    # The same pipeline stages as the web app, without its scheduler and answer cache
+    engine = ChatEngine(config, prompt_builder, model_roles, rules_router, direct_answers)
+    pipeline = SyncDriver(engine, ollama_client, mcp_client)
 
     print("\n🤖 AI Assistant Ready!")
     print("Available tools:")
@@ -96,116 +150,28 @@ async def main():
     while True:
         user_input = input("\n💬 Ask me anything: ")
         if user_input.lower() in ['exit', 'quit', 'bye']:
+            router_stats = rules_router.stats()
+            print(f"⚡ Rules router handled {router_stats['hits']}/{router_stats['total']} queries ({router_stats['hit_rate']:.0%})")
             print("👋 Goodbye!")
             break
 
-        # Create prompt for tool decision
-        decision_prompt = f"""
-Available tools:
-{tool_descriptions}
-
-User query: {user_input}
-
-If this query needs a tool, respond with ONLY this JSON format:
-{{"tool_name": "exact_tool_name", "parameters": {{"param": "value"}}}}
-
-If no tool is needed, respond with: NO_TOOL_NEEDED
-
-Examples:
-- "What's 5 + 3?" → {{"tool_name": "calculator", "parameters": {{"operation": "add", "a": 5, "b": 3}}}}
-- "Temperature in Pune" → {{"tool_name": "get_temperature", "parameters": {{"place_name": "Pune"}}}}
-- "Hello" → NO_TOOL_NEEDED
-
-Response:"""
-
         try:
             print("🔍 Analyzing your question...")
             
-            # Step 1: Ask Qwen3 to decide on tool usage
-            decision_response = ollama_client.chat(
-                model=model,
-                messages=[{"role": "user", "content": decision_prompt}],
-                options=ollama_options
-            )
-            
-            decision_content = decision_response["message"]["content"].strip()
-            print(f"🧠 Qwen3 decision: {decision_content}")
-
-            # Step 2: Check if tool is needed
-            if "NO_TOOL_NEEDED" in decision_content.upper():
-                # Direct response without tools
-                direct_prompt = f"User asked: {user_input}\n\nProvide a helpful, friendly answer:"
-                
-                direct_response = ollama_client.chat(
-                    model=model,
-                    messages=[{"role": "user", "content": direct_prompt}],
-                    options=ollama_options
-                )
-                
-                print(f"\n💬 Answer: {direct_response['message']['content']}")
-                
-            else:
-                # Try to extract tool call
-                tool_call = extract_json_from_response(decision_content)
-                
-                if tool_call:
-                    print(f"\n🔧 Using tool: {tool_call['tool_name']}")
-                    print(f"📋 Parameters: {tool_call['parameters']}")
-                    
-                    try:
-                        # Step 3: Execute the tool via MCP
-                        tool_result = mcp_client.execute_tool(
-                            tool_call["tool_name"], 
-                            tool_call["parameters"]
-                        )
-                        print(f"🔍 Tool result: {tool_result}")
-                        
-                        # Step 4: Generate final answer using tool result
-                        final_prompt = f"""
-User asked: {user_input}
-
-I used the {tool_call['tool_name']} tool and got this result: {tool_result}
-
-Now provide a complete, natural, and helpful final answer to the user's question using this tool result. Be conversational and explain the result clearly.
-
-Final answer:"""
-
-                        final_response = ollama_client.chat(
-                            model=model,
-                            messages=[{"role": "user", "content": final_prompt}],
-                            options=ollama_options
-                        )
-                        
-                        print(f"\n✅ Final Answer: {final_response['message']['content']}")
-                        
-                    except Exception as tool_error:
-                        print(f"❌ Tool execution error: {str(tool_error)}")
-                        
-                        # Fallback response
-                        fallback_prompt = f"User asked: {user_input}\n\nI couldn't use the required tool. Please provide a helpful response explaining this:"
-                        
-                        fallback_response = ollama_client.chat(
-                            model=model,
-                            messages=[{"role": "user", "content": fallback_prompt}],
-                            options=ollama_options
-                        )
-                        
-                        print(f"\n⚠️ Answer: {fallback_response['message']['content']}")
-                        
-                else:
-                    print("❌ Could not parse tool decision. Providing direct response...")
-                    
-                    # Fallback to direct response
-                    direct_prompt = f"User asked: {user_input}\n\nProvide a helpful answer:"
-                    
-                    direct_response = ollama_client.chat(
-                        model=model,
-                        messages=[{"role": "user", "content": direct_prompt}],
-                        options=ollama_options
-                    )
-                    
-                    print(f"\n💬 Answer: {direct_response['message']['content']}")
-                    
+            for event in pipeline.events(ChatContext(user_input)):
+                if event["type"] == "tool_start":
+                    print(f"\n🔧 Step {event['step']}, using tool: {event['name']}")
+                    print(f"📋 Parameters: {event['parameters']}")
+                elif event["type"] == "tool_result":
+                    print(f"🔍 {event['name']} result: {event['result']}")
+                elif event["type"] == "done":
+                    if "error" in event:
+                        print(f"\n⚠️ Answer: {event['content']}")
+                    elif event["toolCalls"]:
+                        print(f"\n✅ Final Answer: {event['content']}")
+                    else:
+                        print(f"\n💬 Answer: {event['content']}")
+        
         except Exception as e:
             print(f"❌ Error: {str(e)}")
 
@@ -0,0 +1,244 @@
+"""
+ASGI version of the web interface.
+
+Serves the same routes as web_app.py, but every chat waits on Ollama and the
+MCP server with asyncio (ollama.AsyncClient, AsyncMCPClient), so a single
+process can hold hundreds of concurrent chats without a thread per request.
+Run it with: python serve.py
+"""
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+import asyncio
+import json
+import ollama
+import sys
+import os
+
+# Add current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_client.client import MCPClient
+from mcp_client.async_client import AsyncMCPClient
+from chat_pipeline import tracing
+from chat_pipeline.answer_cache import SemanticAnswerCache
+from chat_pipeline.direct_answer import DirectAnswerPolicy
+from chat_pipeline.engine import AsyncDriver, ChatContext, ChatEngine
+from chat_pipeline.health import HealthMonitor
+from chat_pipeline.models import ROLES, ModelRoles
+from chat_pipeline.prompts import PromptBuilder
+from chat_pipeline.residency import ResidencyManager
+from chat_pipeline.router import RulesRouter
+from chat_pipeline.scheduler import FairScheduler, PRIORITY_INTERACTIVE, PRIORITY_NAMES, QueueFullError
+from chat_pipeline.timings import TimingLog
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Shared AI components, created once per worker process in lifespan()
+mcp_client = None
+ollama_client = None
+config = None
+model_roles = None
+rules_router = None
+health_monitor = None
+residency = None
+scheduler = None
+answer_cache = None
+direct_answers = None
+pipeline = None
+index_html = None
+
+async def preload_role_models():
+    """Load the models of the other roles (e.g. a small router) alongside the answer model"""
+    for model in model_roles.models():
+        if model == residency.model:
+            continue
+        try:
+            await ollama_client.generate(model=model, prompt="", keep_alive=residency.keep_alive())
+            print(f"🔥 Model '{model}' resident")
+        except Exception as e:
+            print(f"⚠️ Failed to preload model '{model}': {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize Ollama and MCP clients for this worker"""
+    global mcp_client, ollama_client, config, model_roles, rules_router, health_monitor, residency, scheduler, answer_cache, direct_answers, pipeline, index_html
+
+    with open(os.path.join(BASE_DIR, "config", "config.json"), "r") as f:
+        config = json.load(f)
+    with open(os.path.join(BASE_DIR, "templates", "index.html"), "r", encoding="utf-8") as f:
+        index_html = f.read()
+
+    tracing.configure(config.get("tracing"), "asgi_app", BASE_DIR)
+
+    mcp_client = AsyncMCPClient(config["mcp_server"]["host"])
+    tools = await mcp_client.get_tools()
+    rules_router = RulesRouter(
+        [t["name"] for t in tools],
+        enabled=config.get("router", {}).get("rules_enabled", True)
+    )
+
+    ollama_client = ollama.AsyncClient(host=config["ollama"]["host"])
+    model_roles = ModelRoles(config["ollama"])
+    answer_cache = SemanticAnswerCache(config.get("answer_cache"))
+    direct_answers = DirectAnswerPolicy(config.get("direct_answers"))
+    # Admission control in front of Ollama (per worker process)
+    scheduler = FairScheduler.from_config(config.get("scheduler"))
+
+    # Health checks and residency run in background threads with sync clients
+    sync_ollama_client = ollama.Client(host=config["ollama"]["host"])
+    answer_model = model_roles.model("answer")
+    residency = ResidencyManager(sync_ollama_client, answer_model, config.get("residency"))
+    if not await asyncio.to_thread(residency.preload):
+        raise RuntimeError(f"Could not load model '{answer_model}' in Ollama")
+    residency.start()
+    await preload_role_models()
+
+    # The same pipeline stages as web_app.py, driven with the asyncio clients
+    engine = ChatEngine(
+        config, PromptBuilder(), model_roles, rules_router, direct_answers, answer_cache,
+        timing_log=TimingLog(config.get("timings"))
+    )
+    pipeline = AsyncDriver(engine, ollama_client, mcp_client, scheduler, residency)
+
+    health_config = config.get("health", {})
+    health_monitor = HealthMonitor(
+        sync_ollama_client,
+        MCPClient(config["mcp_server"]["host"]),
+        answer_model,
+        interval=health_config.get("interval", 10),
+        ttl=health_config.get("ttl", 30)
+    )
+    await asyncio.to_thread(health_monitor.start)
+
+    print("✅ AI components initialized successfully!")
+    print(f"✅ Connected to MCP server with {len(tools)} tools")
+    print(f"✅ Connected to Ollama with models: {', '.join(f'{role}={model_roles.model(role)}' for role in ROLES)}")
+
+    yield
+
+    health_monitor.stop()
+    residency.stop()
+    await mcp_client.aclose()
+
+app = FastAPI(title="MCP AI Assistant", lifespan=lifespan)
+
+async def parse_chat_request(request: Request):
+    """Return the ChatContext of a chat request, or None if the message is missing"""
+    try:
+        data = await request.json() or {}
+    except json.JSONDecodeError:
+        data = {}
+    user_message = data.get('message', '')
+    if not user_message:
+        return None
+
+    print(f"💬 User message: {user_message}")
+    return ChatContext(
+        user_message,
+        session_id=data.get('sessionId') or (request.client.host if request.client else None),
+        priority=PRIORITY_NAMES.get(data.get('priority'), PRIORITY_INTERACTIVE),
+        polish=bool(data.get('polish')),
+        traceparent=request.headers.get(tracing.TRACEPARENT_HEADER)
+    )
+
+@app.get('/', response_class=HTMLResponse)
+async def index():
+    """Serve the main chat interface"""
+    return index_html
+
+@app.post('/api/chat')
+async def chat(request: Request):
+    """Handle chat messages"""
+    ctx = await parse_chat_request(request)
+    if ctx is None:
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+
+    try:
+        result = None
+        async for event in pipeline.events(ctx):
+            if event['type'] == 'done':
+                result = event
+
+        response = {'content': result['content'], 'toolCalls': result['toolCalls'], 'timings': result['timings']}
+        if 'error' in result:
+            response['error'] = result['error']
+        if result.get('cached'):
+            response['cached'] = True
+        if result.get('direct'):
+            response['direct'] = True
+        if result.get('traceId'):
+            response['traceId'] = result['traceId']
+        return response
+
+    except QueueFullError as e:
+        print(f"🚦 Request shed: {str(e)}")
+        return JSONResponse({'error': str(e), 'queueFull': True}, status_code=503)
+
+    except Exception as e:
+        print(f"❌ Chat API error: {str(e)}")
+        return JSONResponse({'error': f'Failed to process request: {str(e)}'}, status_code=500)
+
+@app.post('/api/chat/stream')
+async def chat_stream(request: Request):
+    """Handle chat messages, streaming pipeline events as NDJSON"""
+    ctx = await parse_chat_request(request)
+    if ctx is None:
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+
+    async def generate():
+        try:
+            async for event in pipeline.events(ctx):
+                yield json.dumps(event) + "\n"
+        except QueueFullError as e:
+            print(f"🚦 Request shed: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': str(e), 'queueFull': True}) + "\n"
+        except Exception as e:
+            print(f"❌ Chat stream error: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': f'Failed to process request: {str(e)}'}) + "\n"
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+@app.get('/api/status')
+def status():
+    """Report system status from the cached health snapshot (runs in the threadpool)"""
+    snapshot = health_monitor.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot['status'] == 'healthy' else 503)
+
+def admin_required(request: Request):
+    """Dependency that only allows requests carrying the configured X-Admin-Token header"""
+    admin_token = config.get("admin", {}).get("token")
+    if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+        raise HTTPException(status_code=403, detail='Admin access required')
+
+@app.get('/api/admin/cache', dependencies=[Depends(admin_required)])
+def admin_cache_stats():
+    """Inspect the answer cache"""
+    return answer_cache.stats()
+
+@app.post('/api/admin/cache', dependencies=[Depends(admin_required)])
+async def admin_cache_update(request: Request):
+    """Change the answer cache with {"enabled": bool, "clear": bool}"""
+    data = await request.json()
+    if 'enabled' in data:
+        answer_cache.set_enabled(bool(data['enabled']))
+        print(f"💾 Answer cache {'enabled' if answer_cache.enabled else 'disabled'}")
+    if data.get('clear'):
+        answer_cache.clear()
+        print("💾 Answer cache cleared")
+    return answer_cache.stats()
+
+@app.get('/api/queue')
+def queue_stats():
+    """Report scheduler load: active generations, queue depth and estimated wait"""
+    return scheduler.stats()
+
+@app.get('/api/residency')
+def residency_metrics():
+    """Report model residency metrics (cold starts, load times, keep_alive)"""
+    return residency.metrics()
+
+@app.get('/api/router/stats')
+def router_stats():
+    """Report how often the rules router skipped the LLM decision call"""
+    return rules_router.stats()
@@ -0,0 +1,394 @@
+"""
+Load test /api/chat (web app) or /mcp/execute (MCP server) with a scenario mix
+
+Requests arrive open loop: on a Poisson (or uniform) schedule at each offered
+rate, whether or not earlier requests have finished, so a slow server shows up
+as growing latency instead of a lower request rate. Latency is measured from
+the scheduled arrival time, which includes time spent waiting for one of the
+``--concurrency`` client workers.
+
+Each rate of the sweep reports latency percentiles (overall, per scenario and
+per pipeline stage from the ``timings`` of /api/chat), throughput and error
+rates; the first rate that misses its SLO is reported as the saturation point.
+Results are written as JSON and can be compared with an earlier run.
+
+Point the web app and MCP server at mock_servers/ to test without a GPU.
+``--no-cache`` turns the web app's answer cache off for the run through its
+admin switch (it needs ``admin.token``), so repeated messages still go
+through the router and the model with their text unchanged.
+
+Usage: python benchmarks/load_test.py --rates 0.5,1,2,4 --duration 60 --concurrency 32
+       python benchmarks/load_test.py --target mcp --mix calculator=3,temperature=1
+       python benchmarks/load_test.py --compare benchmarks/results/load_test_<before>.json
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+
+# Each scenario is a conversation: its messages are sent in order with one sessionId
+CHAT_SCENARIOS = {
+    "greeting": ["Hello!"],
+    "calculator": ["What is 25 + 17?"],
+    "temperature": ["Tell me the temperature in Pune"],
+    "web_search": ["What are the latest AI developments?"],
+    "multi_turn": ["Hello!", "What is 144 divided by 12?", "Compare the temperature in Pune and Delhi"],
+}
+
+# The same scenarios as direct tool calls; a greeting needs no tool
+MCP_SCENARIOS = {
+    "calculator": [{"tool_name": "calculator", "parameters": {"operation": "add", "a": 25, "b": 17}}],
+    "temperature": [{"tool_name": "get_temperature", "parameters": {"place_name": "Pune"}}],
+    "web_search": [{"tool_name": "gemini_web_search", "parameters": {"query": "latest AI developments"}}],
+    "multi_turn": [
+        {"tool_name": "calculator", "parameters": {"operation": "divide", "a": 144, "b": 12}},
+        {"tool_name": "get_temperature", "parameters": {"place_name": "Pune"}},
+        {"tool_name": "get_temperature", "parameters": {"place_name": "Delhi"}},
+    ],
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def load_config():
+    with open(os.path.join(BASE_DIR, "config", "config.json"), "r") as f:
+        return json.load(f)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return {"count": 0}
+    summary = {"count": len(values), "mean": round(sum(values) / len(values), 1)}
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(percentile(values, p), 1)
+    summary["max"] = round(values[-1], 1)
+    return summary
+
+
+def parse_mix(text, scenarios):
+    """"greeting=2,calculator=1" -> {"greeting": 2.0, "calculator": 1.0}; empty means an even mix"""
+    if not text:
+        return {name: 1.0 for name in scenarios}
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in scenarios:
+            raise Exception(f"Unknown scenario '{name}'. Available: {', '.join(scenarios)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def arrival_times(rate, duration, arrival, rng):
+    """Offsets (seconds from the start) at which requests arrive"""
+    times, t = [], 0.0
+    while True:
+        t += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+        if t >= duration:
+            return times
+        times.append(t)
+
+
+class LoadTest:
+    """Runs scenarios against one target and records one sample per HTTP request"""
+
+    def __init__(self, target, url, timeout, priority=None, admin_token=None):
+        self.target = target
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.priority = priority
+        self.admin_token = admin_token
+        self.scenarios = CHAT_SCENARIOS if target == "chat" else MCP_SCENARIOS
+        self._local = threading.local()
+
+    def session(self):
+        # requests.Session is not thread safe: one per worker thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def set_answer_cache(self, enabled):
+        """Switch the web app's answer cache; returns whether it was enabled before"""
+        headers = {"X-Admin-Token": self.admin_token or ""}
+        response = requests.get(f"{self.url}/api/admin/cache", headers=headers, timeout=10)
+        if response.status_code == 403:
+            raise SystemExit("❌ --no-cache needs the web app's admin.token (config.json or --admin-token)")
+        response.raise_for_status()
+        was_enabled = response.json()["enabled"]
+        requests.post(f"{self.url}/api/admin/cache", json={"enabled": enabled}, headers=headers,
+                      timeout=10).raise_for_status()
+        print(f"💾 Answer cache {'enabled' if enabled else 'disabled'} on {self.url}")
+        return was_enabled
+
+    def send(self, step, session_id):
+        """One HTTP request; returns (error kind or None, stage timings or None, served from the answer cache)"""
+        if self.target == "chat":
+            body = {"message": step, "sessionId": session_id}
+            if self.priority:
+                body["priority"] = self.priority
+            response = self.session().post(f"{self.url}/api/chat", json=body, timeout=self.timeout)
+        else:
+            response = self.session().post(f"{self.url}/mcp/execute", json=step, timeout=self.timeout)
+
+        if response.status_code == 503:
+            return "shed", None, False
+        if response.status_code != 200:
+            return f"http_{response.status_code}", None, False
+        data = response.json()
+        if self.target == "chat":
+            return ("answer_error" if data.get("error") else None), data.get("timings"), bool(data.get("cached"))
+        return ("tool_error" if str(data.get("result", "")).startswith("Error") else None), None, False
+
+    def run_scenario(self, scenario, scheduled, samples, lock):
+        session_id = f"load-{uuid.uuid4().hex[:12]}"
+        for turn, step in enumerate(self.scenarios[scenario]):
+            started = time.perf_counter()
+            try:
+                error, timings, cached = self.send(step, session_id)
+            except requests.Timeout:
+                error, timings, cached = "timeout", None, False
+            except requests.RequestException as e:
+                error, timings, cached = f"connection: {type(e).__name__}", None, False
+            finished = time.perf_counter()
+            # The first turn also waited for a free worker; later turns start right away
+            origin = scheduled if turn == 0 else started
+            sample = {
+                "scenario": scenario,
+                "turn": turn,
+                "latency_ms": (finished - origin) * 1000,
+                "service_ms": (finished - started) * 1000,
+                "finished": finished,
+                "error": error,
+                "cached": cached,
+                "timings": timings
+            }
+            with lock:
+                samples.append(sample)
+
+    def run_rate(self, rate, duration, concurrency, mix, arrival, seed):
+        rng = random.Random(seed)
+        names, weights = list(mix), list(mix.values())
+        schedule = arrival_times(rate, duration, arrival, rng)
+        picks = [rng.choices(names, weights)[0] for _ in schedule]
+        samples, lock = [], threading.Lock()
+
+        print(f"🚀 {rate:g} req/s for {duration:g}s: {len(schedule)} conversations, {concurrency} workers")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            for offset, scenario in zip(schedule, picks):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.run_scenario, scenario, start + offset, samples, lock)
+        return report(rate, duration, len(schedule), start, samples)
+
+
+def report(rate, duration, conversations, start, samples):
+    """Aggregate the samples of one rate"""
+    elapsed = max((s["finished"] for s in samples), default=start) - start
+    errors = {}
+    for s in samples:
+        if s["error"]:
+            errors[s["error"]] = errors.get(s["error"], 0) + 1
+    ok = [s for s in samples if not s["error"]]
+
+    by_scenario = {}
+    for name in sorted({s["scenario"] for s in samples}):
+        scenario_samples = [s for s in samples if s["scenario"] == name]
+        failed = sum(1 for s in scenario_samples if s["error"])
+        by_scenario[name] = {
+            "requests": len(scenario_samples),
+            "error_rate": round(failed / len(scenario_samples), 4),
+            "latency_ms": summarize([s["latency_ms"] for s in scenario_samples if not s["error"]])
+        }
+
+    stages = {}
+    for s in ok:
+        timings = s["timings"] or {}
+        for name, ms in timings.get("stages", {}).items():
+            stages.setdefault(name, []).append(ms)
+        if "total_ms" in timings:
+            stages.setdefault("server_total", []).append(timings["total_ms"])
+        for key in ("round_trip_ms", "execution_ms", "network_ms"):
+            if key in timings.get("mcp", {}):
+                stages.setdefault(f"mcp_{key[:-3]}", []).append(timings["mcp"][key])
+
+    return {
+        "offered_rps": rate,
+        "duration_s": duration,
+        "conversations": conversations,
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "errors": errors,
+        "cached_rate": round(sum(1 for s in ok if s["cached"]) / len(ok), 4) if ok else 0.0,
+        "latency_ms": summarize([s["latency_ms"] for s in ok]),
+        "service_ms": summarize([s["service_ms"] for s in ok]),
+        "by_scenario": by_scenario,
+        "stages_ms": {name: summarize(values) for name, values in sorted(stages.items())}
+    }
+
+
+def saturation_point(runs, slo_p95_ms, max_error_rate):
+    """The first offered rate whose p95 or error rate misses the SLO, or that the server could not keep up with"""
+    for run in runs:
+        reasons = []
+        p95 = run["latency_ms"].get("p95")
+        if p95 is None or p95 > slo_p95_ms:
+            reasons.append(f"p95 {p95} ms > {slo_p95_ms:g} ms")
+        if run["error_rate"] > max_error_rate:
+            reasons.append(f"error rate {run['error_rate']:.1%} > {max_error_rate:.1%}")
+        # A backlog makes the run finish well after the last arrival plus a typical request
+        expected_s = run["duration_s"] + (run["service_ms"].get("p50") or 0) / 1000
+        if run["elapsed_s"] > 0 and run["throughput_rps"] < 0.9 * run["requests"] * (1 - run["error_rate"]) / expected_s:
+            reasons.append(f"throughput {run['throughput_rps']} req/s below offered load")
+        if reasons:
+            return {"offered_rps": run["offered_rps"], "reasons": reasons}
+    return None
+
+
+def print_run(run):
+    latency = run["latency_ms"]
+    errors = ", ".join(f"{kind}: {count}" for kind, count in run["errors"].items()) or "none"
+    print(f"   {run['requests']} requests in {run['elapsed_s']}s, throughput {run['throughput_rps']} req/s, "
+          f"error rate {run['error_rate']:.1%} ({errors}), {run['cached_rate']:.0%} from the answer cache")
+    print(f"   latency p50 {latency.get('p50')} / p95 {latency.get('p95')} / p99 {latency.get('p99')} ms")
+    print(f"   {'scenario':<22}{'requests':>9}{'errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, s in run["by_scenario"].items():
+        l = s["latency_ms"]
+        print(f"   {name:<22}{s['requests']:>9}{s['error_rate']:>8.1%}{l.get('p50', '-'):>9}{l.get('p95', '-'):>9}{l.get('p99', '-'):>9}")
+    if run["stages_ms"]:
+        print(f"   {'stage':<22}{'count':>9}{'':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for name, s in run["stages_ms"].items():
+            print(f"   {name:<22}{s['count']:>9}{'':>8}{s['p50']:>9}{s['p95']:>9}{s['p99']:>9}")
+
+
+def print_comparison(baseline, results):
+    """Per-rate change of throughput and latency against an earlier results file"""
+    before = {run["offered_rps"]: run for run in baseline["runs"]}
+    print(f"\n📊 Compared with {baseline.get('started')} ({baseline.get('label') or 'no label'})")
+    print(f"{'rate':>6}{'throughput':>22}{'p50 ms':>22}{'p95 ms':>22}{'errors':>18}")
+
+    def change(old, new):
+        if old is None or new is None:
+            return f"{old} → {new}"
+        delta = f" ({(new - old) / old:+.0%})" if old else ""
+        return f"{old:g} → {new:g}{delta}"
+
+    for run in results["runs"]:
+        old = before.get(run["offered_rps"])
+        if old is None:
+            continue
+        print(f"{run['offered_rps']:>6g}"
+              f"{change(old['throughput_rps'], run['throughput_rps']):>22}"
+              f"{change(old['latency_ms'].get('p50'), run['latency_ms'].get('p50')):>22}"
+              f"{change(old['latency_ms'].get('p95'), run['latency_ms'].get('p95')):>22}"
+              f"{old['error_rate']:>8.1%} → {run['error_rate']:.1%}")
+    old_saturation = (baseline.get("saturation") or {}).get("offered_rps")
+    new_saturation = (results.get("saturation") or {}).get("offered_rps")
+    print(f"   saturation: {old_saturation or 'not reached'} → {new_saturation or 'not reached'} req/s")
+
+
+def main():
+    config = load_config()
+    web = config.get("web", {})
+    parser = argparse.ArgumentParser(description="Load test the chat API or the MCP server")
+    parser.add_argument("--target", choices=["chat", "mcp"], default="chat", help="/api/chat or /mcp/execute")
+    parser.add_argument("--url", help="Base URL (default: the web app or MCP server from config.json)")
+    parser.add_argument("--rates", default="1", help="Comma-separated offered rates (conversations per second) to sweep")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of arrivals per rate")
+    parser.add_argument("--concurrency", type=int, default=32, help="Client workers (max conversations in flight)")
+    parser.add_argument("--mix", help="Scenario weights, e.g. greeting=2,calculator=1 (default: even mix)")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson", help="Arrival process")
+    parser.add_argument("--priority", choices=["interactive", "batch"], help="Scheduler priority sent with chat requests")
+    parser.add_argument("--no-cache", action="store_true", help="Turn the web app's answer cache off during the run (admin switch)")
+    parser.add_argument("--admin-token", help="X-Admin-Token for --no-cache (default: admin.token from config.json)")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--slo-p95-ms", type=float, default=10000, help="p95 latency above which a rate counts as saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.05, help="Error rate above which a rate counts as saturated")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for arrivals and the scenario mix")
+    parser.add_argument("--label", help="Free-form note stored with the results (e.g. a commit)")
+    parser.add_argument("--json", help="Results file (default: benchmarks/results/load_test_<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    elif args.target == "chat":
+        url = f"http://localhost:{web.get('port', 5000)}"
+    else:
+        url = config["mcp_server"]["host"]
+
+    if args.no_cache and args.target != "chat":
+        parser.error("--no-cache only applies to --target chat")
+    admin_token = args.admin_token or config.get("admin", {}).get("token")
+    load_test = LoadTest(args.target, url, args.timeout, args.priority, admin_token)
+    mix = parse_mix(args.mix, load_test.scenarios)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    started = time.strftime("%Y-%m-%dT%H:%M:%S")
+    print(f"🏁 Load testing {url} ({args.target}), mix {mix}, {args.arrival} arrivals")
+
+    cache_was_enabled = load_test.set_answer_cache(False) if args.no_cache else None
+    runs = []
+    try:
+        for index, rate in enumerate(rates):
+            run = load_test.run_rate(rate, args.duration, args.concurrency, mix, args.arrival, args.seed + index)
+            print_run(run)
+            runs.append(run)
+    finally:
+        if cache_was_enabled:
+            load_test.set_answer_cache(True)
+
+    saturation = saturation_point(runs, args.slo_p95_ms, args.max_error_rate)
+    if saturation:
+        print(f"\n🔥 Saturated at {saturation['offered_rps']:g} req/s: {'; '.join(saturation['reasons'])}")
+    else:
+        print(f"\n✅ No saturation up to {rates[-1]:g} req/s")
+
+    results = {
+        "started": started,
+        "label": args.label,
+        "target": args.target,
+        "url": url,
+        "mix": mix,
+        "arrival": args.arrival,
+        "duration_s": args.duration,
+        "concurrency": args.concurrency,
+        "no_cache": args.no_cache,
+        "slo": {"p95_ms": args.slo_p95_ms, "max_error_rate": args.max_error_rate},
+        "runs": runs,
+        "saturation": saturation
+    }
+    path = args.json or os.path.join(RESULTS_DIR, f"load_test_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to {path}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Microbenchmarks for the text processing that runs on every request
+
+Times each function on synthetic but realistic payloads (long <think> output,
+decisions buried in nested JSON, research-server SSE captures with large
+"values" events, long research answers, prompts with big tool results) and
+measures the memory it allocates. No Ollama, MCP or research server is needed.
+
+Save a run as a baseline, then compare later runs against it; cases slower
+(or allocating more) than the threshold are flagged and the exit code is 1.
+
+Usage: python benchmarks/microbench.py --save benchmarks/results/micro_baseline.json
+       python benchmarks/microbench.py --baseline benchmarks/results/micro_baseline.json --threshold 0.15
+       python benchmarks/microbench.py --filter sse
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+sys.path.append(os.path.join(BASE_DIR, "mcp_server"))
+
+from chat_pipeline.parsing import IncrementalDecisionParser, extract_tool_calls, strip_thinking
+from chat_pipeline.prompts import PromptBuilder
+from tools import GeminiWebSearchTool
+from web_search import _extract_clean_answer, _pick_answer
+
+WORDS = ("the model considers whether the query needs a tool call because the user asked about "
+         "current temperature weather news results score value calculation sum product answer "
+         "first second then however therefore maybe check again json schema parameters").split()
+
+TOOLS = [
+    {"name": "calculator", "description": "Perform basic arithmetic operations (add, subtract, multiply, divide)",
+     "parameters": [{"name": "operation", "type": "string"}, {"name": "a", "type": "number"}, {"name": "b", "type": "number"}]},
+    {"name": "get_temperature", "description": "Get the current temperature for a place",
+     "parameters": [{"name": "place_name", "type": "string"}]},
+    {"name": "gemini_web_search", "description": "Search the web for current, recent or latest information",
+     "parameters": [{"name": "query", "type": "string"}, {"name": "max_length", "type": "string"}]},
+]
+
+
+def words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def prose(rng, chars):
+    """Sentences with markdown, citations and links, as research answers have"""
+    parts = []
+    while sum(len(p) for p in parts) < chars:
+        sentence = words(rng, rng.randint(8, 20)).capitalize()
+        roll = rng.random()
+        if roll < 0.1:
+            sentence = f"**{sentence}**"
+        elif roll < 0.2:
+            sentence = f"* {sentence}"
+        elif roll < 0.3:
+            sentence += f" [{rng.randint(1, 9)}, {rng.randint(10, 20)}]"
+        elif roll < 0.35:
+            sentence += f" [source](https://example.com/{rng.randint(1, 999)})"
+        parts.append(sentence + rng.choice([". ", "! ", "? ", ".\n\n"]))
+    return "".join(parts)[:chars]
+
+
+def decision_json(calls=2):
+    return json.dumps({"tool_calls": [
+        {"tool_name": "get_temperature", "parameters": {"place_name": f"City {i}"}} for i in range(calls)
+    ]})
+
+
+def think_output(rng, chars):
+    """A reasoning model's response: a long <think> block (with stray braces) before the decision"""
+    reasoning = []
+    while sum(len(r) for r in reasoning) < chars:
+        reasoning.append(words(rng, 25))
+        if rng.random() < 0.2:
+            reasoning.append('maybe {"tool_name": "calculator"} or {partial')
+    return "<think>\n" + "\n".join(reasoning) + "\n</think>\n" + decision_json()
+
+
+def nested_json_output(rng, depth, width):
+    """A decision after an echoed nested JSON document that parses but is not a decision"""
+    def node(level):
+        if level == 0:
+            return words(rng, 3)
+        return {**{f"key_{i}": node(level - 1) for i in range(width)}, "items": [node(level - 1)]}
+    return "Here is the data: " + json.dumps(node(depth)) + "\nDecision: " + decision_json(3)
+
+
+def values_event(rng, loop, answer_chars):
+    """A LangGraph "values" event: the whole graph state, resent after every node"""
+    return {
+        "messages": [{"type": "human", "content": "latest AI developments", "id": "h1"}] + (
+            [{"type": "ai", "content": prose(rng, answer_chars), "id": "a1"}] if loop < 0 else []),
+        "search_query": [words(rng, 6) for _ in range(3 * max(loop, 1))],
+        "web_research_result": [prose(rng, 1500) for _ in range(3 * max(loop, 1))],
+        "sources_gathered": [{"label": f"source {i}", "short_url": f"https://vertexaisearch.cloud.google.com/id/{i}",
+                              "value": f"https://example.com/article/{i}"} for i in range(12 * max(loop, 1))],
+        "research_loop_count": max(loop, 1),
+        "reasoning_model": "gemini-2.5-flash-preview-04-17"
+    }
+
+
+def sse_capture(rng, loops=3, tokens=400):
+    """The lines of one research run: token updates, per-node updates and growing values events"""
+    lines = [": heartbeat", "event: metadata", 'data: {"run_id": "run-1", "attempt": 1}', ""]
+    for loop in range(1, loops + 1):
+        lines += ["event: updates", "data: " + json.dumps({"web_research": {"research_loop_count": loop}}), ""]
+        lines += ["event: values", "data: " + json.dumps(values_event(rng, loop, 0)), ""]
+    for i in range(tokens):
+        lines += ["event: messages", "data: " + json.dumps([{"content": rng.choice(WORDS) + " ", "type": "AIMessageChunk"},
+                                                             {"langgraph_node": "finalize_answer"}]), ""]
+    lines += ["event: values", "data: " + json.dumps(values_event(rng, -1, 6000)), ""]
+    return lines
+
+
+def handle_sse(lines):
+    """The per-line work of _make_api_request's stream loop"""
+    final_answer = ""
+    for line in lines:
+        if not line or line.startswith(":"):
+            continue
+        if line.startswith("data: "):
+            final_answer = _pick_answer(line[6:], final_answer)
+    return final_answer.strip()
+
+
+def feed_tokens(tokens):
+    parser = IncrementalDecisionParser()
+    for token in tokens:
+        if parser.feed(token) is not None:
+            break
+    return parser.finish()
+
+
+def split_tokens(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def build_cases():
+    """name -> (function, argument tuple, payload size in characters or 0 if not meaningful)"""
+    rng = random.Random(1234)
+    think = think_output(rng, 20_000)
+    unclosed_think = think_output(rng, 20_000).replace("</think>", "")
+    nested = nested_json_output(rng, depth=4, width=4)
+    sse = sse_capture(rng)
+    answer = prose(rng, 30_000)
+    search_tool = GeminiWebSearchTool()
+    tool_results = [{"name": "gemini_web_search", "result": prose(rng, 8000)},
+                    {"name": "get_temperature", "result": "Current temperature in Pune: 31°C (Sunny)"}]
+    followup_results = [{"tool_name": "gemini_web_search", "parameters": {"query": "latest AI"}, "result": prose(rng, 8000)}]
+    # Drawn last so adding it left the earlier corpora unchanged
+    long_prose = prose(rng, 40_000)
+    builder = PromptBuilder()
+
+    return {
+        "extract_tool_calls/think_20k": (extract_tool_calls, (think,), len(think)),
+        "extract_tool_calls/unclosed_think_20k": (extract_tool_calls, (unclosed_think,), len(unclosed_think)),
+        "extract_tool_calls/nested_json": (extract_tool_calls, (nested,), len(nested)),
+        "strip_thinking/think_20k": (strip_thinking, (think,), len(think)),
+        "incremental_parser/think_20k": (feed_tokens, (split_tokens(think),), len(think)),
+        "incremental_parser/nested_json": (feed_tokens, (split_tokens(nested),), len(nested)),
+        "incremental_parser/prose_40k": (feed_tokens, (split_tokens(long_prose),), len(long_prose)),
+        "sse_loop/research_run": (handle_sse, (sse,), sum(len(line) for line in sse)),
+        "extract_clean_answer/30k": (_extract_clean_answer, (answer,), len(answer)),
+        "truncate_content/30k": (search_tool.truncate_content, (answer,), len(answer)),
+        "prompts/decision_messages": (builder.decision_messages, (TOOLS, "Compare the temperature in Pune and Delhi"), 0),
+        "prompts/followup_messages": (builder.followup_messages, (TOOLS, "latest AI", followup_results), 0),
+        "prompts/synthesis_messages": (builder.synthesis_messages, ("latest AI and the weather", tool_results), 0),
+    }
+
+
+def time_case(function, args, repeats, min_seconds):
+    """Per-call seconds: (best, median) over ``repeats`` timed loops of a calibrated length"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            function(*args)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+        loops *= 10 if elapsed < min_seconds / 10 else 2
+
+    samples = [elapsed / loops]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            function(*args)
+        samples.append((time.perf_counter() - started) / loops)
+    return min(samples), statistics.median(samples), loops
+
+
+def peak_allocation(function, args):
+    """Peak bytes allocated during one call, measured with tracemalloc"""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - baseline
+
+
+def run(cases, repeats, min_seconds):
+    results = {}
+    for name, (function, args, size) in cases.items():
+        function(*args)  # warm up caches (compiled regexes, the prompt catalog)
+        best, median, loops = time_case(function, args, repeats, min_seconds)
+        peak = peak_allocation(function, args)
+        results[name] = {
+            "best_us": round(best * 1e6, 2),
+            "median_us": round(median * 1e6, 2),
+            "loops": loops,
+            "payload_chars": size,
+            "peak_kb": round(peak / 1024, 1)
+        }
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """Cases whose best time or peak allocation grew by more than ``threshold`` (a fraction)"""
+    flagged = []
+    for name, result in results.items():
+        old = baseline.get("cases", {}).get(name)
+        if old is None:
+            continue
+        for key in ("best_us", "peak_kb"):
+            if old[key] and result[key] > old[key] * (1 + threshold):
+                flagged.append((name, key, old[key], result[key]))
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark the per-request text processing")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed loops per case")
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="Minimum duration of one timed loop")
+    parser.add_argument("--baseline", help="Earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown or allocation growth (0.2 = 20%%)")
+    parser.add_argument("--save", help="Write the results to this file (e.g. to use as a baseline)")
+    args = parser.parse_args()
+
+    cases = build_cases()
+    if args.filter:
+        cases = {name: case for name, case in cases.items() if args.filter in name}
+    print(f"🏁 {len(cases)} microbenchmark(s), {args.repeats} repeats")
+    results = run(cases, args.repeats, args.min_seconds)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    print(f"\n{'case':<40}{'chars':>9}{'best µs':>12}{'median µs':>12}{'peak KB':>10}{'vs baseline':>14}")
+    for name, r in results.items():
+        old = baseline.get("cases", {}).get(name)
+        change = f"{(r['best_us'] - old['best_us']) / old['best_us']:+.1%}" if old and old["best_us"] else ""
+        print(f"{name:<40}{r['payload_chars'] or '-':>9}{r['best_us']:>12.1f}{r['median_us']:>12.1f}{r['peak_kb']:>10.1f}{change:>14}")
+
+    if args.save:
+        if os.path.dirname(args.save):
+            os.makedirs(os.path.dirname(args.save), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"python": sys.version.split()[0], "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "cases": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.save}")
+
+    if baseline:
+        flagged = regressions(results, baseline, args.threshold)
+        if flagged:
+            print(f"\n🔥 {len(flagged)} regression(s) beyond {args.threshold:.0%}:")
+            for name, key, old, new in flagged:
+                print(f"   {name}: {key} {old} → {new}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
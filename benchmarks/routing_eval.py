@@ -0,0 +1,298 @@
+"""
+Evaluate tool routing (the rules router, the LLM decision, or both) on a labeled dataset
+
+Runs only the decision stages of the chat pipeline (ChatEngine.route and
+ChatEngine.decide, with the router role's model, options, prompt and schema
+from config.json) over benchmarks/data/routing_eval.jsonl and reports:
+
+- accuracy: the predicted set of tools equals the expected one
+- parameter exact match: the tools and all their parameters match (numbers
+  compare by value, strings ignore case; an expected "*" accepts any value)
+- parse failures: LLM decisions that yield no tool calls at all
+- rules false positives: rules router decisions that do not match the label
+  (the "near_miss" category holds queries that look routable but are not)
+- decision latency (mean, p95) and generated tokens
+
+Each run is saved under benchmarks/results/routing/ so configurations (a
+router model, a new modelfile SYSTEM prompt, edited decision examples) can be
+compared with --compare instead of guessed. Several --model values are
+evaluated one after another with the same options and compared at the end.
+
+Usage: python benchmarks/routing_eval.py --mode both --label baseline
+       python benchmarks/routing_eval.py --mode llm --model qwen3:0.6b qwen3:1.7b ai_app_model --repeats 3
+       python benchmarks/routing_eval.py --compare benchmarks/results/routing/*.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import ollama
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from mcp_client.client import MCPClient
+from chat_pipeline.direct_answer import DirectAnswerPolicy
+from chat_pipeline.engine import ChatContext, ChatEngine, ListTools, SyncDriver
+from chat_pipeline.models import ModelRoles
+from chat_pipeline.prompts import PromptBuilder
+from chat_pipeline.router import RulesRouter
+
+DEFAULT_DATASET = os.path.join(BASE_DIR, "benchmarks", "data", "routing_eval.jsonl")
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results", "routing")
+ANY_VALUE = "*"
+
+
+class DecisionEngine(ChatEngine):
+    """The pipeline up to the tool decision: list tools, rules router and/or LLM decision"""
+
+    def __init__(self, mode, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mode = mode
+
+    def run(self, ctx: ChatContext):
+        ctx.tools = yield ListTools()
+        if self.mode in ("rules", "both"):
+            yield from self.stage(ctx, "route")
+        if ctx.decision_source is None and self.mode in ("llm", "both"):
+            yield from self.stage(ctx, "decide")
+
+
+def load_dataset(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def same_value(expected, actual):
+    if expected == ANY_VALUE:
+        return actual not in (None, "")
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        try:
+            return float(actual) == float(expected)
+        except (TypeError, ValueError):
+            return False
+    if isinstance(expected, str) and isinstance(actual, str):
+        return expected.strip().lower() == actual.strip().lower()
+    return expected == actual
+
+
+def same_call(expected, actual):
+    if expected["tool_name"] != actual.get("tool_name"):
+        return False
+    parameters = actual.get("parameters") or {}
+    return all(same_value(value, parameters.get(name)) for name, value in expected["parameters"].items())
+
+
+def calls_match(expected_calls, actual_calls):
+    """Order-insensitive: every expected call pairs with a distinct predicted call"""
+    if len(expected_calls) != len(actual_calls):
+        return False
+    remaining = list(actual_calls)
+    for expected in expected_calls:
+        match = next((actual for actual in remaining if same_call(expected, actual)), None)
+        if match is None:
+            return False
+        remaining.remove(match)
+    return True
+
+
+def evaluate(pipeline, item, verbose):
+    ctx = ChatContext(item["query"], session_id="routing-eval")
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        for _ in pipeline.events(ctx):
+            pass
+
+    predicted = ctx.tool_calls
+    expected = item["expected"]
+    tokens = sum(g.get("completion_tokens") or 0 for g in ctx.generations)
+    return {
+        "id": item["id"],
+        "category": item.get("category"),
+        "query": item["query"],
+        "source": ctx.decision_source,
+        "predicted": predicted,
+        "parse_failure": ctx.decision_source in ("llm", "native") and predicted is None,
+        "tools_correct": predicted is not None and
+                         Counter(c["tool_name"] for c in expected) == Counter(c.get("tool_name") for c in predicted),
+        "exact_match": predicted is not None and calls_match(expected, predicted),
+        "latency_ms": round(sum(ctx.timings.values()) * 1000, 1),
+        "tokens": tokens
+    }
+
+
+def summarize(results):
+    latencies = sorted(r["latency_ms"] for r in results)
+    decided = [r for r in results if r["predicted"] is not None]
+    llm = [r for r in results if r["source"] in ("llm", "native")]
+    rules = [r for r in results if r["source"] == "rules"]
+    summary = {
+        "queries": len(results),
+        "accuracy": round(sum(r["tools_correct"] for r in results) / len(results), 4),
+        "exact_match": round(sum(r["exact_match"] for r in results) / len(results), 4),
+        "coverage": round(len(decided) / len(results), 4),
+        "parse_failure_rate": round(sum(r["parse_failure"] for r in llm) / len(llm), 4) if llm else 0.0,
+        "rules_false_positive_rate": round(sum(not r["exact_match"] for r in rules) / len(rules), 4) if rules else 0.0,
+        "latency_mean_ms": round(statistics.mean(latencies), 1),
+        "latency_p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "tokens_mean": round(statistics.mean(r["tokens"] for r in results), 1),
+        "sources": dict(Counter(r["source"] or "none" for r in results))
+    }
+    if llm:
+        llm_latencies = sorted(r["latency_ms"] for r in llm)
+        summary["llm_latency_mean_ms"] = round(statistics.mean(llm_latencies), 1)
+        summary["llm_latency_p95_ms"] = llm_latencies[min(len(llm_latencies) - 1, int(len(llm_latencies) * 0.95))]
+        summary["llm_tokens_mean"] = round(statistics.mean(r["tokens"] for r in llm), 1)
+    return summary
+
+
+def by_category(results):
+    categories = {}
+    for r in results:
+        categories.setdefault(r["category"] or "uncategorized", []).append(r)
+    return {
+        name: {
+            "queries": len(items),
+            "accuracy": round(sum(r["tools_correct"] for r in items) / len(items), 4),
+            "exact_match": round(sum(r["exact_match"] for r in items) / len(items), 4),
+            "latency_mean_ms": round(statistics.mean(r["latency_ms"] for r in items), 1)
+        }
+        for name, items in sorted(categories.items())
+    }
+
+
+def print_report(run):
+    s = run["summary"]
+    print("\n" + "=" * 72)
+    print(f"📋 {run['label']}: mode {run['mode']}, router {run['router_model']}, tool calling {run['tool_calling']}")
+    print(f"   accuracy {s['accuracy']:.1%}, exact match {s['exact_match']:.1%}, coverage {s['coverage']:.1%}, "
+          f"parse failures {s['parse_failure_rate']:.1%}, rules false positives {s.get('rules_false_positive_rate', 0.0):.1%}")
+    print(f"   latency mean {s['latency_mean_ms']:.0f} ms, p95 {s['latency_p95_ms']:.0f} ms, "
+          f"{s['tokens_mean']:.1f} tokens, decided by {s['sources']}")
+    print(f"   {'category':<14}{'queries':>8}{'accuracy':>10}{'exact':>8}{'mean ms':>9}")
+    for name, c in run["categories"].items():
+        print(f"   {name:<14}{c['queries']:>8}{c['accuracy']:>10.0%}{c['exact_match']:>8.0%}{c['latency_mean_ms']:>9.0f}")
+    misses = [r for r in run["results"] if not r["exact_match"]]
+    for r in misses:
+        print(f"   ✗ {r['query']!r} → {json.dumps(r['predicted'])} ({r['source']})")
+
+
+def print_comparison(paths):
+    runs = []
+    for path in paths:
+        with open(path, "r") as f:
+            runs.append(json.load(f))
+    print(f"{'label':<24}{'mode':<7}{'router model':<20}{'acc':>7}{'exact':>7}{'parse':>7}{'rules fp':>9}{'mean ms':>9}{'p95 ms':>8}{'tokens':>8}")
+    for run in runs:
+        s = run["summary"]
+        print(f"{run['label'][:23]:<24}{run['mode']:<7}{run['router_model'][:19]:<20}{s['accuracy']:>7.1%}{s['exact_match']:>7.1%}"
+              f"{s['parse_failure_rate']:>7.1%}{s.get('rules_false_positive_rate', 0.0):>9.1%}"
+              f"{s['latency_mean_ms']:>9.0f}{s['latency_p95_ms']:>8.0f}{s['tokens_mean']:>8.1f}")
+
+
+def run_configuration(args, config, dataset, mcp_client, tools, model=None):
+    """Evaluate one router configuration over the dataset; returns the path of the saved run"""
+    config = json.loads(json.dumps(config))
+    if model:
+        config["ollama"].setdefault("roles", {}).setdefault("router", {})["model"] = model
+    if args.tool_calling:
+        config["ollama"]["tool_calling"] = args.tool_calling
+    model_roles = ModelRoles(config["ollama"])
+
+    rules_router = RulesRouter([t["name"] for t in tools], enabled=True)
+    engine = DecisionEngine(args.mode, config, PromptBuilder(), model_roles, rules_router,
+                            DirectAnswerPolicy(config.get("direct_answers")))
+    pipeline = SyncDriver(engine, ollama.Client(host=config["ollama"]["host"]), mcp_client)
+
+    router_model = model_roles.model("router") if args.mode != "rules" else "-"
+    tool_calling = config["ollama"].get("tool_calling", "prompt")
+    slug = router_model.replace(':', '_')
+    if not args.label:
+        label = f"{args.mode}-{slug}"
+    elif args.model and len(args.model) > 1:
+        label = f"{args.label}-{slug}"
+    else:
+        label = args.label
+
+    if args.mode != "rules":
+        # Load the router model first so the first query does not pay the load time
+        ollama.Client(host=config["ollama"]["host"]).generate(
+            model=model_roles.model("router" if tool_calling != "native" else "answer"), prompt="", keep_alive="10m")
+
+    print(f"🏁 Evaluating {len(dataset)} queries x {args.repeats} ({args.mode}, router {router_model})")
+    results = []
+    for item in dataset:
+        for _ in range(args.repeats):
+            result = evaluate(pipeline, item, args.verbose)
+            results.append(result)
+            print(f"   {'✓' if result['exact_match'] else '✗'} {result['latency_ms']:>7.0f} ms  {item['query']}")
+
+    run = {
+        "label": label,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": args.mode,
+        "router_model": router_model,
+        "tool_calling": tool_calling,
+        "router_options": model_roles.options("router"),
+        "dataset": os.path.relpath(args.dataset, BASE_DIR),
+        "repeats": args.repeats,
+        "summary": summarize(results),
+        "categories": by_category(results),
+        "results": results
+    }
+    print_report(run)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"💾 Results written to {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate tool routing accuracy and latency")
+    parser.add_argument("--mode", choices=["rules", "llm", "both"], default="both",
+                        help="rules router only, LLM decision only, or both as in the pipeline")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Labeled JSONL dataset")
+    parser.add_argument("--config", default=os.path.join(BASE_DIR, "config", "config.json"), help="Configuration to evaluate")
+    parser.add_argument("--model", nargs="+", help="Override the router role's model; several models are evaluated in turn")
+    parser.add_argument("--tool-calling", choices=["prompt", "native"], help="Override ollama.tool_calling")
+    parser.add_argument("--repeats", type=int, default=1, help="Times each query is asked")
+    parser.add_argument("--label", help="Name of this configuration (default: mode and router model)")
+    parser.add_argument("--filter", help="Only evaluate queries whose category contains this text")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own logging")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS", help="Compare saved runs instead of evaluating")
+    args = parser.parse_args()
+
+    if args.compare:
+        print_comparison(args.compare)
+        return
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    mcp_client = MCPClient(config["mcp_server"]["host"])
+    tools = mcp_client.get_tools()
+    dataset = load_dataset(args.dataset)
+    if args.filter:
+        dataset = [item for item in dataset if args.filter in (item.get("category") or "")]
+
+    paths = []
+    for model in args.model or [None]:
+        try:
+            paths.append(run_configuration(args, config, dataset, mcp_client, tools, model))
+        except Exception as e:
+            print(f"❌ {model or 'router model'} failed: {str(e)}")
+    if len(paths) > 1:
+        print()
+        print_comparison(paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Chat pipeline components shared by the CLI and the web app"""
@@ -0,0 +1,86 @@
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class AgentTurn:
+    """Bookkeeping for one chat turn that may chain several rounds of tool calls.
+
+    A round is followed by another only when the decision that produced it
+    set ``needs_followup`` (a later call needs its results); the front end
+    then asks the router for the next calls with all results so far
+    (``PromptBuilder.followup_messages``), until the model returns no calls,
+    stops asking for a follow-up, or a budget runs out:
+
+    - at most ``max_steps`` rounds of tool calls
+    - no new round once ``time_budget_seconds`` have passed since the turn started
+    - a call repeated with the same parameters reuses the earlier result
+      instead of running again; a round that only repeats calls ends the loop
+
+    ``chainable`` holds the latest decision's ``needs_followup``; rules
+    router decisions never set it, their single round is complete by
+    construction.
+    """
+
+    def __init__(self, enabled: bool = True, max_steps: int = 3, time_budget_seconds: float = 60,
+                 chainable: bool = True):
+        self.enabled = enabled
+        self.chainable = chainable
+        self.max_steps = max_steps
+        self.time_budget_seconds = time_budget_seconds
+        self.started = time.monotonic()
+        self.step = 0
+        self.results = []
+        self._memo = {}
+        self.stop_reason = None
+
+    @classmethod
+    def from_config(cls, agent_config: Optional[Dict[str, Any]], chainable: bool = True) -> "AgentTurn":
+        agent_config = agent_config or {}
+        return cls(
+            enabled=agent_config.get("enabled", True),
+            max_steps=agent_config.get("max_steps", 3),
+            time_budget_seconds=agent_config.get("time_budget_seconds", 60),
+            chainable=chainable
+        )
+
+    @staticmethod
+    def call_key(tool_call: Dict[str, Any]) -> str:
+        return tool_call["tool_name"] + json.dumps(tool_call.get("parameters", {}), sort_keys=True)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def begin_step(self, tool_calls: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Start a round; returns (reused results, calls that still have to run)"""
+        self.step += 1
+        reused, new_calls = [], []
+        for tool_call in tool_calls:
+            key = self.call_key(tool_call)
+            if key in self._memo:
+                reused.append({**self._memo[key], "reused": True})
+            elif all(self.call_key(call) != key for call in new_calls):
+                new_calls.append(tool_call)
+        return reused, new_calls
+
+    def record(self, tool_results: List[Dict[str, Any]]):
+        """Remember the results of the calls that ran in this round"""
+        for tool_result in tool_results:
+            self._memo[self.call_key(tool_result)] = tool_result
+            self.results.append(tool_result)
+
+    def can_continue(self, new_calls: List[Dict[str, Any]]) -> bool:
+        """Whether to ask the router for another round after the current one"""
+        if not self.enabled:
+            self.stop_reason = "multi-step disabled"
+        elif not self.chainable:
+            self.stop_reason = "no follow-up requested"
+        elif not new_calls:
+            self.stop_reason = "no new calls"
+        elif self.step >= self.max_steps:
+            self.stop_reason = f"step budget ({self.max_steps}) reached"
+        elif self.elapsed() >= self.time_budget_seconds:
+            self.stop_reason = f"time budget ({self.time_budget_seconds}s) reached"
+        else:
+            return True
+        return False
@@ -0,0 +1,205 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Numbers and operators must match exactly: "5 - 3" embeds almost like "5 + 3"
+EXACT_TOKEN_PATTERN = re.compile(
+    r"-?\d+(?:\.\d+)?|[+\-*/×÷%]|\b(?:x|plus|add|sum|minus|subtract|times|multiplied|multiply|product"
+    r"|divided|divide|over|quotient|percent|squared|cubed|root|power)\b"
+)
+OPERATOR_TOKENS = {
+    "plus": "+", "add": "+", "sum": "+",
+    "minus": "-", "subtract": "-",
+    "x": "*", "×": "*", "times": "*", "multiplied": "*", "multiply": "*", "product": "*",
+    "÷": "/", "divided": "/", "divide": "/", "over": "/", "quotient": "/",
+    "percent": "%",
+}
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s.+\-*/×÷%]")
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace before embedding"""
+    cleaned = PUNCTUATION_PATTERN.sub(" ", question.lower())
+    return " ".join(cleaned.split()).rstrip(".")
+
+
+def exact_tokens(normalized_question: str) -> List[str]:
+    """Numbers and operators of a question, operator words mapped to their symbols"""
+    return [OPERATOR_TOKENS.get(token, token) for token in EXACT_TOKEN_PATTERN.findall(normalized_question)]
+
+
+class SemanticAnswerCache:
+    """In-process cache of finished answers keyed by question embeddings.
+
+    Callers embed the normalized question (see ``normalize_question``) with
+    Ollama's embedding endpoint and pass the vector to ``lookup``/``store``.
+    A stored answer is reused when its cosine similarity is above the
+    threshold, the numbers and operators in both questions match exactly (so
+    "5 + 3" never answers "5 + 4" or "5 - 3"), and it is still fresh for every tool it used: tools with
+    a ``null`` TTL (calculator) never expire, others (web search) only live
+    for their configured TTL. The store is bounded to ``max_entries`` vectors
+    and evicts the least recently used entry.
+
+    Vectors are kept pre-normalized as rows of one float32 matrix, so a lookup
+    is a single matrix-vector product. It runs outside the lock; the few
+    candidates above the threshold are re-checked under the lock afterwards.
+    """
+
+    def __init__(self, settings: Dict[str, Any] = None):
+        settings = settings or {}
+        self.enabled = settings.get("enabled", True)
+        self.embedding_model = settings.get("embedding_model", "nomic-embed-text")
+        self.similarity_threshold = settings.get("similarity_threshold", 0.92)
+        self.max_entries = settings.get("max_entries", 1000)
+        self.tool_ttl_seconds = settings.get("tool_ttl_seconds", {
+            "calculator": None,
+            "get_temperature": 600,
+            "gemini_web_search": 1800
+        })
+        self.default_ttl_seconds = settings.get("default_ttl_seconds", 86400)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._next_id = 0
+        # Row i of _vectors belongs to entry _slot_ids[i]; -1 marks a free row
+        self._vectors = None
+        self._slot_ids = np.full(self.max_entries, -1, dtype=np.int64)
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self._stats = {"lookups": 0, "hits": 0, "stores": 0, "expired": 0, "evicted": 0, "embed_errors": 0}
+
+    def set_enabled(self, enabled: bool):
+        self.enabled = enabled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._slot_ids.fill(-1)
+            self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def record_embed_error(self):
+        with self._lock:
+            self._stats["embed_errors"] += 1
+
+    def lookup(self, normalized_question: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return the cached result ({"content", "toolCalls", "similarity"}) or None"""
+        if not self.enabled:
+            return None
+
+        vector = self._unit_vector(embedding)
+        tokens = exact_tokens(normalized_question)
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            if not self._entries or self._vectors is None or self._vectors.shape[1] != len(vector):
+                return None
+            vectors, slot_ids = self._vectors, self._slot_ids.copy()
+
+        # Rows written while scoring belong to new ids and are rejected below
+        similarities = vectors @ vector
+        candidates = np.flatnonzero((similarities >= self.similarity_threshold) & (slot_ids >= 0))
+        if candidates.size == 0:
+            return None
+        candidates = candidates[np.argsort(-similarities[candidates])]
+
+        now = time.time()
+        with self._lock:
+            for slot in candidates:
+                entry_id = int(slot_ids[slot])
+                entry = self._entries.get(entry_id)
+                if entry is None or self._slot_ids[slot] != entry_id:
+                    continue
+                if entry["expires_at"] is not None and entry["expires_at"] <= now:
+                    self._remove(entry_id)
+                    self._stats["expired"] += 1
+                    continue
+                if entry["tokens"] != tokens:
+                    continue
+
+                self._entries.move_to_end(entry_id)
+                self._stats["hits"] += 1
+                return {
+                    "content": entry["content"],
+                    "toolCalls": entry["toolCalls"],
+                    "question": entry["question"],
+                    "similarity": round(float(similarities[slot]), 4)
+                }
+        return None
+
+    def store(self, normalized_question: str, embedding: List[float], content: str, tool_calls: List[Dict[str, Any]]):
+        if not self.enabled or not content or self.max_entries <= 0:
+            return
+
+        vector = self._unit_vector(embedding)
+        ttl = self._ttl_for([call["name"] for call in tool_calls])
+        now = time.time()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                # First entry, or the embedding model changed: vectors of another size never match
+                self._entries.clear()
+                self._slot_ids.fill(-1)
+                self._free_slots = list(range(self.max_entries - 1, -1, -1))
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            if not self._free_slots:
+                self._remove_expired(now)
+            if not self._free_slots:
+                self._remove(next(iter(self._entries)))
+                self._stats["evicted"] += 1
+
+            slot = self._free_slots.pop()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._vectors[slot] = vector
+            self._slot_ids[slot] = entry_id
+            self._entries[entry_id] = {
+                "question": normalized_question,
+                "tokens": exact_tokens(normalized_question),
+                "slot": slot,
+                "content": content,
+                "toolCalls": tool_calls,
+                "expires_at": now + ttl if ttl is not None else None
+            }
+            self._stats["stores"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["approx_vector_bytes"] = self._vectors.nbytes if self._vectors is not None else 0
+        stats["enabled"] = self.enabled
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["similarity_threshold"] = self.similarity_threshold
+        return stats
+
+    def _remove(self, entry_id: int):
+        # Caller holds the lock
+        entry = self._entries.pop(entry_id)
+        self._slot_ids[entry["slot"]] = -1
+        self._free_slots.append(entry["slot"])
+
+    def _remove_expired(self, now: float):
+        # Caller holds the lock
+        expired = [entry_id for entry_id, entry in self._entries.items()
+                   if entry["expires_at"] is not None and entry["expires_at"] <= now]
+        for entry_id in expired:
+            self._remove(entry_id)
+        self._stats["expired"] += len(expired)
+
+    def _ttl_for(self, tool_names: List[str]) -> Optional[float]:
+        # The entry lives as long as its least durable tool result
+        if not tool_names:
+            return self.default_ttl_seconds
+        ttls = [self.tool_ttl_seconds.get(name, self.default_ttl_seconds) for name in tool_names]
+        finite = [ttl for ttl in ttls if ttl is not None]
+        return min(finite) if finite else None
+
+    def _unit_vector(self, embedding: List[float]) -> np.ndarray:
+        # float32 storage halves memory; normalizing once makes similarity a dot product
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
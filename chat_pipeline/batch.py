@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Set, Tuple
+
+from chat_pipeline.scheduler import QueueFullError
+
+# Fields of the pipeline's 'done' event copied into each output record
+DONE_FIELDS = ("content", "toolCalls", "timings", "error", "cached", "direct", "traceId")
+
+
+def read_questions(path: str) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """Yield (id, question, record) for each line of a JSONL question file.
+
+    A line is either a JSON object with a ``question`` (or ``message``)
+    field and an optional ``id``, or a bare JSON string. Records without an
+    id are numbered by line. Blank and malformed lines are skipped.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️ Skipping malformed line {line_number} of {path}")
+                continue
+            if isinstance(record, str):
+                record = {"question": record}
+            if not isinstance(record, dict) or not (record.get("question") or record.get("message")):
+                print(f"⚠️ Skipping line {line_number} of {path}: no question")
+                continue
+            yield str(record.get("id", line_number)), record.get("question") or record.get("message"), record
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids already answered in an output file, so an interrupted run can resume.
+
+    The output file is the checkpoint: every record is flushed as soon as its
+    question finishes. Records marked ``failed`` are retried; a line cut off
+    by the interruption is ignored. Until ``compact_output`` has run, an id
+    may have several records, and the last one wins.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not record.get("failed"):
+                done.add(str(record["id"]))
+    return done
+
+
+def compact_output(output_path: str) -> Dict[str, int]:
+    """Rewrite an output file with only the last record of each id; returns its answered/failed counts.
+
+    A retried question leaves its earlier ``failed`` record behind; after
+    compaction every id appears once, in the order it was first answered.
+    """
+    final = {}
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            final[str(record["id"])] = record
+
+    compacted_path = output_path + ".compacting"
+    with open(compacted_path, "w", encoding="utf-8") as f:
+        for record in final.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(compacted_path, output_path)
+
+    failed = sum(1 for record in final.values() if record.get("failed"))
+    return {"answered": len(final) - failed, "failed": failed}
+
+
+class BatchRunner:
+    """Answers a JSONL file of questions with bounded concurrency.
+
+    ``answer(question, question_id)`` runs one question through the chat
+    pipeline and returns its 'done' event. Up to ``concurrency`` questions
+    run at once; the input is read lazily, so files of any size stream
+    through. Questions shed by a busy scheduler (``QueueFullError``) are
+    retried ``max_retries`` times with a backoff; other errors are written
+    as ``failed`` records and retried on the next run. When a run ends the
+    output is compacted to one record per id.
+    """
+
+    def __init__(self, answer: Callable[[str, str], Dict[str, Any]], concurrency: int = 2,
+                 max_retries: int = 3, retry_delay_seconds: float = 5.0, progress_every: int = 10):
+        self.answer = answer
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_delay_seconds = retry_delay_seconds
+        self.progress_every = progress_every
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._stats = {}
+
+    def stop(self):
+        """Finish the questions in flight, then stop (e.g. on Ctrl+C)"""
+        self._stop.set()
+
+    def run_one(self, question_id: str, question: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        result = {"id": question_id, "question": question}
+        if "metadata" in record:
+            result["metadata"] = record["metadata"]
+        for attempt in range(self.max_retries + 1):
+            try:
+                done = self.answer(question, question_id)
+                result.update({field: done[field] for field in DONE_FIELDS if field in done})
+                break
+            except QueueFullError as e:
+                if attempt == self.max_retries or self._stop.is_set():
+                    result.update({"failed": True, "error": str(e)})
+                    break
+                time.sleep(self.retry_delay_seconds * (attempt + 1))
+            except Exception as e:
+                result.update({"failed": True, "error": str(e)})
+                break
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def run(self, input_path: str, output_path: str, resume: bool = True) -> Dict[str, Any]:
+        """Answer every question of ``input_path`` not yet in ``output_path``; returns aggregate stats"""
+        skip = completed_ids(output_path) if resume else set()
+        if skip:
+            print(f"⏩ Resuming: {len(skip)} question(s) already answered in {output_path}")
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        self._stats = {"answered": 0, "failed": 0, "skipped": len(skip), "tool_answers": 0, "cached": 0,
+                       "latencies_ms": []}
+        started = time.perf_counter()
+        # Bounds the questions read ahead of the workers
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+
+        with open(output_path, "a" if resume else "w", encoding="utf-8") as output:
+            if resume:
+                self._terminate_partial_line(output_path, output)
+
+            def work(question_id, question, record):
+                try:
+                    self._write(output, self.run_one(question_id, question, record))
+                finally:
+                    slots.release()
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                try:
+                    for question_id, question, record in read_questions(input_path):
+                        if question_id in skip:
+                            continue
+                        while not slots.acquire(timeout=0.5):
+                            if self._stop.is_set():
+                                break
+                        if self._stop.is_set():
+                            break
+                        skip.add(question_id)  # duplicate ids are answered once
+                        executor.submit(work, question_id, question, record)
+                except KeyboardInterrupt:
+                    print("\n🛑 Interrupted: finishing the questions in flight, run again to resume")
+                    self.stop()
+
+        final = compact_output(output_path)
+        with self._lock:
+            self._stats["output_answered"] = final["answered"]
+            self._stats["output_failed"] = final["failed"]
+        return self.summary(time.perf_counter() - started)
+
+    def _terminate_partial_line(self, output_path: str, output):
+        """Start on a fresh line if the previous run was killed mid-write"""
+        if output.tell() == 0:
+            return
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                output.write("\n")
+
+    def _write(self, output, result: Dict[str, Any]):
+        with self._lock:
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            stats = self._stats
+            if result.get("failed"):
+                stats["failed"] += 1
+                print(f"❌ {result['id']}: {result['error']}")
+            else:
+                stats["answered"] += 1
+                stats["tool_answers"] += bool(result.get("toolCalls"))
+                stats["cached"] += bool(result.get("cached"))
+                stats["latencies_ms"].append(result["latency_ms"])
+            finished = stats["answered"] + stats["failed"]
+            if self.progress_every and finished % self.progress_every == 0:
+                print(f"📦 {finished} question(s) processed ({stats['failed']} failed)")
+
+    def summary(self, elapsed_seconds: float) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(stats.pop("latencies_ms"))
+        processed = stats["answered"] + stats["failed"]
+        stats["elapsed_seconds"] = round(elapsed_seconds, 1)
+        stats["questions_per_minute"] = round(processed / elapsed_seconds * 60, 2) if elapsed_seconds > 0 else 0.0
+        if latencies:
+            stats["latency_p50_ms"] = latencies[len(latencies) // 2]
+            stats["latency_p95_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        stats["interrupted"] = self._stop.is_set()
+        return stats
@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Optional
+
+POLISH_MODES = ("off", "on_request", "always")
+
+
+class DirectAnswerPolicy:
+    """Decides when a tool result is returned to the user without an LLM synthesis call.
+
+    Each tool in the MCP catalog may carry an ``answer_policy``:
+
+        {"mode": "direct", "template": "{result}"}
+
+    ``mode`` is "direct" or "synthesize" (the default). For direct tools the
+    result is formatted with ``template``, which may use ``{result}`` and the
+    tool call's parameters, and returned immediately. Error results are
+    always synthesized so the model can explain them.
+
+    ``polish`` controls when direct answers still go through the model:
+    "off" never, "on_request" when the chat request asks for it, "always"
+    for every request (which disables the shortcut).
+    """
+
+    def __init__(self, settings: Dict[str, Any] = None):
+        settings = settings or {}
+        self.enabled = settings.get("enabled", True)
+        self.polish = settings.get("polish", "on_request")
+        if self.polish not in POLISH_MODES:
+            print(f"⚠️ Unknown direct_answers.polish '{self.polish}', using 'on_request'")
+            self.polish = "on_request"
+
+    def answer(self, tool: Optional[Dict[str, Any]], tool_call: Dict[str, Any], tool_result: str,
+               polish_requested: bool = False) -> Optional[str]:
+        """Return the user-ready answer for a direct tool, or None if it needs synthesis"""
+        if not self.enabled or not tool or self.polish == "always":
+            return None
+        if polish_requested and self.polish == "on_request":
+            return None
+
+        policy = tool.get("answer_policy") or {}
+        if policy.get("mode") != "direct" or not tool_result or tool_result.startswith("Error"):
+            return None
+
+        try:
+            return policy.get("template", "{result}").format_map({**tool_call.get("parameters", {}), "result": tool_result})
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"⚠️ Bad answer template for {tool['name']}: {str(e)}")
+            return None
+
+    def answer_all(self, tools: List[Dict[str, Any]], tool_results: List[Dict[str, Any]],
+                   polish_requested: bool = False) -> Optional[str]:
+        """Direct answer for a turn with several tool calls: every call must qualify"""
+        tools_by_name = {tool["name"]: tool for tool in tools}
+        answers = []
+        for result in tool_results:
+            if "error" in result:
+                return None
+            answer = self.answer(tools_by_name.get(result["tool_name"]), result, result["result"], polish_requested)
+            if answer is None:
+                return None
+            answers.append(answer)
+        return "\n".join(answers) if answers else None
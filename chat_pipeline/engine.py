@@ -0,0 +1,668 @@
+"""
+One implementation of the chat pipeline for the CLI, the Flask app and the ASGI app.
+
+``ChatEngine`` holds the pipeline logic as stages (route, decide, execute,
+synthesize, fallback, plus the answer cache lookup). Stages never talk to
+Ollama or the MCP server themselves: they yield small effect objects
+(``OpenStream``, ``NextChunk``, ``ExecuteTools``, ...) and get the result
+back from a driver. ``SyncDriver`` performs them with the blocking clients,
+``AsyncDriver`` with the asyncio ones, so the same stages run in both.
+
+Both drivers yield the pipeline's events ('decision', 'tool_start',
+'tool_result', 'queued', 'token', 'cache_hit', 'done') and record the
+seconds spent in each stage in ``ChatContext.timings``, with the scheduler
+wait under ``queue`` and not in the stage that waited.
+"""
+import asyncio
+import inspect
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from chat_pipeline import tracing
+from chat_pipeline.agent import AgentTurn
+from chat_pipeline.answer_cache import normalize_question
+from chat_pipeline.parsing import IncrementalDecisionParser
+from chat_pipeline.scheduler import PRIORITY_INTERACTIVE
+from chat_pipeline.timings import generation_stats, stopped_generation_stats
+from chat_pipeline.tool_calling import NATIVE_SYSTEM_PROMPT, build_ollama_tools, tool_calls_from_message
+
+@dataclass
+class ChatContext:
+    """Everything one chat turn knows, filled in stage by stage"""
+    user_message: str
+    session_id: Optional[str] = None
+    priority: int = PRIORITY_INTERACTIVE
+    polish: bool = False
+    # Incoming W3C traceparent header, if the caller is already tracing this request
+    traceparent: Optional[str] = None
+    trace_id: Optional[str] = None
+    tools: List[Dict[str, Any]] = field(default_factory=list)
+    decision_source: Optional[str] = None
+    # [] when no tool is needed, None when the decision could not be parsed
+    tool_calls: Optional[List[Dict[str, Any]]] = None
+    # The latest decision asked for another round once its calls ran
+    needs_followup: bool = False
+    agent: Optional[AgentTurn] = None
+    new_calls: List[Dict[str, Any]] = field(default_factory=list)
+    tool_summaries: List[Dict[str, Any]] = field(default_factory=list)
+    content: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+    direct: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Ollama counters per generation and MCP round-trip vs execution time, for timing_report()
+    generations: List[Dict[str, Any]] = field(default_factory=list)
+    mcp: Dict[str, float] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+    def add_timing(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def timing_report(self) -> Dict[str, Any]:
+        """Latency breakdown of the turn: stage wall times, Ollama prefill/decode and MCP time, in ms"""
+        report = {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": {name: round(seconds * 1000, 1) for name, seconds in self.timings.items()},
+            "ollama": self.generations
+        }
+        if self.mcp:
+            report["mcp"] = {
+                **{key: round(value, 1) for key, value in self.mcp.items()},
+                "network_ms": round(max(self.mcp["round_trip_ms"] - self.mcp["execution_ms"], 0.0), 1)
+            }
+        return report
+
+    def done_event(self) -> Dict[str, Any]:
+        """The final event; carries the same fields that /api/chat returns"""
+        event = {'type': 'done', 'content': self.content or "", 'toolCalls': self.tool_summaries,
+                 'timings': self.timing_report()}
+        if self.error:
+            event['error'] = self.error
+        if self.cached:
+            event['cached'] = True
+        if self.direct:
+            event['direct'] = True
+        if self.trace_id:
+            event['traceId'] = self.trace_id
+        return event
+
+
+# Effects: what a stage asks its driver to do
+
+@dataclass
+class ListTools:
+    pass
+
+
+@dataclass
+class OpenStream:
+    """Take a scheduler slot and start a streaming Ollama chat; the reply is a stream handle"""
+    model: str
+    messages: List[Dict[str, Any]]
+    options: Dict[str, Any]
+    format: Optional[Dict[str, Any]] = None
+    tools: Optional[List[Dict[str, Any]]] = None
+    think: Optional[bool] = None
+
+
+@dataclass
+class NextChunk:
+    """Reply is the stream's next chunk, or None once it is exhausted"""
+    stream: Any
+
+
+@dataclass
+class CloseStream:
+    """Stop the generation and hand the scheduler slot back"""
+    stream: Any
+
+
+@dataclass
+class ExecuteTools:
+    tool_calls: List[Dict[str, Any]]
+
+
+@dataclass
+class Embed:
+    model: str
+    text: str
+
+
+@dataclass
+class CacheLookup:
+    """Score the question against the answer cache; the reply is the cached answer or None"""
+    normalized_question: str
+    embedding: List[float]
+
+
+class StreamHandle:
+    """An open Ollama stream and the scheduler ticket it holds"""
+
+    def __init__(self, model: str, ticket=None):
+        self.model = model
+        self.ticket = ticket
+        self.chunks = None
+        self.closed = False
+
+
+class ChatEngine:
+    """The chat pipeline as a sequence of stages over a ``ChatContext``.
+
+    ``run`` drives the stages; each stage is a method taking the context
+    and may be a plain function or a generator of events and effects.
+    Subclass and override a stage to change one step of the pipeline
+    without touching the drivers or the front ends.
+    """
+
+    def __init__(self, config: Dict[str, Any], prompt_builder, model_roles, rules_router,
+                 direct_answers, answer_cache=None, timing_log=None):
+        self.config = config
+        self.prompt_builder = prompt_builder
+        self.model_roles = model_roles
+        self.rules_router = rules_router
+        self.direct_answers = direct_answers
+        self.answer_cache = answer_cache
+        self.timing_log = timing_log
+
+    def run(self, ctx: ChatContext):
+        """Run one chat turn inside its trace, yielding events (dicts) and effects for the driver"""
+        with tracing.span("chat", {"session_id": ctx.session_id, "priority": ctx.priority},
+                          traceparent=ctx.traceparent) as root:
+            if root is not None:
+                ctx.trace_id = root.trace_id
+            yield from self.turn(ctx)
+
+    def turn(self, ctx: ChatContext):
+        embedding = yield from self.stage(ctx, "cache")
+        if ctx.cached:
+            yield self.finish(ctx)
+            return
+
+        ctx.tools = yield ListTools()
+        yield from self.stage(ctx, "route")
+        if ctx.decision_source is None:
+            yield from self.stage(ctx, "decide")
+
+        if not ctx.tool_calls:
+            yield {'type': 'decision', 'source': ctx.decision_source, 'step': 1, 'toolCalls': []}
+            # Native tool calling may already have answered while deciding
+            if ctx.content is None:
+                yield from self.stage(ctx, "synthesize")
+        else:
+            # Run more rounds of tool calls only while the decision asks for a follow-up and budgets allow
+            ctx.agent = AgentTurn.from_config(self.config.get("agent"), chainable=ctx.needs_followup)
+            while True:
+                yield from self.stage(ctx, "execute")
+                if not ctx.agent.can_continue(ctx.new_calls):
+                    break
+                print(f"🔁 Step {ctx.agent.step + 1}: asking AI for follow-up tool calls ({ctx.agent.elapsed():.1f}s elapsed)")
+                yield from self.stage(ctx, "decide")
+                if not ctx.tool_calls:
+                    ctx.agent.stop_reason = "results sufficient"
+                    break
+                ctx.agent.chainable = ctx.needs_followup
+            print(f"🏁 Tool loop finished after {ctx.agent.step} step(s): {ctx.agent.stop_reason}")
+
+            if all('error' in r for r in ctx.agent.results):
+                yield from self.stage(ctx, "fallback")
+            else:
+                yield from self.stage(ctx, "synthesize")
+
+        if embedding and not ctx.error:
+            self.answer_cache.store(normalize_question(ctx.user_message), embedding, ctx.content, ctx.tool_summaries)
+        yield self.finish(ctx)
+
+    def finish(self, ctx: ChatContext) -> Dict[str, Any]:
+        """Build the 'done' event and log the turn's latency breakdown"""
+        event = ctx.done_event()
+        timings = event['timings']
+        root = tracing.current_span()
+        if root is not None:
+            root.set_attributes({
+                "decision_source": ctx.decision_source,
+                "tools": [summary['name'] for summary in ctx.tool_summaries],
+                "cached": ctx.cached,
+                "direct": ctx.direct
+            })
+            if ctx.error:
+                root.record_error(Exception(ctx.error))
+        print("⏱️ Stages: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in timings['stages'].items())
+              + f" (total {timings['total_ms']:.0f}ms)")
+        if self.timing_log is not None:
+            self.timing_log.write({
+                "trace_id": ctx.trace_id,
+                "session_id": ctx.session_id,
+                "priority": ctx.priority,
+                "decision_source": ctx.decision_source,
+                "tools": [summary['name'] for summary in ctx.tool_summaries],
+                "cached": ctx.cached,
+                "direct": ctx.direct,
+                "error": ctx.error,
+                "timings": timings
+            })
+        return event
+
+    def stage(self, ctx: ChatContext, name: str):
+        """Run one stage, adding its time to ``ctx.timings``; returns the stage's result.
+
+        Stage times are exclusive: a scheduler wait during the stage is only
+        counted under ``queue``, so the stages and ``queue`` add up to the turn.
+        """
+        started = time.perf_counter()
+        queued_before = ctx.timings.get("queue", 0.0)
+        try:
+            with tracing.span(f"stage.{name}"):
+                result = getattr(self, name)(ctx)
+                if inspect.isgenerator(result):
+                    result = yield from result
+                return result
+        finally:
+            queued = ctx.timings.get("queue", 0.0) - queued_before
+            ctx.add_timing(name, time.perf_counter() - started - queued)
+
+    def stream_text(self, ctx: ChatContext, role: str, messages: List[Dict[str, Any]]):
+        """Stream a chat with the model of ``role`` as token events and return the full text"""
+        content = ""
+        with tracing.span("ollama.chat", {"role": role, "model": self.model_roles.model(role)}):
+            stream = yield OpenStream(self.model_roles.model(role), messages, self.model_roles.options(role))
+            while True:
+                chunk = yield NextChunk(stream)
+                if chunk is None:
+                    break
+                self.record_generation(ctx, role, chunk)
+                token = chunk["message"]["content"]
+                if token:
+                    content += token
+                    yield {'type': 'token', 'content': token}
+            yield CloseStream(stream)
+        return content
+
+    def record_generation(self, ctx: ChatContext, role: str, chunk):
+        """Keep Ollama's counters from the final chunk, also on the current 'ollama.chat' span"""
+        if chunk.get("done"):
+            stats = generation_stats(role, self.model_roles.model(role), chunk)
+            ctx.generations.append(stats)
+            current = tracing.current_span()
+            if current is not None:
+                current.set_attributes(stats)
+
+    # Stages
+
+    def cache(self, ctx: ChatContext):
+        """Answer from the semantic cache; returns the question's embedding so ``run`` can store the answer"""
+        # A polished answer was explicitly requested, so never serve a cached direct one
+        if self.answer_cache is None or not self.answer_cache.enabled or ctx.polish:
+            return None
+        normalized_question = normalize_question(ctx.user_message)
+        try:
+            embedding = yield Embed(self.answer_cache.embedding_model, normalized_question)
+        except Exception as e:
+            self.answer_cache.record_embed_error()
+            print(f"⚠️ Answer cache embedding failed ({self.answer_cache.embedding_model}): {str(e)}")
+            return None
+
+        cached = yield CacheLookup(normalized_question, embedding)
+        if cached:
+            print(f"💾 Answer cache hit ({cached['similarity']}): {cached['question']}")
+            yield {'type': 'cache_hit', 'similarity': cached['similarity'], 'question': cached['question']}
+            ctx.content, ctx.tool_summaries, ctx.cached = cached['content'], cached['toolCalls'], True
+        return embedding
+
+    def route(self, ctx: ChatContext):
+        """Rules pre-router: decides obvious queries without an LLM call"""
+        routed = self.rules_router.route(ctx.user_message)
+        if routed is not None:
+            ctx.decision_source = 'rules'
+            ctx.tool_calls = [] if isinstance(routed, str) else [routed]
+            print(f"⚡ Rules router decision: {routed if isinstance(routed, str) else json.dumps(routed)}")
+
+    def decide(self, ctx: ChatContext):
+        """Ask the model for the first round of tool calls, or for a follow-up round"""
+        if ctx.agent is not None:
+            ctx.tool_calls = yield from self.decide_tool_calls(
+                ctx, self.prompt_builder.followup_messages(ctx.tools, ctx.user_message, ctx.agent.results)
+            )
+        elif self.config["ollama"].get("tool_calling") == "native":
+            print("🔍 Asking AI with native tool calling...")
+            ctx.decision_source = 'native'
+            yield from self.decide_native(ctx)
+        else:
+            print("🔍 Asking AI for tool decision...")
+            ctx.decision_source = 'llm'
+            ctx.tool_calls = yield from self.decide_tool_calls(
+                ctx, self.prompt_builder.decision_messages(ctx.tools, ctx.user_message)
+            )
+
+    def decide_tool_calls(self, ctx: ChatContext, messages: List[Dict[str, Any]]):
+        """Stream a router decision and return its tool calls ([] for none, None if unparseable).
+
+        Generation is stopped as soon as the decision object is complete.
+        """
+        decision_parser = IncrementalDecisionParser()
+        with tracing.span("ollama.chat", {"role": "router", "model": self.model_roles.model("router")}) as decision_span:
+            stream = yield OpenStream(
+                self.model_roles.model("router"),
+                messages,
+                self.model_roles.options("router"),
+                format=self.prompt_builder.decision_format(ctx.tools),
+                think=self.model_roles.think("router")
+            )
+            while True:
+                chunk = yield NextChunk(stream)
+                if chunk is None:
+                    break
+                self.record_generation(ctx, "router", chunk)
+                if decision_parser.feed(chunk["message"]["content"]) is not None:
+                    # Closing the stream makes Ollama stop generating the trailing tokens
+                    print(f"✂️ Decision complete after {decision_parser.tokens} tokens, generation stopped")
+                    if not chunk.get("done"):
+                        stats = stopped_generation_stats("router", self.model_roles.model("router"), decision_parser.tokens)
+                        ctx.generations.append(stats)
+                        if decision_span is not None:
+                            decision_span.set_attributes(stats)
+                    break
+            yield CloseStream(stream)
+
+        tool_calls = decision_parser.finish()
+        ctx.needs_followup = decision_parser.needs_followup
+        print(f"🧠 AI decision: {json.dumps(tool_calls) if tool_calls is not None else decision_parser.text.strip()}")
+        if tool_calls is None:
+            print("⚠️ Could not extract tool calls, providing direct response...")
+        return tool_calls
+
+    def decide_native(self, ctx: ChatContext):
+        """Native tool calling: one generation either answers (streamed as tokens) or emits tool_calls"""
+        content = ""
+        ctx.tool_calls = []
+        with tracing.span("ollama.chat", {"role": "answer", "model": self.model_roles.model("answer"), "native_tools": True}):
+            stream = yield OpenStream(
+                self.model_roles.model("answer"),
+                [
+                    {"role": "system", "content": NATIVE_SYSTEM_PROMPT},
+                    {"role": "user", "content": ctx.user_message}
+                ],
+                self.model_roles.options("answer"),
+                tools=build_ollama_tools(ctx.tools)
+            )
+            while True:
+                chunk = yield NextChunk(stream)
+                if chunk is None:
+                    break
+                self.record_generation(ctx, "answer", chunk)
+                ctx.tool_calls = ctx.tool_calls or tool_calls_from_message(chunk["message"])
+                token = chunk["message"]["content"]
+                if token and not ctx.tool_calls:
+                    content += token
+                    yield {'type': 'token', 'content': token}
+            yield CloseStream(stream)
+
+        if ctx.tool_calls:
+            print(f"🧠 AI tool calls: {json.dumps(ctx.tool_calls)}")
+        else:
+            print("💬 Model answered directly, no tool needed")
+            ctx.content = content
+
+    def execute(self, ctx: ChatContext):
+        """Run one round of tool calls concurrently via MCP, reusing results of repeated calls"""
+        agent = ctx.agent
+        reused, ctx.new_calls = agent.begin_step(ctx.tool_calls)
+        yield {'type': 'decision', 'source': ctx.decision_source, 'step': agent.step, 'toolCalls': ctx.tool_calls}
+
+        tool_results = []
+        if ctx.new_calls:
+            try:
+                for tool_call in ctx.new_calls:
+                    print(f"🚀 Step {agent.step}: executing {tool_call['tool_name']} with params: {tool_call['parameters']}")
+                    yield {'type': 'tool_start', 'step': agent.step, 'name': tool_call['tool_name'], 'parameters': tool_call['parameters']}
+                requested = time.perf_counter()
+                tool_results = yield ExecuteTools(ctx.new_calls)
+                # Calls of a batch run concurrently on the server, so the slowest one is its execution time
+                ctx.mcp["round_trip_ms"] = ctx.mcp.get("round_trip_ms", 0.0) + (time.perf_counter() - requested) * 1000
+                ctx.mcp["execution_ms"] = ctx.mcp.get("execution_ms", 0.0) + max(r.get('duration_ms', 0.0) for r in tool_results)
+                ctx.mcp["calls"] = ctx.mcp.get("calls", 0) + len(tool_results)
+            except Exception as tool_error:
+                tool_results = [{**tool_call, 'error': str(tool_error)} for tool_call in ctx.new_calls]
+        agent.record(tool_results)
+
+        for tool_result in reused + tool_results:
+            result_text = tool_result['result'] if 'error' not in tool_result else f"Error: {tool_result['error']}"
+            print(f"🔍 {tool_result['tool_name']} result{' (reused)' if tool_result.get('reused') else ''}: {len(result_text)} characters")
+            tool_summary = {
+                'name': tool_result['tool_name'],
+                'parameters': tool_result['parameters'],
+                'result': result_text[:500] + "..." if len(result_text) > 500 else result_text
+            }
+            if not tool_result.get('reused'):
+                ctx.tool_summaries.append(tool_summary)
+            yield {'type': 'tool_result', 'step': agent.step, 'reused': bool(tool_result.get('reused')), **tool_summary}
+
+    def synthesize(self, ctx: ChatContext):
+        """Write the final answer: directly without tools, from the tool results otherwise"""
+        if ctx.agent is None:
+            print("💬 No tool needed, generating direct response...")
+            ctx.content = yield from self.stream_text(ctx, "answer", self.prompt_builder.direct_messages(ctx.user_message))
+            return
+
+        tool_results = ctx.agent.results
+        # Self-explanatory tool results are returned as-is, skipping the synthesis generation
+        direct_content = self.direct_answers.answer_all(ctx.tools, tool_results, ctx.polish)
+        if direct_content is not None:
+            print(f"⚡ Direct answer from {', '.join(r['tool_name'] for r in tool_results)}, skipping synthesis")
+            yield {'type': 'token', 'content': direct_content}
+            ctx.content, ctx.direct = direct_content, True
+            return
+
+        print("🤖 Generating final response with tool results...")
+        ctx.content = yield from self.stream_text(
+            ctx,
+            "synthesis",
+            self.prompt_builder.synthesis_messages(
+                ctx.user_message,
+                [{'name': r['tool_name'], 'result': r['result'] if 'error' not in r else f"Error: {r['error']}"}
+                 for r in tool_results]
+            )
+        )
+        print(f"✅ Final response generated: {len(ctx.content)} characters")
+
+    def fallback(self, ctx: ChatContext):
+        """Every tool call failed: answer without the tools and report the error"""
+        errors = [r['error'] for r in ctx.agent.results]
+        print(f"❌ Tool execution error: {'; '.join(errors)}")
+        ctx.content = yield from self.stream_text(
+            ctx, "answer", self.prompt_builder.fallback_messages(ctx.user_message, "; ".join(errors))
+        )
+        ctx.tool_summaries = []
+        ctx.error = f'Tool execution failed: {"; ".join(errors)}'
+
+
+class SyncDriver:
+    """Runs a ``ChatEngine`` with the blocking Ollama and MCP clients (Flask app, CLI).
+
+    ``scheduler`` and ``residency`` are optional: without them streams start
+    immediately and use Ollama's default keep_alive.
+    """
+
+    def __init__(self, engine: ChatEngine, ollama_client, mcp_client, scheduler=None, residency=None):
+        self.engine = engine
+        self.ollama_client = ollama_client
+        self.mcp_client = mcp_client
+        self.scheduler = scheduler
+        self.residency = residency
+
+    def events(self, ctx: ChatContext):
+        """Run one chat turn, yielding its events"""
+        steps = self.engine.run(ctx)
+        streams = []
+        reply, error = None, None
+        try:
+            while True:
+                try:
+                    item = steps.throw(error) if error is not None else steps.send(reply)
+                except StopIteration:
+                    return
+                reply, error = None, None
+                if isinstance(item, dict):
+                    yield item
+                    continue
+                try:
+                    if isinstance(item, OpenStream):
+                        stream = StreamHandle(item.model)
+                        streams.append(stream)
+                        if self.scheduler is not None:
+                            stream.ticket = self.scheduler.enqueue(ctx.session_id, ctx.priority)
+                            yield from self.scheduler.wait_events(stream.ticket)
+                            ctx.add_timing("queue", time.monotonic() - stream.ticket.enqueued_at)
+                        reply = self.open(item, stream)
+                    else:
+                        reply = self.perform(item)
+                except Exception as e:
+                    error = e
+        finally:
+            steps.close()
+            for stream in streams:
+                self.close(stream)
+
+    def open(self, effect: OpenStream, stream: StreamHandle) -> StreamHandle:
+        stream.chunks = self.ollama_client.chat(
+            model=effect.model,
+            messages=effect.messages,
+            options=effect.options,
+            format=effect.format,
+            tools=effect.tools,
+            think=effect.think,
+            stream=True,
+            keep_alive=self.residency.keep_alive() if self.residency is not None else None
+        )
+        return stream
+
+    def perform(self, effect):
+        if isinstance(effect, NextChunk):
+            chunk = next(effect.stream.chunks, None)
+            observe_chunk(self.residency, effect.stream, chunk)
+            return chunk
+        if isinstance(effect, CloseStream):
+            return self.close(effect.stream)
+        if isinstance(effect, ExecuteTools):
+            return self.mcp_client.execute_tools(effect.tool_calls)
+        if isinstance(effect, ListTools):
+            # Every turn that misses the answer cache lists the tools first
+            if self.residency is not None:
+                self.residency.note_request()
+            return self.mcp_client.get_tools()
+        if isinstance(effect, Embed):
+            return self.ollama_client.embed(model=effect.model, input=effect.text)["embeddings"][0]
+        if isinstance(effect, CacheLookup):
+            return self.engine.answer_cache.lookup(effect.normalized_question, effect.embedding)
+        raise Exception(f"Unknown pipeline effect: {effect!r}")
+
+    def close(self, stream: StreamHandle):
+        if stream.closed:
+            return
+        stream.closed = True
+        try:
+            if stream.chunks is not None:
+                stream.chunks.close()
+        finally:
+            if stream.ticket is not None:
+                self.scheduler.release(stream.ticket)
+
+
+class AsyncDriver:
+    """Runs a ``ChatEngine`` with ``ollama.AsyncClient`` and ``AsyncMCPClient`` (ASGI app)"""
+
+    def __init__(self, engine: ChatEngine, ollama_client, mcp_client, scheduler=None, residency=None):
+        self.engine = engine
+        self.ollama_client = ollama_client
+        self.mcp_client = mcp_client
+        self.scheduler = scheduler
+        self.residency = residency
+
+    async def events(self, ctx: ChatContext):
+        """Run one chat turn, yielding its events"""
+        steps = self.engine.run(ctx)
+        streams = []
+        reply, error = None, None
+        try:
+            while True:
+                try:
+                    item = steps.throw(error) if error is not None else steps.send(reply)
+                except StopIteration:
+                    return
+                reply, error = None, None
+                if isinstance(item, dict):
+                    yield item
+                    continue
+                try:
+                    if isinstance(item, OpenStream):
+                        stream = StreamHandle(item.model)
+                        streams.append(stream)
+                        if self.scheduler is not None:
+                            stream.ticket = self.scheduler.enqueue(ctx.session_id, ctx.priority, loop=asyncio.get_running_loop())
+                            async for event in self.scheduler.wait_events_async(stream.ticket):
+                                yield event
+                            ctx.add_timing("queue", time.monotonic() - stream.ticket.enqueued_at)
+                        reply = await self.open(item, stream)
+                    else:
+                        reply = await self.perform(item)
+                except Exception as e:
+                    error = e
+        finally:
+            steps.close()
+            for stream in streams:
+                await self.close(stream)
+
+    async def open(self, effect: OpenStream, stream: StreamHandle) -> StreamHandle:
+        stream.chunks = await self.ollama_client.chat(
+            model=effect.model,
+            messages=effect.messages,
+            options=effect.options,
+            format=effect.format,
+            tools=effect.tools,
+            think=effect.think,
+            stream=True,
+            keep_alive=self.residency.keep_alive() if self.residency is not None else None
+        )
+        return stream
+
+    async def perform(self, effect):
+        if isinstance(effect, NextChunk):
+            try:
+                chunk = await effect.stream.chunks.__anext__()
+            except StopAsyncIteration:
+                chunk = None
+            observe_chunk(self.residency, effect.stream, chunk)
+            return chunk
+        if isinstance(effect, CloseStream):
+            return await self.close(effect.stream)
+        if isinstance(effect, ExecuteTools):
+            return await self.mcp_client.execute_tools(effect.tool_calls)
+        if isinstance(effect, ListTools):
+            # Every turn that misses the answer cache lists the tools first
+            if self.residency is not None:
+                self.residency.note_request()
+            return await self.mcp_client.get_tools()
+        if isinstance(effect, Embed):
+            return (await self.ollama_client.embed(model=effect.model, input=effect.text))["embeddings"][0]
+        if isinstance(effect, CacheLookup):
+            # Scoring a full cache takes milliseconds; keep it off the event loop
+            return await asyncio.to_thread(self.engine.answer_cache.lookup, effect.normalized_question, effect.embedding)
+        raise Exception(f"Unknown pipeline effect: {effect!r}")
+
+    async def close(self, stream: StreamHandle):
+        if stream.closed:
+            return
+        stream.closed = True
+        try:
+            if stream.chunks is not None:
+                await stream.chunks.aclose()
+        finally:
+            if stream.ticket is not None:
+                self.scheduler.release(stream.ticket)
+
+
+def observe_chunk(residency, stream: StreamHandle, chunk):
+    """Report the final chunk of a resident model's stream to the residency manager"""
+    if chunk and chunk.get("done") and residency is not None and stream.model == residency.model:
+        residency.observe(chunk)
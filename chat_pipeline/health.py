@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+
+class HealthMonitor:
+    """Background health checks for Ollama and the MCP server.
+
+    Probes use cheap endpoints only (Ollama model list and loaded models, MCP
+    /health) and never run a generation. The latest result is kept as a
+    snapshot that every /api/status caller reads, so the probe cost does not
+    grow with the number of open browser tabs.
+    """
+
+    def __init__(self, ollama_client, mcp_client, model: str, interval: float = 10, ttl: float = 30):
+        self.ollama_client = ollama_client
+        self.mcp_client = mcp_client
+        self.model = model
+        self.interval = interval
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Probe once, then keep refreshing the snapshot every ``interval`` seconds"""
+        if self._thread is not None:
+            return
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the cached snapshot, probing inline only if it is older than ``ttl``"""
+        with self._lock:
+            fresh = self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl
+        if not fresh:
+            self.refresh()
+
+        with self._lock:
+            return {**self._snapshot, "age_seconds": round(time.monotonic() - self._checked_at, 1)}
+
+    def refresh(self):
+        # Concurrent callers wait for the probe in flight instead of starting their own
+        with self._probe_lock:
+            with self._lock:
+                if self._snapshot is not None and time.monotonic() - self._checked_at < 1:
+                    return
+            snapshot = self.probe()
+            with self._lock:
+                self._snapshot = snapshot
+                self._checked_at = time.monotonic()
+
+    def probe(self) -> Dict[str, Any]:
+        snapshot = {
+            "status": "healthy",
+            "mcp_server": "connected",
+            "ollama": "connected",
+            "model": self.model,
+            "model_available": False,
+            "model_loaded": False,
+            "tools_available": 0,
+            "checked_at": datetime.now(timezone.utc).isoformat()
+        }
+        errors = []
+
+        try:
+            mcp_health = self.mcp_client.health()
+            snapshot["tools_available"] = len(mcp_health.get("tools", []))
+        except Exception as e:
+            snapshot["mcp_server"] = "disconnected"
+            errors.append(str(e))
+
+        try:
+            available = [m["model"] for m in self.ollama_client.list()["models"]]
+            loaded = [m["model"] for m in self.ollama_client.ps()["models"]]
+            snapshot["model_available"] = any(self._same_model(name) for name in available)
+            snapshot["model_loaded"] = any(self._same_model(name) for name in loaded)
+            if not snapshot["model_available"]:
+                errors.append(f"Model '{self.model}' not found in Ollama")
+        except Exception as e:
+            snapshot["ollama"] = "disconnected"
+            errors.append(f"Ollama unreachable: {str(e)}")
+
+        if errors:
+            snapshot["status"] = "error"
+            snapshot["error"] = "; ".join(errors)
+        return snapshot
+
+    def _same_model(self, name: str) -> bool:
+        # Ollama reports "ai_app_model:latest" for a model configured as "ai_app_model"
+        return name == self.model or (":" not in self.model and name.split(":")[0] == self.model)
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+
+ROLES = ("router", "answer", "synthesis")
+OPTION_KEYS = ("temperature", "top_p", "top_k", "num_ctx", "num_predict")
+# Used when config.json does not set the role's options
+DEFAULT_ROLE_OPTIONS = {
+    # Lower temperature for factual answers, and room for a longer response
+    "synthesis": {"temperature": 0.3, "num_predict": 500}
+}
+
+
+class ModelRoles:
+    """Maps each pipeline stage to its own Ollama model and generation options.
+
+    Roles are configured under ``ollama.roles`` in config.json:
+
+    - ``router``: the tool decision, which only emits a tiny JSON object
+    - ``answer``: direct answers (no tool) and tool-failure fallbacks
+    - ``synthesis``: the final answer written from a tool result
+
+    A role without a ``model`` uses ``ollama.model``; its ``options`` are
+    layered over the global options (temperature, top_p, ...). ``think``
+    turns a thinking model's reasoning on or off for the role (unset leaves
+    the model's default).
+    """
+
+    def __init__(self, ollama_config: Dict[str, Any]):
+        self.default_model = ollama_config["model"]
+        self.base_options = {key: ollama_config[key] for key in OPTION_KEYS if key in ollama_config}
+        self.roles = ollama_config.get("roles", {})
+        for role in self.roles:
+            if role not in ROLES:
+                print(f"⚠️ Unknown model role '{role}' in config (expected one of {', '.join(ROLES)})")
+
+    def model(self, role: str) -> str:
+        return self.roles.get(role, {}).get("model") or self.default_model
+
+    def options(self, role: str) -> Dict[str, Any]:
+        role_options = self.roles.get(role, {}).get("options", DEFAULT_ROLE_OPTIONS.get(role, {}))
+        return {**self.base_options, **role_options}
+
+    def think(self, role: str) -> Optional[bool]:
+        return self.roles.get(role, {}).get("think")
+
+    def models(self) -> List[str]:
+        """Distinct models used by any role, the default model first"""
+        models = [self.default_model]
+        for role in ROLES:
+            if self.model(role) not in models:
+                models.append(self.model(role))
+        return models
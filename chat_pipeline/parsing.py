@@ -0,0 +1,158 @@
+import json
+import re
+
+from chat_pipeline.tool_calling import MAX_TOOL_CALLS
+
+# Reasoning blocks some models emit before the answer; an unclosed block runs to the end
+THINKING_PATTERN = re.compile(r'<(think|thinking)>.*?(</\1>|$)', flags=re.DOTALL | re.IGNORECASE)
+
+NO_TOOL_SENTINEL = "NO_TOOL_NEEDED"
+THINK_OPEN_TAGS = ("<think>", "<thinking>")
+
+_decoder = json.JSONDecoder()
+
+
+def strip_thinking(response_text):
+    """Remove <think>/<Thinking> reasoning blocks from a model response"""
+    return THINKING_PATTERN.sub('', response_text)
+
+
+def tool_calls_from_decision(parsed):
+    """Normalize a parsed decision object to a list of tool calls, or None if it is not a decision.
+
+    Accepts ``{"tool_calls": [...]}`` as well as a single ``{"tool_name",
+    "parameters"}`` object; a NO_TOOL_NEEDED tool name means no tool.
+    """
+    if not isinstance(parsed, dict):
+        return None
+    if isinstance(parsed.get("tool_calls"), list):
+        calls = [call for call in parsed["tool_calls"]
+                 if isinstance(call, dict) and "tool_name" in call and "parameters" in call]
+    elif "tool_name" in parsed and "parameters" in parsed:
+        calls = [parsed]
+    else:
+        return None
+    return [call for call in calls if str(call["tool_name"]).upper() != NO_TOOL_SENTINEL][:MAX_TOOL_CALLS]
+
+
+def needs_followup(parsed):
+    """Whether a parsed decision object asks for another round after its calls ran"""
+    return isinstance(parsed, dict) and parsed.get("needs_followup") is True
+
+
+def extract_tool_calls(response_text):
+    """Return the tool calls of a whole decision response ([] for no tool), or None if it has no decision"""
+    cleaned_text = strip_thinking(response_text)
+    start = cleaned_text.find('{')
+    while start != -1:
+        try:
+            parsed, _ = _decoder.raw_decode(cleaned_text, start)
+            tool_calls = tool_calls_from_decision(parsed)
+            if tool_calls is not None:
+                return tool_calls
+        except json.JSONDecodeError:
+            pass
+        start = cleaned_text.find('{', start + 1)
+    if NO_TOOL_SENTINEL in cleaned_text.upper():
+        return []
+    return None
+
+
+class IncrementalDecisionParser:
+    """Finds the tool decision in a streamed response as soon as it is complete.
+
+    Feed each generated token to ``feed``; it returns the decision, a list of
+    tool calls, once the first top-level decision object closes, or an empty
+    list once the bare ``NO_TOOL_NEEDED`` sentinel appears, so the caller can
+    stop generating. Text inside <think>/<thinking> blocks is skipped.
+    ``finish`` returns the decision of the whole response (None if there is
+    none) when the stream ended without one. ``needs_followup`` tells whether
+    the decision object asked for another round of tool calls.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.tokens = 0
+        self.decision = None
+        self.needs_followup = False
+        self._pos = 0
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escape = False
+        self._think_close = None
+        self._outside = ""
+
+    def feed(self, token: str):
+        if self.decision is not None or not token:
+            return self.decision
+        self.text += token
+        self.tokens += 1
+        self._scan()
+        return self.decision
+
+    def finish(self):
+        if self.decision is None:
+            self.decision = extract_tool_calls(self.text)
+        return self.decision
+
+    def _scan(self):
+        text = self.text
+        while self._pos < len(text) and self.decision is None:
+            if self._think_close:
+                # Only the unscanned text is lowered; _pos stays a tag's length from the end
+                end = text[self._pos:].lower().find(self._think_close)
+                if end == -1:
+                    # Keep enough of the tail to match a close tag split across tokens
+                    self._pos = max(self._pos, len(text) - len(self._think_close) + 1)
+                    return
+                self._pos += end + len(self._think_close)
+                self._think_close = None
+                continue
+
+            char = text[self._pos]
+            if self._depth == 0:
+                if char == "<":
+                    rest = text[self._pos:self._pos + 10].lower()
+                    tag = next((t for t in THINK_OPEN_TAGS if rest.startswith(t)), None)
+                    if tag:
+                        self._think_close = "</" + tag[1:]
+                        self._pos += len(tag)
+                        continue
+                    if any(t.startswith(rest) for t in THINK_OPEN_TAGS):
+                        return  # possibly an open tag split across tokens
+                elif char == "{":
+                    self._start = self._pos
+                    self._depth = 1
+                else:
+                    # Only the last len(NO_TOOL_SENTINEL) characters can complete the sentinel
+                    self._outside = (self._outside + char)[-len(NO_TOOL_SENTINEL):]
+                    if self._outside.upper() == NO_TOOL_SENTINEL:
+                        self.decision = []
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_object(text[self._start:self._pos + 1])
+            self._pos += 1
+
+    def _close_object(self, candidate: str):
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            return
+        self.decision = tool_calls_from_decision(parsed)
+        self.needs_followup = self.decision is not None and needs_followup(parsed)
@@ -0,0 +1,202 @@
+"""
+On-demand profiling for the web apps and the MCP server.
+
+Three tools, all behind the admin token and only wired up when
+``profiling.enabled`` is set in config.json (``configure`` returns None
+otherwise and the apps register no routes or hooks, so a disabled profiler
+costs nothing):
+
+- ``sample``: a sampling CPU profile of every thread of the process for N
+  seconds, as collapsed stacks ("frame;frame;frame count" lines) that
+  flamegraph.pl, speedscope or inferno read directly
+- per-request ``cProfile``: a request carrying ``X-Profile: 1`` is profiled;
+  the stats are saved as ``<profile_dir>/<id>.prof`` (snakeviz, pstats) and
+  the id is returned in the ``X-Profile-Id`` response header
+- ``tracemalloc``: start tracing, take top-allocation snapshots and diff
+  each snapshot against the previous one
+"""
+import cProfile
+import io
+import os
+import pstats
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Optional
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class Profiler:
+    """Profiling tools of one process; see the module docstring"""
+
+    def __init__(self, max_sample_seconds: float = 60, sample_interval_ms: float = 10,
+                 profile_dir: str = "logs/profiles", memory_frames: int = 10):
+        self.max_sample_seconds = max_sample_seconds
+        self.sample_interval_ms = sample_interval_ms
+        self.profile_dir = profile_dir
+        self.memory_frames = memory_frames
+        # cProfile cannot run two profilers at once (Python 3.12+), and one sampler is enough
+        self._request_lock = threading.Lock()
+        self._sample_lock = threading.Lock()
+        self._memory_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._last_snapshot = None
+        self._active = None
+        os.makedirs(profile_dir, exist_ok=True)
+
+    # Sampling CPU profile
+
+    def sample(self, seconds: float, interval_ms: Optional[float] = None) -> Dict[str, Any]:
+        """Sample the stacks of all other threads; blocks the calling thread for ``seconds``"""
+        seconds = min(max(float(seconds), 0.1), self.max_sample_seconds)
+        interval = max(float(interval_ms or self.sample_interval_ms), 1.0) / 1000
+        if not self._sample_lock.acquire(blocking=False):
+            raise Exception("A CPU profile is already being sampled")
+        try:
+            me = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_name(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                    stacks[";".join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            self._sample_lock.release()
+
+        # Self time: how often each function was the innermost frame
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "seconds": seconds,
+            "interval_ms": round(interval * 1000, 1),
+            "samples": samples,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+            "top_self": [{"frame": frame, "samples": count} for frame, count in leaves.most_common(20)]
+        }
+
+    # Per-request cProfile
+
+    def start_request(self) -> str:
+        """Start profiling the current thread for a request and return the profile id;
+        raises if another request is already being profiled"""
+        if not self._request_lock.acquire(blocking=False):
+            raise Exception("Another request is being profiled")
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            self._request_lock.release()
+            raise Exception("Another profiler (e.g. a debugger) is active in this process")
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        with self._state_lock:
+            self._active = (profile_id, profile)
+        return profile_id
+
+    def finish_request(self, profile_id: str, label: str):
+        """Stop the request profile ``profile_id`` and save it as ``<profile_dir>/<id>.prof``;
+        does nothing if that profile was already finished"""
+        with self._state_lock:
+            if self._active is None or self._active[0] != profile_id:
+                return
+            profile = self._active[1]
+            self._active = None
+        try:
+            profile.disable()
+        finally:
+            self._request_lock.release()
+        profile.dump_stats(os.path.join(self.profile_dir, f"{profile_id}.prof"))
+        print(f"🔬 Profiled {label}: {profile_id}")
+
+    def request_report(self, profile_id: str, sort: str = "cumulative", limit: int = 40) -> str:
+        """pstats text of a saved request profile"""
+        if not all(c.isalnum() or c == "-" for c in profile_id):
+            raise Exception("Invalid profile id")
+        path = os.path.join(self.profile_dir, f"{profile_id}.prof")
+        if not os.path.exists(path):
+            raise Exception(f"No profile '{profile_id}'")
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    # tracemalloc
+
+    def memory_start(self, frames: Optional[int] = None) -> Dict[str, Any]:
+        with self._memory_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames or self.memory_frames)
+                self._last_snapshot = None
+                print("🔬 tracemalloc started")
+            return self.memory_status()
+
+    def memory_stop(self) -> Dict[str, Any]:
+        with self._memory_lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                print("🔬 tracemalloc stopped")
+            self._last_snapshot = None
+            return self.memory_status()
+
+    def memory_status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": tracemalloc.is_tracing(), "current_kb": round(current / 1024, 1),
+                "peak_kb": round(peak / 1024, 1)}
+
+    def memory_snapshot(self, limit: int = 20, group_by: str = "lineno", diff: bool = False) -> Dict[str, Any]:
+        """Top allocations now, or (``diff``) their growth since the previous snapshot"""
+        with self._memory_lock:
+            if not tracemalloc.is_tracing():
+                raise Exception("tracemalloc is not running; start it first")
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ])
+            previous, self._last_snapshot = self._last_snapshot, snapshot
+
+        if diff and previous is None:
+            raise Exception("No earlier snapshot to compare with; take a snapshot first")
+        if diff:
+            stats = snapshot.compare_to(previous, group_by)[:limit]
+            top = [{"location": str(stat.traceback), "size_kb": round(stat.size / 1024, 1),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1), "count": stat.count,
+                    "count_diff": stat.count_diff} for stat in stats]
+        else:
+            stats = snapshot.statistics(group_by)[:limit]
+            top = [{"location": str(stat.traceback), "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count} for stat in stats]
+        return {**self.memory_status(), "group_by": group_by, "diff": diff, "top": top}
+
+
+def configure(settings: Optional[Dict[str, Any]], base_dir: str = ".") -> Optional[Profiler]:
+    """A Profiler from the "profiling" section of config.json, or None when it is disabled"""
+    settings = settings or {}
+    if not settings.get("enabled", False):
+        return None
+    profiler = Profiler(
+        max_sample_seconds=settings.get("max_sample_seconds", 60),
+        sample_interval_ms=settings.get("sample_interval_ms", 10),
+        profile_dir=os.path.join(base_dir, settings.get("profile_dir", "logs/profiles")),
+        memory_frames=settings.get("memory_frames", 10)
+    )
+    print(f"🔬 Profiling endpoints enabled, request profiles saved to {profiler.profile_dir}")
+    return profiler
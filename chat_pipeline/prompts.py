@@ -0,0 +1,137 @@
+import json
+import threading
+from typing import Any, Dict, List
+
+from chat_pipeline.tool_calling import build_decision_schema
+
+# Every prompt is split into a static system message and a short user message
+# with the per-request content. The system message is byte-identical across
+# requests, so Ollama can reuse the KV cache of that prefix instead of
+# prefilling it again on every call.
+
+DECISION_SYSTEM_TEMPLATE = """You decide whether a user query needs any of the available tools.
+
+Available tools:
+{tool_descriptions}
+
+Respond with ONLY this JSON format, listing one call per tool use:
+{{"tool_calls": [{{"tool_name": "exact_tool_name", "parameters": {{"param": "value"}}}}]}}
+
+If the query asks about several things, add one call for each (they run in parallel).
+Only when a later call needs a value from these calls' results (e.g. search for a city, then get its temperature),
+add "needs_followup": true; you will then get the results and can make the next calls.
+If no tool is needed, respond with:
+{{"tool_calls": []}}
+
+Use gemini_web_search for ANY question that requires current, recent, or latest information.
+
+Examples:
+- "What's 5 + 3?" → {{"tool_calls": [{{"tool_name": "calculator", "parameters": {{"operation": "add", "a": 5, "b": 3}}}}]}}
+- "Temperature in Pune" → {{"tool_calls": [{{"tool_name": "get_temperature", "parameters": {{"place_name": "Pune"}}}}]}}
+- "Compare the temperature in Pune and Delhi" → {{"tool_calls": [{{"tool_name": "get_temperature", "parameters": {{"place_name": "Pune"}}}}, {{"tool_name": "get_temperature", "parameters": {{"place_name": "Delhi"}}}}]}}
+- "Latest AI developments" → {{"tool_calls": [{{"tool_name": "gemini_web_search", "parameters": {{"query": "latest AI developments 2024"}}}}]}}
+- "WTC 2025 final" → {{"tool_calls": [{{"tool_name": "gemini_web_search", "parameters": {{"query": "WTC 2025 final Australia South Africa"}}}}]}}
+- "Hello" → {{"tool_calls": []}}"""
+
+DIRECT_SYSTEM_PROMPT = """You are a helpful AI assistant. Provide a helpful, friendly answer to the user's question."""
+
+SYNTHESIS_SYSTEM_PROMPT = """You are a helpful AI assistant. The user's question was answered by calling one or more tools, and you receive the tool results together with the question.
+
+IMPORTANT INSTRUCTIONS:
+1. Use ONLY the information from the tool results to answer the user's question
+2. Do NOT ignore the tool result or say the information is unavailable
+3. If the tool result contains specific facts, dates, scores, or details, include them in your response
+4. Be conversational and helpful
+5. Summarize the key information from the tool result clearly
+6. If the tool result shows that an event has happened, report it as factual information"""
+
+FALLBACK_SYSTEM_PROMPT = """You are a helpful AI assistant. A tool needed to answer the user's question failed. Explain this limitation helpfully and suggest alternative ways to find the information."""
+
+
+class PromptBuilder:
+    """Builds chat messages with static, cacheable system prefixes.
+
+    The decision system prompt and the JSON schema constraining the decision
+    both embed the tool catalog; they are compiled once and only rebuilt
+    when the catalog returned by the MCP server changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalog_key = None
+        self._decision_system = None
+        self._decision_format = None
+
+    def _compile_catalog(self, tools: List[Dict[str, Any]]):
+        # Caller holds the lock
+        catalog_key = json.dumps(tools, sort_keys=True)
+        if catalog_key != self._catalog_key:
+            tool_descriptions = "\n".join([f"- {t['name']}: {t['description']}" for t in tools])
+            self._decision_system = DECISION_SYSTEM_TEMPLATE.format(tool_descriptions=tool_descriptions)
+            self._decision_format = build_decision_schema(tools)
+            self._catalog_key = catalog_key
+
+    def decision_system_prompt(self, tools: List[Dict[str, Any]]) -> str:
+        with self._lock:
+            self._compile_catalog(tools)
+            return self._decision_system
+
+    def decision_format(self, tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """JSON schema for Ollama's ``format=`` on the decision call"""
+        with self._lock:
+            self._compile_catalog(tools)
+            return self._decision_format
+
+    def decision_messages(self, tools: List[Dict[str, Any]], user_message: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.decision_system_prompt(tools)},
+            {"role": "user", "content": f"User query: {user_message}"}
+        ]
+
+    def followup_messages(self, tools: List[Dict[str, Any]], user_message: str,
+                          tool_results: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Ask for the next round of tool calls, given the results gathered so far in this turn"""
+        results_text = "\n".join(
+            f"- {r['tool_name']}({json.dumps(r['parameters'])}) → {r['result'] if 'error' not in r else 'Error: ' + r['error']}"
+            for r in tool_results
+        )
+        return [
+            {"role": "system", "content": self.decision_system_prompt(tools)},
+            {"role": "user", "content": f"""User query: {user_message}
+
+Tool results so far:
+{results_text}
+
+If these results are enough to answer the query, respond with {{"tool_calls": []}}.
+Otherwise list the next tool calls, filling in values taken from the results, with "needs_followup": true
+only if yet another round will need their results."""}
+        ]
+
+    def direct_messages(self, user_message: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": DIRECT_SYSTEM_PROMPT},
+            {"role": "user", "content": user_message}
+        ]
+
+    def synthesis_messages(self, user_message: str, tool_results: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """``tool_results`` holds one {"name", "result"} entry per executed tool call"""
+        results_text = "\n\n".join(
+            f"TOOL RESULT ({result['name']}):\n{result['result']}" for result in tool_results
+        )
+        tool_names = ", ".join(dict.fromkeys(result['name'] for result in tool_results))
+        return [
+            {"role": "system", "content": SYNTHESIS_SYSTEM_PROMPT},
+            {"role": "user", "content": f"""The user asked: "{user_message}"
+
+I used the {tool_names} tool(s) and received this information:
+
+{results_text}
+
+Based on the tool results above, provide a complete and accurate answer to the user's question:"""}
+        ]
+
+    def fallback_messages(self, user_message: str, error: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": FALLBACK_SYSTEM_PROMPT},
+            {"role": "user", "content": f"User asked: {user_message}\n\nThe tool failed with this error: {error}"}
+        ]
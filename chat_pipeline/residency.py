@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict
+
+
+class ResidencyManager:
+    """Keeps the Ollama model resident while it is being used.
+
+    - ``preload`` loads the model at startup with an empty generation
+    - ``keep_alive`` picks the keep_alive value for each request from recent
+      traffic and the configured active hours
+    - a background loop re-warms the model during active hours if Ollama
+      unloaded it, and optionally unloads it after a long idle period outside
+      active hours to free RAM on shared machines
+
+    Every Ollama response passed to ``observe`` is checked for a model load
+    (``load_duration``) so cold starts can be reported.
+    """
+
+    def __init__(self, ollama_client, model: str, settings: Dict[str, Any] = None):
+        settings = settings or {}
+        self.ollama_client = ollama_client
+        self.model = model
+        self.keep_alive_busy = settings.get("keep_alive_busy", "30m")
+        self.keep_alive_active = settings.get("keep_alive_active", "10m")
+        self.keep_alive_idle = settings.get("keep_alive_idle", "2m")
+        self.busy_requests_per_window = settings.get("busy_requests_per_window", 10)
+        self.traffic_window = settings.get("traffic_window_seconds", 300)
+        self.active_hours = settings.get("active_hours", [8, 22])
+        self.rewarm_interval = settings.get("rewarm_interval_seconds", 120)
+        self.unload_when_idle = settings.get("unload_when_idle", False)
+        self.idle_unload_after = settings.get("idle_unload_after_seconds", 1800)
+        self.cold_start_threshold_ms = settings.get("cold_start_threshold_ms", 500)
+
+        self._lock = threading.Lock()
+        self._recent_requests = deque()
+        self._last_request_at = time.monotonic()
+        self._thread = None
+        self._stop = threading.Event()
+        self._metrics = {
+            "requests": 0,
+            "generations": 0,
+            "cold_starts": 0,
+            "total_load_ms": 0.0,
+            "last_load_ms": None,
+            "preloads": 0,
+            "unloads": 0
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="model-residency", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def in_active_hours(self) -> bool:
+        start_hour, end_hour = self.active_hours
+        hour = datetime.now().hour
+        if start_hour <= end_hour:
+            return start_hour <= hour < end_hour
+        # Window that wraps past midnight, e.g. [20, 6]
+        return hour >= start_hour or hour < end_hour
+
+    def keep_alive(self) -> str:
+        """keep_alive value to send with the next Ollama request"""
+        with self._lock:
+            self._trim_window()
+            busy = len(self._recent_requests) >= self.busy_requests_per_window
+        if busy:
+            return self.keep_alive_busy
+        if self.in_active_hours():
+            return self.keep_alive_active
+        return self.keep_alive_idle
+
+    def note_request(self):
+        """Record an incoming chat request for the traffic-aware policy"""
+        now = time.monotonic()
+        with self._lock:
+            self._recent_requests.append(now)
+            self._last_request_at = now
+            self._metrics["requests"] += 1
+            self._trim_window()
+
+    def observe(self, response):
+        """Record an Ollama response (or final stream chunk) and detect cold starts"""
+        load_duration = response.get("load_duration") if response else None
+        with self._lock:
+            self._metrics["generations"] += 1
+            if load_duration:
+                self._record_load(load_duration)
+
+    def preload(self) -> bool:
+        """Load the model into memory without generating anything"""
+        try:
+            started = time.monotonic()
+            response = self.ollama_client.generate(model=self.model, prompt="", keep_alive=self.keep_alive())
+            with self._lock:
+                self._metrics["preloads"] += 1
+                self._metrics["last_load_ms"] = round((response.get("load_duration") or 0) / 1e6, 1)
+            print(f"🔥 Model '{self.model}' resident ({time.monotonic() - started:.2f}s)")
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to preload model '{self.model}': {str(e)}")
+            return False
+
+    def unload(self) -> bool:
+        try:
+            self.ollama_client.generate(model=self.model, prompt="", keep_alive=0)
+            with self._lock:
+                self._metrics["unloads"] += 1
+            print(f"💤 Unloaded idle model '{self.model}'")
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to unload model '{self.model}': {str(e)}")
+            return False
+
+    def is_loaded(self) -> bool:
+        loaded = [m["model"] for m in self.ollama_client.ps()["models"]]
+        return any(name == self.model or name.split(":")[0] == self.model for name in loaded)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            idle_seconds = time.monotonic() - self._last_request_at
+        loads = metrics["cold_starts"]
+        total_load_ms = metrics.pop("total_load_ms")
+        metrics["cold_start_rate"] = round(loads / metrics["generations"], 3) if metrics["generations"] else 0.0
+        metrics["avg_load_ms"] = round(total_load_ms / loads, 1) if loads else None
+        metrics["idle_seconds"] = round(idle_seconds, 1)
+        metrics["active_hours"] = self.in_active_hours()
+        metrics["keep_alive"] = self.keep_alive()
+        return metrics
+
+    def _record_load(self, load_duration_ns: int):
+        # Ollama reports a few ms of load_duration even for a resident model,
+        # so only loads above the threshold count as a user-facing cold start
+        load_ms = load_duration_ns / 1e6
+        self._metrics["last_load_ms"] = round(load_ms, 1)
+        if load_ms >= self.cold_start_threshold_ms:
+            self._metrics["cold_starts"] += 1
+            self._metrics["total_load_ms"] += load_ms
+
+    def _trim_window(self):
+        cutoff = time.monotonic() - self.traffic_window
+        while self._recent_requests and self._recent_requests[0] < cutoff:
+            self._recent_requests.popleft()
+
+    def _run(self):
+        while not self._stop.wait(self.rewarm_interval):
+            try:
+                with self._lock:
+                    idle_seconds = time.monotonic() - self._last_request_at
+                active = self.in_active_hours()
+                loaded = self.is_loaded()
+
+                if active and not loaded:
+                    print("🔥 Re-warming model during active hours...")
+                    self.preload()
+                elif not active and loaded and self.unload_when_idle and idle_seconds >= self.idle_unload_after:
+                    self.unload()
+            except Exception as e:
+                print(f"⚠️ Model residency check failed: {str(e)}")
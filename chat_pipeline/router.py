@@ -0,0 +1,190 @@
+import re
+import threading
+from typing import Any, Dict, Iterable, Optional, Union
+
+NO_TOOL_NEEDED = "NO_TOOL_NEEDED"
+
+NUMBER = r"(-?\d+(?:\.\d+)?)"
+QUESTION_PREFIX = r"(?:(?:what(?:'s| is)|calculate|compute|solve|how much is)\s+)?"
+QUESTION_SUFFIX = r"\s*(?:=|\?|\.|!)*\s*"
+
+OPERATOR_WORDS = {
+    "+": "add", "plus": "add",
+    "-": "subtract", "minus": "subtract",
+    "*": "multiply", "x": "multiply", "×": "multiply", "times": "multiply", "multiplied by": "multiply",
+    "/": "divide", "÷": "divide", "divided by": "divide", "over": "divide",
+}
+
+ARITHMETIC_INFIX = re.compile(
+    rf"^{QUESTION_PREFIX}{NUMBER}\s*(\+|-|\*|x|×|/|÷|plus|minus|times|multiplied by|divided by|over)\s*{NUMBER}{QUESTION_SUFFIX}$",
+    re.IGNORECASE
+)
+ARITHMETIC_VERB = re.compile(
+    rf"^(?:please\s+)?(add|sum|multiply|divide|subtract)\s+{NUMBER}\s+(and|by|to|with|from)\s+{NUMBER}{QUESTION_SUFFIX}$",
+    re.IGNORECASE
+)
+
+CITY = r"([a-z][a-z .'-]{1,40}?)"
+WEATHER_WORDS = r"(?:temperature|temp|weather)"
+TIME_SUFFIX = r"(?:\s+(?:today|now|right now|currently|at the moment))?"
+TEMPERATURE_IN_CITY = re.compile(
+    rf"^(?:(?:tell me|show me|give me|what(?:'s| is)|how(?:'s| is)|get)\s+)?(?:the\s+)?(?:current\s+)?{WEATHER_WORDS}(?:\s+like)?\s+(?:in|at|for|of)\s+{CITY}{TIME_SUFFIX}{QUESTION_SUFFIX}$",
+    re.IGNORECASE
+)
+CITY_TEMPERATURE = re.compile(
+    rf"^(?:(?:what(?:'s| is)|how(?:'s| is))\s+)?(?:the\s+)?{CITY}\s+{WEATHER_WORDS}{TIME_SUFFIX}{QUESTION_SUFFIX}$",
+    re.IGNORECASE
+)
+HOW_HOT_IN_CITY = re.compile(
+    rf"^(?:how\s+(?:hot|cold|warm)\s+is\s+it|is\s+it\s+(?:hot|cold|warm))\s+in\s+{CITY}{TIME_SUFFIX}{QUESTION_SUFFIX}$",
+    re.IGNORECASE
+)
+
+GREETING = re.compile(
+    r"^(?:hi|hello|hey|hiya|yo|greetings|good\s+(?:morning|afternoon|evening|night)|thanks|thank\s+you|thx|bye|goodbye"
+    r"|how\s+are\s+you(?:\s+doing)?|what'?s\s+up)(?:\s+(?:there|friend|buddy|bot))?[\s!.?,:)]*$",
+    re.IGNORECASE
+)
+
+# Words that make a "city" capture look like a sentence or a kind of temperature rather than a place name
+NOT_A_CITY = {
+    "the", "my", "your", "this", "that", "it", "tomorrow", "yesterday", "next", "last", "week", "forecast",
+    "current", "room", "body", "global", "average", "normal", "water", "ocean", "sea", "surface", "core",
+    "air", "outside", "inside", "today", "max", "maximum", "min", "minimum", "high", "low", "ideal", "oven",
+    "celsius", "fahrenheit", "kelvin", "centigrade", "degrees",
+}
+
+# Places accepted in any case; anything else has to be written as a proper noun
+KNOWN_CITIES = {
+    "agra", "ahmedabad", "amritsar", "aurangabad", "bangalore", "bengaluru", "bhopal", "bhubaneswar",
+    "chandigarh", "chennai", "coimbatore", "dehradun", "delhi", "new delhi", "goa", "guwahati", "hyderabad",
+    "indore", "jaipur", "kanpur", "kochi", "kolkata", "lucknow", "ludhiana", "madurai", "mumbai", "mysore",
+    "nagpur", "nashik", "noida", "gurgaon", "patna", "pune", "raipur", "ranchi", "shimla", "surat",
+    "thane", "thiruvananthapuram", "udaipur", "vadodara", "varanasi", "visakhapatnam",
+    "amsterdam", "athens", "atlanta", "auckland", "bangkok", "barcelona", "beijing", "berlin", "boston",
+    "brussels", "budapest", "buenos aires", "cairo", "cape town", "chicago", "colombo", "copenhagen",
+    "dallas", "dhaka", "doha", "dubai", "dublin", "frankfurt", "geneva", "hong kong", "houston",
+    "istanbul", "jakarta", "johannesburg", "kabul", "karachi", "kathmandu", "kuala lumpur", "lagos",
+    "lahore", "las vegas", "lima", "lisbon", "london", "los angeles", "madrid", "manila", "melbourne",
+    "mexico city", "miami", "milan", "montreal", "moscow", "munich", "nairobi", "new york", "osaka",
+    "oslo", "paris", "prague", "rome", "san francisco", "santiago", "sao paulo", "seattle", "seoul",
+    "shanghai", "singapore", "stockholm", "sydney", "taipei", "tehran", "tokyo", "toronto", "vancouver",
+    "vienna", "warsaw", "washington", "zurich",
+}
+
+
+class RulesRouter:
+    """Deterministic pre-router in front of the LLM tool decision.
+
+    Handles the most common, unambiguous queries (plain arithmetic, "temperature
+    in <city>", greetings) with compiled patterns. ``route`` returns a tool call
+    dict, ``NO_TOOL_NEEDED``, or None when the LLM has to decide.
+    """
+
+    def __init__(self, available_tools: Optional[Iterable[str]] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.available_tools = set(available_tools) if available_tools is not None else None
+        self._lock = threading.Lock()
+        self._total = 0
+        self._hits = {"arithmetic": 0, "temperature": 0, "greeting": 0}
+
+    def set_available_tools(self, tool_names: Iterable[str]):
+        """Only emit tool calls for tools the MCP server actually offers"""
+        self.available_tools = set(tool_names)
+
+    def route(self, message: str) -> Optional[Union[Dict[str, Any], str]]:
+        if not self.enabled:
+            return None
+
+        text = " ".join(message.strip().split())
+        decision, rule = None, None
+
+        if text:
+            for rule_name, matcher in (("greeting", self._match_greeting),
+                                       ("arithmetic", self._match_arithmetic),
+                                       ("temperature", self._match_temperature)):
+                decision = matcher(text)
+                if decision is not None:
+                    rule = rule_name
+                    break
+
+        with self._lock:
+            self._total += 1
+            if rule:
+                self._hits[rule] += 1
+
+        return decision
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate of the rules router since startup"""
+        with self._lock:
+            hits = sum(self._hits.values())
+            return {
+                "enabled": self.enabled,
+                "total": self._total,
+                "hits": hits,
+                "hit_rate": round(hits / self._total, 3) if self._total else 0.0,
+                "by_rule": dict(self._hits)
+            }
+
+    def _tool_available(self, tool_name: str) -> bool:
+        return self.available_tools is None or tool_name in self.available_tools
+
+    def _match_greeting(self, text: str) -> Optional[str]:
+        if GREETING.match(text):
+            return NO_TOOL_NEEDED
+        return None
+
+    def _match_arithmetic(self, text: str) -> Optional[Dict[str, Any]]:
+        if not self._tool_available("calculator"):
+            return None
+
+        match = ARITHMETIC_INFIX.match(text)
+        if match:
+            a, operator, b = match.groups()
+            operation = OPERATOR_WORDS[operator.lower()]
+            return self._calculator_call(operation, a, b)
+
+        match = ARITHMETIC_VERB.match(text)
+        if match:
+            verb, a, connector, b = match.groups()
+            verb = verb.lower()
+            if verb == "sum":
+                verb = "add"
+            if verb == "subtract" and connector.lower() == "from":
+                # "subtract 3 from 10" means 10 - 3, "subtract 10 and 3" is already in order
+                a, b = b, a
+            return self._calculator_call(verb, a, b)
+
+        return None
+
+    def _calculator_call(self, operation: str, a: str, b: str) -> Dict[str, Any]:
+        return {
+            "tool_name": "calculator",
+            "parameters": {"operation": operation, "a": float(a), "b": float(b)}
+        }
+
+    def _match_temperature(self, text: str) -> Optional[Dict[str, Any]]:
+        if not self._tool_available("get_temperature"):
+            return None
+
+        for pattern in (TEMPERATURE_IN_CITY, HOW_HOT_IN_CITY, CITY_TEMPERATURE):
+            match = pattern.match(text)
+            if match:
+                city = match.group(1).strip(" .'-")
+                words = city.lower().split()
+                if not words or len(words) > 3 or any(word in NOT_A_CITY for word in words):
+                    return None
+                if not self._looks_like_place(city, match.start(1)):
+                    return None
+                return {
+                    "tool_name": "get_temperature",
+                    "parameters": {"place_name": city.title()}
+                }
+        return None
+
+    def _looks_like_place(self, city: str, start: int) -> bool:
+        """A known city in any case, or a capitalized proper noun that does not just open the sentence"""
+        if city.lower() in KNOWN_CITIES:
+            return True
+        return start > 0 and all(word[0].isupper() for word in city.split())
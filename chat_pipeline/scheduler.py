@@ -0,0 +1,233 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler sheds a request instead of queueing it"""
+
+
+class Ticket:
+    """A place in the scheduler queue; granted once an Ollama slot is free"""
+
+    def __init__(self, session_id: str, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self._granted = threading.Event()
+        self._loop = loop
+        self._async_granted = asyncio.Event() if loop is not None else None
+
+    @property
+    def granted(self) -> bool:
+        return self._granted.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._granted.wait(timeout)
+
+    async def wait_async(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self._async_granted.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _grant(self):
+        self.granted_at = time.monotonic()
+        self._granted.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._async_granted.set)
+
+
+class FairScheduler:
+    """Admission control between the web app and Ollama.
+
+    - at most ``max_concurrent`` generations run at once (match it to Ollama's
+      OLLAMA_NUM_PARALLEL)
+    - waiting requests are served from the interactive lane before the batch
+      lane, and round-robin across sessions within a lane, so one session's
+      multi-call pipeline cannot starve the others
+    - once ``max_queue`` requests are waiting, new ones are rejected with
+      QueueFullError instead of timing out somewhere downstream
+
+    Each Ollama call takes a ticket with ``enqueue`` and must hand it back
+    with ``release`` (or ``cancel`` if it stops waiting).
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_queue: int = 50, max_wait_seconds: float = 120,
+                 initial_service_seconds: float = 5.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self._lock = threading.Lock()
+        # One OrderedDict per priority lane: session_id -> deque of tickets, in rotation order
+        self._lanes = {PRIORITY_INTERACTIVE: OrderedDict(), PRIORITY_BATCH: OrderedDict()}
+        self._queued = 0
+        self._active = 0
+        self._avg_service_seconds = initial_service_seconds
+        self._stats = {"granted": 0, "rejected": 0, "cancelled": 0, "total_wait_seconds": 0.0}
+
+    @classmethod
+    def from_config(cls, scheduler_config: Optional[Dict[str, Any]]) -> "FairScheduler":
+        scheduler_config = scheduler_config or {}
+        return cls(
+            max_concurrent=scheduler_config.get("max_concurrent", 2),
+            max_queue=scheduler_config.get("max_queue", 50),
+            max_wait_seconds=scheduler_config.get("max_wait_seconds", 120)
+        )
+
+    def enqueue(self, session_id: str, priority: int = PRIORITY_INTERACTIVE,
+                loop: Optional[asyncio.AbstractEventLoop] = None) -> Ticket:
+        """Queue a request; pass the running event loop to wait with ``wait_async``"""
+        ticket = Ticket(session_id or "anonymous", priority, loop)
+        with self._lock:
+            if self._active < self.max_concurrent and self._queued == 0:
+                self._start(ticket)
+                return ticket
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise QueueFullError(
+                    f"Server is busy: {self._queued} requests are already waiting. Please try again shortly."
+                )
+            self._lanes[priority].setdefault(ticket.session_id, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Hand back the slot of a granted ticket"""
+        with self._lock:
+            if ticket.granted_at is None:
+                return
+            service_seconds = time.monotonic() - ticket.granted_at
+            ticket.granted_at = None
+            self._active -= 1
+            # Exponentially weighted average of how long a slot is held
+            self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * service_seconds
+            self._dispatch()
+
+    def cancel(self, ticket: Ticket):
+        """Stop waiting (client went away, or wait timed out); releases it if already granted"""
+        with self._lock:
+            sessions = self._lanes[ticket.priority]
+            queue = sessions.get(ticket.session_id)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del sessions[ticket.session_id]
+                self._queued -= 1
+                self._stats["cancelled"] += 1
+                return
+        self.release(ticket)
+
+    def wait_events(self, ticket: Ticket, poll_seconds: float = 1.0):
+        """Block until the ticket is granted, yielding a 'queued' event every poll.
+
+        Raises QueueFullError after ``max_wait_seconds``; the ticket is cancelled
+        if the wait is abandoned (e.g. the generator is closed on disconnect).
+        """
+        try:
+            while not ticket.granted:
+                yield {"type": "queued", **self.queue_info(ticket)}
+                if time.monotonic() - ticket.enqueued_at >= self.max_wait_seconds:
+                    raise QueueFullError(f"Timed out after {self.max_wait_seconds}s waiting for the model")
+                ticket.wait(poll_seconds)
+        except BaseException:
+            self.cancel(ticket)
+            raise
+
+    async def wait_events_async(self, ticket: Ticket, poll_seconds: float = 1.0):
+        """asyncio version of ``wait_events`` for tickets enqueued with a loop"""
+        try:
+            while not ticket.granted:
+                yield {"type": "queued", **self.queue_info(ticket)}
+                if time.monotonic() - ticket.enqueued_at >= self.max_wait_seconds:
+                    raise QueueFullError(f"Timed out after {self.max_wait_seconds}s waiting for the model")
+                await ticket.wait_async(poll_seconds)
+        except BaseException:
+            self.cancel(ticket)
+            raise
+
+    def queue_info(self, ticket: Ticket) -> Dict[str, Any]:
+        """Queue position (1 = next to run) and estimated wait for a waiting ticket"""
+        with self._lock:
+            ahead = self._ahead_of(ticket)
+            return {
+                "position": ahead + 1,
+                "estimatedWait": round(self._estimate_wait(ahead), 1)
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            granted = self._stats["granted"]
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self._active,
+                "queued": self._queued,
+                "queued_interactive": sum(len(q) for q in self._lanes[PRIORITY_INTERACTIVE].values()),
+                "queued_batch": sum(len(q) for q in self._lanes[PRIORITY_BATCH].values()),
+                "max_queue": self.max_queue,
+                "granted": granted,
+                "rejected": self._stats["rejected"],
+                "cancelled": self._stats["cancelled"],
+                "avg_wait_seconds": round(self._stats["total_wait_seconds"] / granted, 2) if granted else 0.0,
+                "avg_service_seconds": round(self._avg_service_seconds, 2),
+                "estimated_wait_seconds": round(self._estimate_wait(self._queued), 1)
+            }
+
+    def _start(self, ticket: Ticket):
+        self._active += 1
+        self._stats["granted"] += 1
+        self._stats["total_wait_seconds"] += time.monotonic() - ticket.enqueued_at
+        ticket._grant()
+
+    def _dispatch(self):
+        # Caller holds the lock
+        while self._active < self.max_concurrent and self._queued:
+            for priority in sorted(self._lanes):
+                sessions = self._lanes[priority]
+                if not sessions:
+                    continue
+                session_id, queue = next(iter(sessions.items()))
+                ticket = queue.popleft()
+                # Move the session to the back of the rotation
+                del sessions[session_id]
+                if queue:
+                    sessions[session_id] = queue
+                self._queued -= 1
+                self._start(ticket)
+                break
+
+    def _ahead_of(self, ticket: Ticket) -> int:
+        # Caller holds the lock. Simulates the round-robin order within the lane.
+        ahead = 0
+        for priority, sessions in self._lanes.items():
+            if priority < ticket.priority:
+                ahead += sum(len(q) for q in sessions.values())
+
+        sessions = self._lanes[ticket.priority]
+        own_queue = sessions.get(ticket.session_id)
+        if own_queue is None or ticket not in own_queue:
+            return ahead
+        index = own_queue.index(ticket)
+        before_own = True
+        for session_id, queue in sessions.items():
+            if session_id == ticket.session_id:
+                before_own = False
+                ahead += index
+                continue
+            ahead += min(len(queue), index + 1 if before_own else index)
+        return ahead
+
+    def _estimate_wait(self, ahead: int) -> float:
+        # Caller holds the lock
+        if self._active < self.max_concurrent and ahead == 0:
+            return 0.0
+        return (ahead // self.max_concurrent + 1) * self._avg_service_seconds
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+NS_PER_MS = 1_000_000
+
+
+def _per_second(count: Optional[int], duration_ns: Optional[int]) -> Optional[float]:
+    if not count or not duration_ns:
+        return None
+    return round(count / (duration_ns / 1e9), 1)
+
+
+def generation_stats(role: str, model: str, chunk) -> Dict[str, Any]:
+    """Ollama's own counters from the final chunk of a generation, as prefill and decode rates"""
+    prompt_tokens, prefill_ns = chunk.get("prompt_eval_count"), chunk.get("prompt_eval_duration")
+    completion_tokens, decode_ns = chunk.get("eval_count"), chunk.get("eval_duration")
+    return {
+        "role": role,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "prefill_ms": round(prefill_ns / NS_PER_MS, 1) if prefill_ns else None,
+        "prefill_tokens_per_second": _per_second(prompt_tokens, prefill_ns),
+        "completion_tokens": completion_tokens,
+        "decode_ms": round(decode_ns / NS_PER_MS, 1) if decode_ns else None,
+        "decode_tokens_per_second": _per_second(completion_tokens, decode_ns),
+        "load_ms": round(chunk["load_duration"] / NS_PER_MS, 1) if chunk.get("load_duration") else None
+    }
+
+
+def stopped_generation_stats(role: str, model: str, tokens: int) -> Dict[str, Any]:
+    """A generation closed before its final chunk (e.g. a decision stopped early) has no Ollama counters"""
+    return {"role": role, "model": model, "completion_tokens": tokens, "stopped_early": True}
+
+
+class TimingLog:
+    """Appends one JSON line per chat turn with its latency breakdown, for offline aggregation.
+
+    Configured under ``timings`` in config.json: ``log_enabled`` and
+    ``log_path`` (relative paths are resolved against the working directory).
+    """
+
+    def __init__(self, settings: Dict[str, Any] = None):
+        settings = settings or {}
+        self.enabled = settings.get("log_enabled", True)
+        self.path = settings.get("log_path", "logs/timings.jsonl")
+        self._lock = threading.Lock()
+        if self.enabled:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    def write(self, record: Dict[str, Any]):
+        if not self.enabled:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), **record})
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not write timing log {self.path}: {str(e)}")
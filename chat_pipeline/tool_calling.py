@@ -0,0 +1,108 @@
+from typing import Any, Dict, List
+
+
+# Ollama tool schemas use JSON schema types, the MCP catalog uses Python-ish names
+PARAMETER_TYPES = {
+    "string": "string",
+    "str": "string",
+    "float": "number",
+    "int": "integer",
+    "integer": "integer",
+    "number": "number",
+    "bool": "boolean",
+    "boolean": "boolean",
+}
+
+NATIVE_SYSTEM_PROMPT = """You are a helpful AI assistant that can call tools.
+Call a tool when the user needs a calculation, the temperature of a place, or current information from the web.
+For general conversation, answer directly and do not call any tool.
+When the user asks about several things (e.g. the temperature in two cities), call the tool once for each."""
+
+# Upper bound on tool calls dispatched for one chat turn
+MAX_TOOL_CALLS = 4
+
+
+def _parameter_schema(param: Dict[str, Any]) -> Dict[str, Any]:
+    schema = {"type": PARAMETER_TYPES.get(param.get("type", "string"), "string")}
+    if param.get("enum"):
+        schema["enum"] = param["enum"]
+    return schema
+
+
+def build_ollama_tools(mcp_tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Convert the MCP tool catalog into Ollama's ``tools=`` function schemas"""
+    ollama_tools = []
+    for tool in mcp_tools:
+        properties = {}
+        required = []
+        for param in tool.get("parameters", []):
+            properties[param["name"]] = {
+                **_parameter_schema(param),
+                "description": param.get("description", "")
+            }
+            if param.get("required"):
+                required.append(param["name"])
+
+        ollama_tools.append({
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool.get("description", ""),
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": required
+                }
+            }
+        })
+    return ollama_tools
+
+
+def build_decision_schema(mcp_tools: List[Dict[str, Any]], max_calls: int = MAX_TOOL_CALLS) -> Dict[str, Any]:
+    """JSON schema for Ollama's ``format=`` that only admits a valid decision.
+
+    The decision is ``{"tool_calls": [...]}`` with up to ``max_calls``
+    entries; each entry is one branch per tool pinning ``tool_name`` and its
+    parameters, and an empty list means no tool is needed. The optional
+    ``needs_followup`` flag asks for another round once these calls ran.
+    """
+    branches = []
+    for tool in mcp_tools:
+        params = tool.get("parameters", [])
+        branches.append({
+            "type": "object",
+            "properties": {
+                "tool_name": {"type": "string", "enum": [tool["name"]]},
+                "parameters": {
+                    "type": "object",
+                    "properties": {param["name"]: _parameter_schema(param) for param in params},
+                    "required": [param["name"] for param in params if param.get("required")],
+                    "additionalProperties": False
+                }
+            },
+            "required": ["tool_name", "parameters"]
+        })
+    return {
+        "type": "object",
+        "properties": {
+            "tool_calls": {"type": "array", "items": {"anyOf": branches}, "maxItems": max_calls},
+            "needs_followup": {"type": "boolean"}
+        },
+        "required": ["tool_calls"]
+    }
+
+
+def tool_calls_from_message(message: Any) -> List[Dict[str, Any]]:
+    """Return the structured tool calls of an Ollama chat message.
+
+    Calls use the same ``{"tool_name", "parameters"}`` shape as the
+    prompt-based decision; the list is empty when the model answered directly.
+    """
+    tool_calls = message.get("tool_calls") if message else None
+    return [
+        {
+            "tool_name": call["function"]["name"],
+            "parameters": dict(call["function"].get("arguments") or {})
+        }
+        for call in (tool_calls or [])[:MAX_TOOL_CALLS]
+    ]
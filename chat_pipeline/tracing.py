@@ -0,0 +1,228 @@
+"""
+Lightweight distributed tracing shared by the web apps, the MCP client and the MCP server.
+
+A trace follows one chat turn across processes. Each hop opens a ``span``;
+the current span lives in a context variable, so nested spans (and
+``asyncio`` tasks or ``asyncio.to_thread`` calls started inside them) become
+its children. Between processes the context travels in a W3C
+``traceparent`` HTTP header: ``inject`` adds it to outgoing requests and
+the receiving side passes it to ``span(..., traceparent=...)``.
+
+When the outermost span of a process (its local root) ends, the spans it
+collected are appended as one JSON line to ``export_path``; roots slower
+than ``slow_threshold_ms`` are also written to ``slow_log_path``. Read them
+with ``python trace_viewer.py``. Tracing is configured under ``tracing`` in
+config.json; when it is disabled ``span`` does nothing. Untraced requests to
+``exclude_paths`` (health and status probes) do not start a trace at all,
+see ``should_trace``.
+"""
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+TRACEPARENT_HEADER = "traceparent"
+# Polled by HealthMonitor, load balancers and the web interface; tracing them only floods the export
+DEFAULT_EXCLUDE_PATHS = ("/health", "/api/status", "/api/queue", "/docs", "/openapi.json", "/favicon.ico")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_tracer = None
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], service: str,
+                 attributes: Optional[Dict[str, Any]] = None, local_parent: "Span" = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.service = service
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start = time.time()
+        self.duration_ms = None
+        self._started = time.perf_counter()
+        # The outermost span of this process collects the finished spans of its trace
+        self.root = local_parent.root if local_parent is not None else self
+        self.finished = []
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error"] = str(error) or type(error).__name__
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self):
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 2)
+        self.root.finished.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.service,
+            "start": round(self.start, 6),
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class Tracer:
+    """Exports the finished local traces of one process (service) as JSON lines"""
+
+    def __init__(self, service: str, export_path: str = "logs/traces.jsonl", slow_threshold_ms: float = 5000,
+                 slow_log_path: str = "logs/slow_traces.jsonl", exclude_paths=DEFAULT_EXCLUDE_PATHS):
+        self.service = service
+        self.export_path = export_path
+        self.slow_threshold_ms = slow_threshold_ms
+        self.slow_log_path = slow_log_path
+        self.exclude_paths = frozenset(exclude_paths)
+        self._lock = threading.Lock()
+        for path in (export_path, slow_log_path):
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def export(self, root: Span):
+        record = json.dumps({
+            "trace_id": root.trace_id,
+            "service": self.service,
+            "root": root.name,
+            "duration_ms": root.duration_ms,
+            "spans": [span.to_dict() for span in root.finished]
+        })
+        slow = self.slow_threshold_ms is not None and root.duration_ms >= self.slow_threshold_ms
+        if slow:
+            print(f"🐢 Slow {root.name} ({root.duration_ms:.0f}ms), trace {root.trace_id} written to {self.slow_log_path}")
+        try:
+            with self._lock:
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(record + "\n")
+                if slow and self.slow_log_path:
+                    with open(self.slow_log_path, "a", encoding="utf-8") as f:
+                        f.write(record + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not export trace {root.trace_id}: {str(e)}")
+
+
+def configure(settings: Optional[Dict[str, Any]], service: str, base_dir: str = ".") -> Optional[Tracer]:
+    """Set up tracing for this process from the "tracing" section of config.json.
+
+    Relative paths are resolved against ``base_dir``.
+    """
+    global _tracer
+    settings = settings or {}
+    if not settings.get("enabled", False):
+        _tracer = None
+        return None
+
+    def resolve(path):
+        return os.path.join(base_dir, path) if path else path
+
+    _tracer = Tracer(
+        service,
+        resolve(settings.get("export_path", "logs/traces.jsonl")),
+        settings.get("slow_threshold_ms", 5000),
+        resolve(settings.get("slow_log_path", "logs/slow_traces.jsonl")),
+        settings.get("exclude_paths", DEFAULT_EXCLUDE_PATHS)
+    )
+    print(f"🧵 Tracing enabled for '{service}', exporting to {_tracer.export_path}")
+    return _tracer
+
+
+def should_trace(path: str, traceparent: Optional[str] = None) -> bool:
+    """Whether an incoming request to ``path`` should be traced.
+
+    Requests to ``exclude_paths`` are skipped unless the caller is already
+    tracing them (sent a ``traceparent``), so periodic probes stay out of
+    the export while a probe made inside a chat turn still shows up.
+    """
+    if _tracer is None:
+        return False
+    return bool(traceparent) or path not in _tracer.exclude_paths
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span_id) from a W3C traceparent header, or None if missing or malformed"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None, traceparent: Optional[str] = None):
+    """Time a block as a child of the current span, or of ``traceparent`` if this is a new request.
+
+    Yields the Span (None when tracing is disabled). Exceptions are
+    recorded on the span and re-raised.
+    """
+    if _tracer is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    remote = parse_traceparent(traceparent) if parent is None else None
+    if parent is not None:
+        current = Span(name, parent.trace_id, parent.span_id, _tracer.service, attributes, parent)
+    elif remote is not None:
+        current = Span(name, remote[0], remote[1], _tracer.service, attributes)
+    else:
+        current = Span(name, secrets.token_hex(16), None, _tracer.service, attributes)
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.record_error(e)
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Ended in another context (e.g. a generator closed elsewhere)
+            _current_span.set(parent)
+        current.end()
+        if current.root is current:
+            _tracer.export(current)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def inject(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Add the current span's traceparent to outgoing HTTP headers"""
+    headers = dict(headers or {})
+    current = _current_span.get()
+    if current is not None:
+        headers[TRACEPARENT_HEADER] = current.traceparent
+    return headers
+
+
+def run_in_context(target):
+    """Wrap ``target`` so a new thread runs it inside the caller's trace context"""
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return context.run(target, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,89 @@
+import httpx
+from typing import List, Dict, Any
+import time
+
+from chat_pipeline import tracing
+
+class AsyncMCPClient:
+    """asyncio counterpart of MCPClient sharing one pooled HTTP connection set"""
+
+    def __init__(self, server_url: str = "http://localhost:8000", tools_cache_ttl: float = 60):
+        self.server_url = server_url
+        self.tools_cache_ttl = tools_cache_ttl
+        self._tools_cache = None
+        self._tools_fetched_at = 0.0
+        self._http = httpx.AsyncClient(
+            base_url=server_url,
+            timeout=httpx.Timeout(300, connect=5),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+        )
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def get_tools(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Fetch available tools from MCP server"""
+        if not refresh and self._tools_cache is not None and time.monotonic() - self._tools_fetched_at < self.tools_cache_ttl:
+            return self._tools_cache
+
+        try:
+            with tracing.span("mcp.get_tools"):
+                response = await self._http.get("/mcp/tools", headers=tracing.inject(), timeout=5)
+            response.raise_for_status()
+            tools = response.json()
+            print(f"📡 Fetched {len(tools)} tools from MCP server")
+            self._tools_cache = tools
+            self._tools_fetched_at = time.monotonic()
+            return tools
+        except httpx.HTTPError as e:
+            raise Exception(f"Failed to connect to MCP server at {self.server_url}: {str(e)}")
+
+    async def health(self) -> Dict[str, Any]:
+        """Cheap liveness probe of the MCP server"""
+        try:
+            response = await self._http.get("/health", timeout=2)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise Exception(f"MCP server at {self.server_url} is unhealthy: {str(e)}")
+
+    async def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> str:
+        """Execute a tool on the MCP server"""
+        try:
+            print(f"🔧 Executing '{tool_name}' with: {parameters}")
+
+            with tracing.span("mcp.execute", {"tool": tool_name}):
+                response = await self._http.post(
+                    "/mcp/execute",
+                    json={"tool_name": tool_name, "parameters": parameters},
+                    headers=tracing.inject()
+                )
+                response.raise_for_status()
+
+            result = response.json().get("result")
+            print(f"✅ Tool result: {result}")
+            return result
+
+        except httpx.HTTPError as e:
+            raise Exception(f"Tool execution failed: {str(e)}")
+
+    async def execute_tools(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute several tool calls concurrently on the MCP server (see MCPClient.execute_tools)"""
+        try:
+            print(f"🔧 Executing {len(tool_calls)} tool call(s): {[call['tool_name'] for call in tool_calls]}")
+
+            with tracing.span("mcp.execute_batch", {"tools": [c["tool_name"] for c in tool_calls]}):
+                response = await self._http.post(
+                    "/mcp/execute_batch",
+                    json={"calls": [{"tool_name": c["tool_name"], "parameters": c["parameters"]} for c in tool_calls]},
+                    headers=tracing.inject()
+                )
+                response.raise_for_status()
+
+            results = [{**result, "parameters": call["parameters"]}
+                       for call, result in zip(tool_calls, response.json()["results"])]
+            print(f"✅ Tool results: {results}")
+            return results
+
+        except httpx.HTTPError as e:
+            raise Exception(f"Tool execution failed: {str(e)}")
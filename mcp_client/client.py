@@ -1,33 +1,56 @@
 import requests
 from typing import List, Dict, Any
-import json
+import time
+
+from chat_pipeline import tracing
 
 class MCPClient:
-    def __init__(self, server_url: str = "http://localhost:8000"):
+    def __init__(self, server_url: str = "http://localhost:8000", tools_cache_ttl: float = 60):
         self.server_url = server_url
+        # The tool catalog rarely changes; re-fetch it at most every tools_cache_ttl seconds
+        self.tools_cache_ttl = tools_cache_ttl
+        self._tools_cache = None
+        self._tools_fetched_at = 0.0
 
-    def get_tools(self) -> List[Dict[str, Any]]:
+    def get_tools(self, refresh: bool = False) -> List[Dict[str, Any]]:
         """Fetch available tools from MCP server"""
+        if not refresh and self._tools_cache is not None and time.monotonic() - self._tools_fetched_at < self.tools_cache_ttl:
+            return self._tools_cache
+        
         try:
-            response = requests.get(f"{self.server_url}/mcp/tools", timeout=5)
+            with tracing.span("mcp.get_tools"):
+                response = requests.get(f"{self.server_url}/mcp/tools", headers=tracing.inject(), timeout=5)
             response.raise_for_status()
             tools = response.json()
             print(f"📡 Fetched {len(tools)} tools from MCP server")
+            self._tools_cache = tools
+            self._tools_fetched_at = time.monotonic()
             return tools
         except requests.RequestException as e:
             raise Exception(f"Failed to connect to MCP server at {self.server_url}: {str(e)}")
 
+    def health(self) -> Dict[str, Any]:
+        """Cheap liveness probe of the MCP server"""
+        try:
+            response = requests.get(f"{self.server_url}/health", timeout=2)
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException as e:
+            raise Exception(f"MCP server at {self.server_url} is unhealthy: {str(e)}")
+
     def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> str:
         """Execute a tool on the MCP server"""
         try:
             print(f"🔧 Executing '{tool_name}' with: {parameters}")
             
-            response = requests.post(
-                f"{self.server_url}/mcp/execute",
-                json={"tool_name": tool_name, "parameters": parameters},
-                timeout=300
-            )
-            response.raise_for_status()
+            with tracing.span("mcp.execute", {"tool": tool_name}):
+                response = requests.post(
+                    f"{self.server_url}/mcp/execute",
+                    json={"tool_name": tool_name, "parameters": parameters},
+                    headers=tracing.inject(),
+                    timeout=300
+                )
+                response.raise_for_status()
             
             result = response.json().get("result")
             print(f"✅ Tool result: {result}")
@@ -35,3 +58,29 @@ class MCPClient:
             
         except requests.RequestException as e:
             raise Exception(f"Tool execution failed: {str(e)}")
+
+    def execute_tools(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute several tool calls concurrently on the MCP server.
+
+        Returns one {"tool_name", "parameters", "result"} entry per call, in
+        order, with "error" instead of "result" for calls that failed.
+        """
+        try:
+            print(f"🔧 Executing {len(tool_calls)} tool call(s): {[call['tool_name'] for call in tool_calls]}")
+            
+            with tracing.span("mcp.execute_batch", {"tools": [c["tool_name"] for c in tool_calls]}):
+                response = requests.post(
+                    f"{self.server_url}/mcp/execute_batch",
+                    json={"calls": [{"tool_name": c["tool_name"], "parameters": c["parameters"]} for c in tool_calls]},
+                    headers=tracing.inject(),
+                    timeout=300
+                )
+                response.raise_for_status()
+            
+            results = [{**result, "parameters": call["parameters"]}
+                       for call, result in zip(tool_calls, response.json()["results"])]
+            print(f"✅ Tool results: {results}")
+            return results
+            
+        except requests.RequestException as e:
+            raise Exception(f"Tool execution failed: {str(e)}")
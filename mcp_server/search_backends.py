@@ -0,0 +1,229 @@
+import math
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from chat_pipeline import tracing
+from web_search import DEFAULT_RESEARCH_URL, DEFAULT_TIMEOUT, _extract_clean_answer, _make_api_request
+
+
+class SearchBackend:
+    """Base class for web search backends used by the web search tool"""
+
+    name = "backend"
+
+    def search(self, query: str, cancel_event: threading.Event) -> str:
+        """Return a cleaned answer for the query, or "" when nothing was found.
+
+        Implementations should check ``cancel_event`` while they work and give
+        up early once it is set - it means another backend already answered.
+        """
+        raise NotImplementedError
+
+
+class ResearchServerBackend(SearchBackend):
+    """Gemini research server speaking the /threads/ + /runs/stream protocol"""
+
+    def __init__(self, url: str = DEFAULT_RESEARCH_URL, name: str = "research_server", timeout=DEFAULT_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.name = name
+        self.timeout = timeout
+
+    def search(self, query: str, cancel_event: threading.Event) -> str:
+        with tracing.span("research_server.request", {"url": self.url}) as request_span:
+            raw_answer = _make_api_request(query, self.url, cancel_event, self.timeout)
+            if request_span is not None:
+                request_span.set_attributes({"answer_chars": len(raw_answer), "cancelled": cancel_event.is_set()})
+        return _extract_clean_answer(raw_answer)
+
+
+class LocalDocumentIndexBackend(SearchBackend):
+    """Keyword index over the .txt/.md files of a local directory.
+
+    Documents are split into paragraphs once at startup; a query returns the
+    best scoring paragraphs, or "" when none of them shares enough terms.
+    Stopwords are ignored, and a paragraph must contain at least
+    ``min_score`` and at least ``min_match_ratio`` of the query's remaining
+    terms, so "the ... of" alone never counts as an answer.
+    """
+
+    WORD_PATTERN = re.compile(r"[a-z0-9]+")
+    STOPWORDS = frozenset("""
+        a about above after again all am an and any are as at be because been before being below between both
+        but by can could did do does doing down during each few for from further had has have having he her
+        here hers him his how i if in into is it its itself just me more most my no nor not now of off on once
+        only or other our ours out over own same she should so some such than that the their theirs them then
+        there these they this those through to too under until up very was we were what when where which while
+        who whom why will with would you your yours tell show find search give explain know please latest
+        current today
+    """.split())
+
+    def __init__(self, path: str, name: str = "local_index", max_results: int = 3, min_score: int = 2,
+                 min_match_ratio: float = 0.5):
+        self.path = path
+        self.name = name
+        self.max_results = max_results
+        self.min_score = min_score
+        self.min_match_ratio = min_match_ratio
+        self.paragraphs = self._load_paragraphs(path)
+        print(f"📚 Local search index '{name}': {len(self.paragraphs)} paragraphs from {path}")
+
+    def _load_paragraphs(self, path: str) -> List[Dict[str, Any]]:
+        paragraphs = []
+        if not os.path.isdir(path):
+            return paragraphs
+
+        for root, _, files in os.walk(path):
+            for file_name in sorted(files):
+                if not file_name.endswith((".txt", ".md")):
+                    continue
+                with open(os.path.join(root, file_name), "r", encoding="utf-8", errors="ignore") as f:
+                    text = f.read()
+                for paragraph in re.split(r"\n\s*\n", text):
+                    paragraph = paragraph.strip()
+                    if paragraph:
+                        paragraphs.append({
+                            "text": paragraph,
+                            "terms": self._terms(paragraph)
+                        })
+        return paragraphs
+
+    def _terms(self, text: str) -> set:
+        return set(self.WORD_PATTERN.findall(text.lower())) - self.STOPWORDS
+
+    def search(self, query: str, cancel_event: threading.Event) -> str:
+        query_terms = self._terms(query)
+        if not query_terms:
+            return ""
+
+        # Relative to the query's length, but a one-word query may match on its one word
+        required = min(len(query_terms), max(self.min_score, math.ceil(self.min_match_ratio * len(query_terms))))
+        scored = []
+        for paragraph in self.paragraphs:
+            score = len(query_terms & paragraph["terms"])
+            if score >= required:
+                scored.append((score, paragraph["text"]))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return "\n".join(text for _, text in scored[:self.max_results])
+
+
+class HedgedSearch:
+    """Fan a query out over several backends and keep the first good answer.
+
+    The first backend is queried right away. Every ``hedge_delay`` seconds
+    without an answer, the query is also fired at the next backend; a backend
+    that fails or comes back empty triggers the next one immediately. As soon
+    as one backend returns a non-empty answer the others are cancelled.
+    """
+
+    def __init__(self, backends: List[SearchBackend], hedge_delay: float = 3.0, timeout: float = 300):
+        if not backends:
+            raise ValueError("HedgedSearch needs at least one backend")
+        self.backends = backends
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, search_config: Optional[Dict[str, Any]], base_dir: str = ".") -> "HedgedSearch":
+        """Build the hedged search from the "web_search" section of config.json.
+
+        Relative ``local_index`` paths are resolved against ``base_dir``. Research
+        server requests give up connecting after ``hedge_delay`` (by then the next
+        backend is already asked) and waiting for a line after ``timeout``, so
+        a cancelled request cannot outlive the search by more than that.
+        """
+        search_config = search_config or {}
+        hedge_delay = search_config.get("hedge_delay", 3.0)
+        timeout = search_config.get("timeout", 300)
+        request_timeout = (max(hedge_delay, 1.0), timeout)
+        backends = []
+        for backend_config in search_config.get("backends", []):
+            if not backend_config.get("enabled", True):
+                continue
+            backend_type = backend_config.get("type")
+            name = backend_config.get("name", backend_type)
+            if backend_type == "research_server":
+                backends.append(ResearchServerBackend(backend_config.get("url", DEFAULT_RESEARCH_URL), name,
+                                                      request_timeout))
+            elif backend_type == "local_index":
+                backends.append(LocalDocumentIndexBackend(
+                    os.path.join(base_dir, backend_config["path"]),
+                    name,
+                    backend_config.get("max_results", 3),
+                    backend_config.get("min_score", 2),
+                    backend_config.get("min_match_ratio", 0.5)
+                ))
+            else:
+                raise ValueError(f"Unknown search backend type: {backend_type}")
+
+        if not backends:
+            backends.append(ResearchServerBackend(timeout=request_timeout))
+
+        return cls(backends, hedge_delay, timeout)
+
+    def search(self, query: str) -> str:
+        cancel_event = threading.Event()
+        results = queue.Queue()
+        started = time.monotonic()
+        deadline = started + self.timeout
+        launched = 0
+        pending = 0
+
+        def run(backend: SearchBackend):
+            try:
+                with tracing.span(f"search.{backend.name}", {"backend": backend.name}):
+                    answer = backend.search(query, cancel_event)
+            except Exception as e:
+                print(f"❌ Search backend '{backend.name}' failed: {str(e)}")
+                answer = ""
+            results.put((backend, answer))
+
+        def launch_next():
+            nonlocal launched, pending
+            backend = self.backends[launched]
+            if launched > 0:
+                print(f"⏩ Hedging search on '{backend.name}' after {time.monotonic() - started:.2f}s")
+            # Backends run in their own threads but stay in the caller's trace
+            threading.Thread(target=tracing.run_in_context(run), args=(backend,), daemon=True).start()
+            launched += 1
+            pending += 1
+
+        launch_next()
+        next_hedge = started + self.hedge_delay
+
+        try:
+            while pending or launched < len(self.backends):
+                now = time.monotonic()
+                if now >= deadline:
+                    print(f"⏰ Web search timed out after {self.timeout}s")
+                    return ""
+
+                if pending == 0 or (launched < len(self.backends) and now >= next_hedge):
+                    launch_next()
+                    next_hedge = now + self.hedge_delay
+                    continue
+
+                wait_until = deadline
+                if launched < len(self.backends):
+                    wait_until = min(wait_until, next_hedge)
+
+                try:
+                    backend, answer = results.get(timeout=max(wait_until - now, 0))
+                except queue.Empty:
+                    continue
+
+                pending -= 1
+                if answer:
+                    print(f"🏁 Search answered by '{backend.name}' in {time.monotonic() - started:.2f}s")
+                    return answer
+
+                # An empty answer should not make us sit out the rest of the hedge delay
+                next_hedge = time.monotonic()
+
+            return ""
+        finally:
+            cancel_event.set()
@@ -3,13 +3,36 @@ import os
 # Add the parent directory to Python path so we can import mcp_server
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any
 import uvicorn
+import asyncio
+import json
+import time
+
+from chat_pipeline import profiling, tracing
 
 # Import tools directly from the same directory
 from tools import CalculatorTool, TemperatureTool, GeminiWebSearchTool
+from search_backends import HedgedSearch
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(PROJECT_ROOT, "config", "config.json")
+
+def load_config():
+    """Load the shared config.json, falling back to defaults if it is missing"""
+    try:
+        with open(CONFIG_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Could not load {CONFIG_PATH}, using defaults: {str(e)}")
+        return {}
+
+config = load_config()
+tracing.configure(config.get("tracing"), "mcp_server", PROJECT_ROOT)
+profiler = profiling.configure(config.get("profiling"), PROJECT_ROOT)
 
 app = FastAPI(
     title="MCP Server for AI Tools", 
@@ -21,23 +44,28 @@ class ToolCallRequest(BaseModel):
     tool_name: str
     parameters: Dict[str, Any]
 
+class BatchToolCallRequest(BaseModel):
+    calls: List[ToolCallRequest]
+
 class ToolDescription(BaseModel):
     name: str
     description: str
     parameters: List[Dict[str, Any]]
+    # "direct" tools return user-ready text that clients may show without an LLM rewrite
+    answer_policy: Dict[str, Any] = {"mode": "synthesize"}
 
 # Initialize tools
 tools = {
     "calculator": CalculatorTool(),
     "get_temperature": TemperatureTool(),
-    "gemini_web_search": GeminiWebSearchTool(),
+    "gemini_web_search": GeminiWebSearchTool(HedgedSearch.from_config(config.get("web_search"), PROJECT_ROOT)),
 }
 
 @app.get("/")
 async def root():
     return {
         "message": "MCP Server is running with Ollama + Qwen3", 
-        "available_endpoints": ["/mcp/tools", "/mcp/execute"],
+        "available_endpoints": ["/mcp/tools", "/mcp/execute", "/mcp/execute_batch"],
         "tools_count": len(tools)
     }
 
@@ -54,25 +82,30 @@ async def get_tools():
             "name": "calculator",
             "description": "Performs basic arithmetic operations (add, subtract, multiply, divide)",
             "parameters": [
-                {"name": "operation", "type": "string", "description": "Operation: add, subtract, multiply, divide", "required": True},
+                {"name": "operation", "type": "string", "description": "Operation: add, subtract, multiply, divide", "required": True,
+                 "enum": ["add", "subtract", "multiply", "divide"]},
                 {"name": "a", "type": "float", "description": "First number", "required": True},
                 {"name": "b", "type": "float", "description": "Second number", "required": True}
-            ]
+            ],
+            "answer_policy": {"mode": "direct", "template": "{result}"}
         },
         {
             "name": "get_temperature",
             "description": "Gets current temperature for a given place",
             "parameters": [
                 {"name": "place_name", "type": "string", "description": "City name (e.g., Pune, Mumbai, Delhi)", "required": True}
-            ]
+            ],
+            "answer_policy": {"mode": "direct", "template": "{result}"}
         },
         {
             "name": "gemini_web_search",
             "description": "Performs real-time web search using Gemini AI for latest information and current events",
             "parameters": [
                 {"name": "query", "type": "string", "description": "Search query or question requiring latest information", "required": True},
-                {"name": "max_length", "type": "string", "description": "Content length: short, medium, long", "required": False}
-            ]
+                {"name": "max_length", "type": "string", "description": "Content length: short, medium, long", "required": False,
+                 "enum": ["short", "medium", "long"]}
+            ],
+            "answer_policy": {"mode": "synthesize"}
         }
     ]
 
@@ -92,13 +125,123 @@ async def execute_tool(request: ToolCallRequest):
         )
     
     try:
-        result = tool.execute(request.parameters)
+        with tracing.span(f"tool.{request.tool_name}", {"parameters": request.parameters}):
+            result = tool.execute(request.parameters)
         print(f"✅ Tool execution successful: {result}")
         return {"result": result}
     except Exception as e:
         print(f"❌ Tool execution failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Tool execution failed: {str(e)}")
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Continue the caller's trace (traceparent header) for every request except untraced probes"""
+    traceparent = request.headers.get(tracing.TRACEPARENT_HEADER)
+    if not tracing.should_trace(request.url.path, traceparent):
+        return await call_next(request)
+    with tracing.span(f"mcp_server {request.method} {request.url.path}", traceparent=traceparent) as request_span:
+        response = await call_next(request)
+        if request_span is not None:
+            request_span.set_attribute("status_code", response.status_code)
+        return response
+
+def run_batch_call(call: ToolCallRequest) -> Dict[str, Any]:
+    """Execute one call of a batch; failures are reported per call instead of failing the batch.
+
+    ``duration_ms`` is the time spent in the tool itself, so clients can tell
+    it apart from network time.
+    """
+    tool = tools.get(call.tool_name)
+    if not tool:
+        return {"tool_name": call.tool_name, "error": f"Tool '{call.tool_name}' not found. Available tools: {list(tools.keys())}", "duration_ms": 0.0}
+    started = time.perf_counter()
+    with tracing.span(f"tool.{call.tool_name}", {"parameters": call.parameters}) as tool_span:
+        try:
+            outcome = {"result": tool.execute(call.parameters)}
+        except Exception as e:
+            outcome = {"error": f"Tool execution failed: {str(e)}"}
+            if tool_span is not None:
+                tool_span.record_error(e)
+    return {"tool_name": call.tool_name, **outcome, "duration_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+@app.post("/mcp/execute_batch")
+async def execute_batch(request: BatchToolCallRequest):
+    """Execute several tool calls concurrently; results are returned in call order"""
+    max_calls = config.get("mcp_server", {}).get("max_batch_calls", 8)
+    if len(request.calls) > max_calls:
+        raise HTTPException(status_code=400, detail=f"At most {max_calls} calls per batch, got {len(request.calls)}")
+    
+    print(f"🔧 Executing batch of {len(request.calls)} tool calls: {[call.tool_name for call in request.calls]}")
+    # Tools block (HTTP requests, computation), so each call runs in a worker thread
+    results = await asyncio.gather(*(asyncio.to_thread(run_batch_call, call) for call in request.calls))
+    print(f"✅ Batch complete: {sum('result' in r for r in results)}/{len(results)} succeeded")
+    return {"results": results}
+
+def is_admin(request: Request) -> bool:
+    admin_token = config.get("admin", {}).get("token")
+    return bool(admin_token) and request.headers.get("X-Admin-Token") == admin_token
+
+def admin_required(request: Request):
+    """Dependency that only allows requests carrying the configured X-Admin-Token header"""
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+if profiler is not None:
+    # Registered only when profiling is enabled, so it costs nothing otherwise
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        """cProfile a request carrying X-Profile: 1 (also records whatever else runs on the event loop meanwhile)"""
+        if request.headers.get(profiling.PROFILE_HEADER) != "1" or not is_admin(request):
+            return await call_next(request)
+        try:
+            profile_id = profiler.start_request()
+        except Exception as e:
+            # cProfile is per process: a second concurrent profile would mix both requests
+            return JSONResponse({"detail": str(e)}, status_code=409)
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.finish_request(profile_id, f"{request.method} {request.url.path}")
+        response.headers[profiling.PROFILE_ID_HEADER] = profile_id
+        return response
+
+    @app.get("/admin/profile/cpu", dependencies=[Depends(admin_required)])
+    async def profile_cpu(seconds: float = 10, interval_ms: float = None, format: str = "json"):
+        """Sample all threads for N seconds; format=collapsed returns flamegraph input as text"""
+        try:
+            result = await asyncio.to_thread(profiler.sample, seconds, interval_ms)
+        except Exception as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if format == "collapsed":
+            return PlainTextResponse(result["collapsed"] + "\n")
+        return result
+
+    @app.get("/admin/profile/requests/{profile_id}", dependencies=[Depends(admin_required)])
+    def profile_request(profile_id: str, sort: str = "cumulative", limit: int = 40):
+        """pstats report of a request profiled with the X-Profile header"""
+        try:
+            return PlainTextResponse(profiler.request_report(profile_id, sort, limit))
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+    @app.post("/admin/profile/memory", dependencies=[Depends(admin_required)])
+    async def profile_memory_control(request: Request):
+        """{"action": "start"|"stop", "frames": N} starts or stops tracemalloc"""
+        data = await request.json()
+        if data.get("action") == "start":
+            return profiler.memory_start(data.get("frames"))
+        if data.get("action") == "stop":
+            return profiler.memory_stop()
+        raise HTTPException(status_code=400, detail='action must be "start" or "stop"')
+
+    @app.get("/admin/profile/memory", dependencies=[Depends(admin_required)])
+    def profile_memory(limit: int = 20, group_by: str = "lineno", diff: bool = False):
+        """Top allocations now, or with diff=true their growth since the last snapshot"""
+        try:
+            return profiler.memory_snapshot(limit, group_by, diff)
+        except Exception as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
 if __name__ == "__main__":
     print("🚀 Starting MCP Server for Ollama + Qwen3...")
     print("Server will be available at: http://localhost:8000")
@@ -1,6 +1,6 @@
 from typing import Dict, Any
 import random
-from web_search import get_web_summary
+from search_backends import HedgedSearch
 
 class CalculatorTool:
     """Calculator tool for basic arithmetic operations"""
@@ -92,8 +92,10 @@ class TemperatureTool:
 class GeminiWebSearchTool:
     """Gemini-powered web search tool for real-time information and to get latest updates."""
     
-    def __init__(self):
+    def __init__(self, search: HedgedSearch = None):
         self.max_content_length = 2000  # Limit content to fit context window
+        # Defaults to the single research server at localhost:2024
+        self.search = search or HedgedSearch.from_config(None)
     
     def truncate_content(self, content: str, max_length: int = None) -> str:
         """Truncate content to fit within context window limits"""
@@ -135,11 +137,11 @@ class GeminiWebSearchTool:
             else:  # medium
                 content_limit = 2000
             
-            # Call the Gemini search function
+            # Query the search backends, first good answer wins
             try:
-                search_result = get_web_summary(query)
+                search_result = self.search.search(query)
                 
-                if not search_result or search_result == "No answer received.":
+                if not search_result:
                     return f"Error: Could not retrieve search results for '{query}'. The Gemini search service may be unavailable."
                 
                 # Truncate if necessary
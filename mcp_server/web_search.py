@@ -3,6 +3,13 @@ import json
 import re
 import uuid
 
+from chat_pipeline import tracing
+
+
+DEFAULT_RESEARCH_URL = "http://localhost:2024"
+# (connect, read) seconds; the read timeout bounds the gap between two lines of the stream
+DEFAULT_TIMEOUT = (3.0, 300.0)
+
 
 def _generate_unique_id():
     """Generate a unique UUID."""
@@ -23,8 +30,47 @@ def _extract_clean_answer(response_text: str) -> str:
     return cleaned.strip()
 
 
-def _make_api_request(query: str) -> str:
-    """Send a request to the local API and stream the best possible answer."""
+def _pick_answer(data_str: str, final_answer: str) -> str:
+    """Return the better answer: ``final_answer`` or the text in one SSE ``data:`` payload.
+
+    Priority order: web_research_result > messages > content > other long text fields.
+    The longest candidate wins.
+    """
+    try:
+        parsed = json.loads(data_str)
+    except json.JSONDecodeError:
+        return data_str if len(data_str) > len(final_answer) else final_answer
+
+    if isinstance(parsed, dict):
+        if isinstance(parsed.get("web_research_result"), str) and len(parsed["web_research_result"]) > len(final_answer):
+            final_answer = parsed["web_research_result"]
+
+        if "messages" in parsed:
+            for msg in parsed["messages"]:
+                content = msg.get("content", "")
+                if isinstance(content, str) and len(content) > len(final_answer):
+                    final_answer = content
+
+        if isinstance(parsed.get("content"), str) and len(parsed["content"]) > len(final_answer):
+            final_answer = parsed["content"]
+
+        for key, value in parsed.items():
+            if key not in ["messages", "content", "web_research_result"] and isinstance(value, str) and len(value) > 50:
+                if len(value) > len(final_answer):
+                    final_answer = value
+    return final_answer
+
+
+def _make_api_request(query: str, base_url: str = DEFAULT_RESEARCH_URL, cancel_event=None,
+                      timeout=DEFAULT_TIMEOUT) -> str:
+    """Send a request to the local API and stream the best possible answer.
+
+    If ``cancel_event`` (a ``threading.Event``) gets set while the answer is
+    streaming, the stream is closed and an empty string is returned. Closing
+    the connection makes the research server cancel the run (``on_disconnect``).
+    ``cancel_event`` is only seen between lines, so ``timeout`` is what ends a
+    request stuck connecting or waiting for the next line.
+    """
     payload = {
         "input": {
             "messages": [
@@ -45,50 +91,31 @@ def _make_api_request(query: str) -> str:
 
     try:
         # Step 1: Get thread ID
-        resp = requests.post("http://localhost:2024/threads/", json=payload)
+        resp = requests.post(f"{base_url}/threads/", json=payload, headers=tracing.inject(), timeout=timeout)
         resp.raise_for_status()
+        if cancel_event is not None and cancel_event.is_set():
+            return ""
         thread_id = resp.json().get("thread_id")
 
         if not thread_id:
             return ""
 
         # Step 2: Stream the response
-        stream_url = f"http://localhost:2024/threads/{thread_id}/runs/stream"
+        stream_url = f"{base_url}/threads/{thread_id}/runs/stream"
         final_answer = ""
 
-        with requests.post(stream_url, json=payload, stream=True) as stream_resp:
+        with requests.post(stream_url, json=payload, stream=True, headers=tracing.inject(),
+                           timeout=timeout) as stream_resp:
             stream_resp.raise_for_status()
             for line in stream_resp.iter_lines(decode_unicode=True):
+                if cancel_event is not None and cancel_event.is_set():
+                    return ""
+
                 if not line or line.startswith(":"):
                     continue
 
                 if line.startswith("data: "):
-                    data_str = line[6:]
-                    try:
-                        parsed = json.loads(data_str)
-
-                        # Priority order: web_research_result > messages > content > other long text fields
-                        if isinstance(parsed, dict):
-                            if isinstance(parsed.get("web_research_result"), str) and len(parsed["web_research_result"]) > len(final_answer):
-                                final_answer = parsed["web_research_result"]
-
-                            if "messages" in parsed:
-                                for msg in parsed["messages"]:
-                                    content = msg.get("content", "")
-                                    if isinstance(content, str) and len(content) > len(final_answer):
-                                        final_answer = content
-
-                            if isinstance(parsed.get("content"), str) and len(parsed["content"]) > len(final_answer):
-                                final_answer = parsed["content"]
-
-                            for key, value in parsed.items():
-                                if key not in ["messages", "content", "web_research_result"] and isinstance(value, str) and len(value) > 50:
-                                    if len(value) > len(final_answer):
-                                        final_answer = value
-
-                    except json.JSONDecodeError:
-                        if len(data_str) > len(final_answer):
-                            final_answer = data_str
+                    final_answer = _pick_answer(line[6:], final_answer)
 
         return final_answer.strip()
 
@@ -99,16 +126,3 @@ def _make_api_request(query: str) -> str:
         print(f"[ERROR] Unexpected error: {err}")
         return ""
 
-
-def get_web_summary(query: str) -> str:
-    """
-    Main callable function.
-    Accepts a question/query and returns the cleaned final answer (string).
-    """
-    if not query:
-        return "Query is empty."
-
-    raw_answer = _make_api_request(query)
-    clean_answer = _extract_clean_answer(raw_answer)
-
-    return clean_answer if clean_answer else "No answer received."
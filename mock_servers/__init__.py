@@ -0,0 +1 @@
+"""Deterministic mock servers for offline load tests"""
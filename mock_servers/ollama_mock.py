@@ -0,0 +1,311 @@
+"""
+Deterministic stand-in for the Ollama API, for load tests without a GPU.
+
+Implements the endpoints the app uses (/api/chat, /api/generate, /api/embed,
+/api/tags, /api/ps) with canned output and a simple timing model:
+
+- the first request for a model pays ``load_ms`` (reported as load_duration)
+- prefill takes prompt tokens / ``prefill_tps`` (a prompt token ~ 4 characters)
+- tokens are streamed at ``decode_tps``
+- at most ``max_concurrent`` generations run at once (like OLLAMA_NUM_PARALLEL);
+  up to ``max_queue`` more wait, later ones get a 503 (like OLLAMA_MAX_QUEUE)
+
+Tool decisions (requests with ``format=``) return a valid ``{"tool_calls": [...]}``
+object: the rules router's call where it matches, a web search for news-like
+queries, and no tool otherwise. The same request always gets the same answer.
+
+Usage: python mock_servers/ollama_mock.py --port 11435 --decode-tps 40 --prefill-tps 800
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_pipeline.router import NO_TOOL_NEEDED, RulesRouter
+
+NS_PER_SECOND = 1_000_000_000
+EMBEDDING_DIMENSIONS = 64
+WEB_SEARCH_WORDS = re.compile(r"\b(latest|news|current|today|this week|recent|who won|announce)", re.IGNORECASE)
+CANNED_SENTENCES = [
+    "This is a canned answer from the mock Ollama server.",
+    "It streams a fixed set of tokens at a configurable rate.",
+    "Prefill and decode delays follow the configured throughput.",
+    "The same question always gets the same answer.",
+    "Use it to benchmark the pipeline without a GPU.",
+    "Nothing here was generated by a real language model.",
+]
+
+DEFAULT_SETTINGS = {
+    "decode_tps": 40.0,
+    "prefill_tps": 800.0,
+    "load_ms": 2000.0,
+    "max_concurrent": 2,
+    "max_queue": 64,
+    "answer_tokens": 60,
+    "models": ["ai_app_model", "qwen3:1.7b", "nomic-embed-text"],
+}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _seed(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def prompt_tokens(messages) -> int:
+    return max(1, sum(len(str(m.get("content", ""))) for m in messages) // 4)
+
+
+def answer_tokens(question: str, count: int):
+    """Deterministic answer text for a question, split into stream tokens"""
+    seed = _seed(question)
+    words = []
+    index = seed
+    while len(words) < count:
+        words.extend(CANNED_SENTENCES[index % len(CANNED_SENTENCES)].split())
+        index += 1
+    return [word + " " for word in words[:count]]
+
+
+def query_of(messages) -> str:
+    """The user's query in a decision, follow-up or answer prompt"""
+    content = str(messages[-1].get("content", "")) if messages else ""
+    match = re.search(r"User query:\s*(.+)", content)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r'The user asked:\s*"([^"]*)"', content)
+    return match.group(1) if match else content
+
+
+def tool_names_in(format_schema) -> list:
+    """Tool names admitted by a decision schema built by build_decision_schema"""
+    try:
+        branches = format_schema["properties"]["tool_calls"]["items"]["anyOf"]
+        return [branch["properties"]["tool_name"]["enum"][0] for branch in branches]
+    except (KeyError, IndexError, TypeError):
+        return []
+
+
+def decide(messages, tool_names) -> list:
+    """Tool calls the mock decides on for a decision prompt"""
+    # Follow-up rounds: the first round is always enough
+    if "Tool results so far" in str(messages[-1].get("content", "")):
+        return []
+
+    query = query_of(messages)
+    routed = RulesRouter(tool_names).route(query) if tool_names else None
+    if isinstance(routed, dict):
+        return [routed]
+    if routed != NO_TOOL_NEEDED and "gemini_web_search" in tool_names and WEB_SEARCH_WORDS.search(query):
+        return [{"tool_name": "gemini_web_search", "parameters": {"query": query}}]
+    return []
+
+
+def decision_tokens(text: str):
+    """Split a JSON decision roughly like a tokenizer would"""
+    return re.findall(r'\s*(?:[{}\[\]:,]|"[^"]{0,6}|[^"{}\[\]:,\s]{1,6}|[^"]{1,6}")', text) or [text]
+
+
+def create_app(**overrides) -> FastAPI:
+    settings = {**DEFAULT_SETTINGS, **overrides}
+    app = FastAPI(title="Mock Ollama")
+    slots = asyncio.Semaphore(settings["max_concurrent"])
+    loaded = {}
+    # "waiting" counts admitted requests that do not hold a slot yet
+    state = {"waiting": 0, "requests": 0, "rejected": 0}
+
+    async def load(model: str) -> int:
+        """Load delay in ns for this request (0 if the model is resident)"""
+        if model in loaded:
+            return 0
+        await asyncio.sleep(settings["load_ms"] / 1000)
+        loaded[model] = time.time()
+        return int(settings["load_ms"] / 1000 * NS_PER_SECOND)
+
+    def final_chunk(model, started, load_ns, n_prompt, prefill_s, n_eval, decode_s, **extra):
+        return {
+            "model": model,
+            "created_at": _now(),
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.perf_counter() - started) * NS_PER_SECOND),
+            "load_duration": load_ns,
+            "prompt_eval_count": n_prompt,
+            "prompt_eval_duration": int(prefill_s * NS_PER_SECOND),
+            "eval_count": n_eval,
+            "eval_duration": int(decode_s * NS_PER_SECOND),
+            **extra
+        }
+
+    async def generation(model, tokens, n_prompt, tool_calls=None):
+        """Yield stream chunks, holding a slot for the whole generation"""
+        queued = True
+        try:
+            async with slots:
+                queued = False
+                state["waiting"] -= 1
+                started = time.perf_counter()
+                load_ns = await load(model)
+                prefill_s = n_prompt / settings["prefill_tps"]
+                await asyncio.sleep(prefill_s)
+                decode_started = time.perf_counter()
+                if tool_calls:
+                    await asyncio.sleep(len(tokens) / settings["decode_tps"])
+                    yield {"model": model, "created_at": _now(), "done": False,
+                           "message": {"role": "assistant", "content": "", "tool_calls": tool_calls}}
+                else:
+                    for token in tokens:
+                        await asyncio.sleep(1 / settings["decode_tps"])
+                        yield {"model": model, "created_at": _now(), "done": False,
+                               "message": {"role": "assistant", "content": token}}
+                yield final_chunk(model, started, load_ns, n_prompt, prefill_s, len(tokens),
+                                  time.perf_counter() - decode_started)
+        finally:
+            # A client that disconnects while queued is cancelled before it gets a slot
+            if queued:
+                state["waiting"] -= 1
+
+    def admit():
+        state["requests"] += 1
+        if state["waiting"] >= settings["max_queue"]:
+            state["rejected"] += 1
+            return JSONResponse({"error": "server busy, please try again. maximum pending requests exceeded"},
+                                status_code=503)
+        state["waiting"] += 1
+        return None
+
+    async def respond(chunks, stream: bool, wrap):
+        if stream:
+            async def ndjson():
+                async for chunk in chunks:
+                    yield json.dumps(wrap(chunk)) + "\n"
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+        content, tool_calls, final = "", None, None
+        async for chunk in chunks:
+            message = chunk.get("message", {})
+            content += message.get("content", "")
+            tool_calls = message.get("tool_calls") or tool_calls
+            final = chunk
+        final["message"] = {"role": "assistant", "content": content}
+        if tool_calls:
+            final["message"]["tool_calls"] = tool_calls
+        return wrap(final)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model, messages = body.get("model", "mock"), body.get("messages", [])
+        options = body.get("options") or {}
+        if body.get("keep_alive") in (0, "0", "0s"):
+            loaded.pop(model, None)
+        rejected = admit()
+        if rejected:
+            return rejected
+
+        n_prompt = prompt_tokens(messages)
+        # num_predict caps the canned answer; unset or -1 means the full answer
+        length = min(options.get("num_predict") or settings["answer_tokens"], settings["answer_tokens"])
+        length = length if length > 0 else settings["answer_tokens"]
+        tool_calls = None
+        if body.get("format"):
+            decision = decide(messages, tool_names_in(body["format"]))
+            tokens = decision_tokens(json.dumps({"tool_calls": decision}))
+        elif body.get("tools"):
+            decision = decide(messages, [tool["function"]["name"] for tool in body["tools"]])
+            tool_calls = [{"function": {"name": call["tool_name"], "arguments": call["parameters"]}} for call in decision]
+            tokens = decision_tokens(json.dumps(decision)) if tool_calls else answer_tokens(query_of(messages), length)
+        else:
+            tokens = answer_tokens(query_of(messages), length)
+
+        return await respond(generation(model, tokens, n_prompt, tool_calls), body.get("stream", True), lambda chunk: chunk)
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model, prompt = body.get("model", "mock"), body.get("prompt", "")
+        if body.get("keep_alive") in (0, "0", "0s"):
+            loaded.pop(model, None)
+            return {"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "unload"}
+        rejected = admit()
+        if rejected:
+            return rejected
+
+        tokens = answer_tokens(prompt, settings["answer_tokens"]) if prompt else []
+
+        def as_generate(chunk):
+            chunk = dict(chunk)
+            chunk["response"] = chunk.pop("message", {}).get("content", "")
+            return chunk
+        return await respond(generation(model, tokens, prompt_tokens([{"content": prompt}])), body.get("stream", False) and bool(prompt), as_generate)
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        texts = body.get("input", "")
+        texts = texts if isinstance(texts, list) else [texts]
+        embeddings = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            embeddings.append([(digest[i % len(digest)] - 128) / 128 for i in range(EMBEDDING_DIMENSIONS)])
+        return {"model": body.get("model"), "embeddings": embeddings}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": model, "model": model, "size": 0, "digest": "mock"} for model in settings["models"]]}
+
+    @app.get("/api/ps")
+    async def ps():
+        return {"models": [{"name": model, "model": model, "size": 0, "digest": "mock"} for model in loaded]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-mock"}
+
+    @app.get("/mock/stats")
+    async def stats():
+        return {**state, "loaded": list(loaded), "settings": settings}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a deterministic mock of the Ollama API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--decode-tps", type=float, default=DEFAULT_SETTINGS["decode_tps"], help="Streamed tokens per second")
+    parser.add_argument("--prefill-tps", type=float, default=DEFAULT_SETTINGS["prefill_tps"], help="Prompt tokens processed per second")
+    parser.add_argument("--load-ms", type=float, default=DEFAULT_SETTINGS["load_ms"], help="Cold load time of a model")
+    parser.add_argument("--max-concurrent", type=int, default=DEFAULT_SETTINGS["max_concurrent"], help="Parallel generations (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_SETTINGS["max_queue"], help="Waiting requests before 503s (OLLAMA_MAX_QUEUE)")
+    parser.add_argument("--answer-tokens", type=int, default=DEFAULT_SETTINGS["answer_tokens"], help="Length of canned answers")
+    args = parser.parse_args()
+
+    print(f"🧪 Mock Ollama at http://{args.host}:{args.port} "
+          f"(decode {args.decode_tps} tok/s, prefill {args.prefill_tps} tok/s, {args.max_concurrent} parallel)")
+    uvicorn.run(create_app(
+        decode_tps=args.decode_tps,
+        prefill_tps=args.prefill_tps,
+        load_ms=args.load_ms,
+        max_concurrent=args.max_concurrent,
+        max_queue=args.max_queue,
+        answer_tokens=args.answer_tokens
+    ), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
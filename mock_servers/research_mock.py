@@ -0,0 +1,111 @@
+"""
+Deterministic stand-in for the research backend used by gemini_web_search.
+
+Speaks the two calls web_search._make_api_request makes:
+
+- POST /threads/                       -> {"thread_id": ...}
+- POST /threads/{thread_id}/runs/stream -> server-sent events
+
+The stream sends one ``updates`` event per research loop, ``loop_seconds``
+apart, and ends with the answer message. Answers depend only on the query.
+Closing the connection cancels the run, like ``on_disconnect: "cancel"``.
+
+Usage: python mock_servers/research_mock.py --port 2025 --loops 3 --loop-seconds 2
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+import uvicorn
+
+DEFAULT_SETTINGS = {
+    "loops": 3,
+    "loop_seconds": 2.0,
+    "thread_ms": 50.0,
+}
+
+
+def query_of(body) -> str:
+    messages = (body.get("input") or {}).get("messages") or []
+    return str(messages[-1].get("content", "")) if messages else ""
+
+
+def research_answer(query: str) -> str:
+    """Long deterministic answer, so it wins _make_api_request's longest-text pick"""
+    digest = hashlib.sha256(query.encode("utf-8")).hexdigest()
+    return (
+        f"Mock research summary for \"{query}\". "
+        f"Source {digest[:8]} reports the first finding; source {digest[8:16]} confirms it "
+        f"and adds context; source {digest[16:24]} covers the most recent developments. "
+        "This answer comes from the mock research server and contains no real search results."
+    )
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_app(**overrides) -> FastAPI:
+    settings = {**DEFAULT_SETTINGS, **overrides}
+    app = FastAPI(title="Mock research server")
+    state = {"threads": 0, "runs": 0, "active": 0, "completed": 0, "cancelled": 0}
+
+    @app.post("/threads/")
+    async def create_thread():
+        await asyncio.sleep(settings["thread_ms"] / 1000)
+        state["threads"] += 1
+        return {"thread_id": str(uuid.uuid4())}
+
+    @app.post("/threads/{thread_id}/runs/stream")
+    async def run_stream(thread_id: str, request: Request):
+        query = query_of(await request.json())
+        run_id = str(uuid.uuid4())
+        state["runs"] += 1
+
+        async def events():
+            state["active"] += 1
+            try:
+                yield sse("metadata", {"run_id": run_id, "thread_id": thread_id})
+                for loop in range(1, settings["loops"] + 1):
+                    await asyncio.sleep(settings["loop_seconds"])
+                    yield sse("updates", {"web_research": {"research_loop_count": loop, "sources": loop * 3}})
+                yield sse("values", {"messages": [
+                    {"type": "human", "content": query},
+                    {"type": "ai", "content": research_answer(query)}
+                ]})
+                state["completed"] += 1
+            except asyncio.CancelledError:
+                state["cancelled"] += 1
+                raise
+            finally:
+                state["active"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/mock/stats")
+    async def stats():
+        return {**state, "settings": settings}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a deterministic mock of the research backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2025)
+    parser.add_argument("--loops", type=int, default=DEFAULT_SETTINGS["loops"], help="Research loops per run")
+    parser.add_argument("--loop-seconds", type=float, default=DEFAULT_SETTINGS["loop_seconds"], help="Duration of one research loop")
+    parser.add_argument("--thread-ms", type=float, default=DEFAULT_SETTINGS["thread_ms"], help="Latency of creating a thread")
+    args = parser.parse_args()
+
+    print(f"🧪 Mock research server at http://{args.host}:{args.port} ({args.loops} loops x {args.loop_seconds}s)")
+    uvicorn.run(create_app(loops=args.loops, loop_seconds=args.loop_seconds, thread_ms=args.thread_ms),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Production launcher for the ASGI web interface (asgi_app.py)
+"""
+import argparse
+import json
+import os
+
+import uvicorn
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def load_server_config():
+    """Read the "web" section of config.json"""
+    try:
+        with open(os.path.join(BASE_DIR, "config", "config.json"), "r") as f:
+            return json.load(f).get("web", {})
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def main():
+    server_config = load_server_config()
+
+    parser = argparse.ArgumentParser(description="Run the AI web interface on uvicorn")
+    parser.add_argument("--host", default=server_config.get("host", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=server_config.get("port", 5000))
+    parser.add_argument("--workers", type=int, default=server_config.get("workers", 1),
+                        help="Worker processes; each one holds its own clients and background monitors")
+    parser.add_argument("--log-level", default=server_config.get("log_level", "info"))
+    args = parser.parse_args()
+
+    print("🚀 Starting AI Web Interface (ASGI)...")
+    print(f"🌐 Web interface at: http://localhost:{args.port} ({args.workers} worker(s))")
+    print("=" * 50)
+
+    uvicorn.run(
+        "asgi_app:app",
+        app_dir=BASE_DIR,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        timeout_keep_alive=30,
+        # Streamed chats should not be cut off during a rolling restart
+        timeout_graceful_shutdown=60
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import subprocess
-import sys
 import os
 import time
 
@@ -77,6 +76,14 @@ def setup_ollama_model():
         print("❌ Failed to pull base model. Check your internet connection.")
         return False
     
+    # Small model used for the tool decision (ollama.roles.router in config.json)
+    if not run_command("ollama pull qwen3:1.7b", "Pulling Qwen3:1.7b router model", False):
+        print("⚠️ Failed to pull router model; set ollama.roles.router.model to ai_app_model to use the main model")
+    
+    # Embedding model used by the semantic answer cache
+    if not run_command("ollama pull nomic-embed-text", "Pulling nomic-embed-text embedding model", False):
+        print("⚠️ Failed to pull embedding model; the answer cache will be skipped until it is available")
+    
     # Wait a moment for the model to be ready
     time.sleep(2)
     
@@ -118,7 +125,9 @@ def install_requirements():
         "uvicorn>=0.24.0", 
         "pydantic>=2.5.0",
         "requests>=2.31.0",
-        "ollama>=0.1.7"
+        "ollama>=0.5.0",
+        "httpx>=0.27.0",
+        "numpy>=1.24.0"
     ]
     
     for req in requirements:
@@ -171,7 +180,7 @@ def verify_installation():
     
     # Check if Python packages are installed
     try:
-        import fastapi, uvicorn, pydantic, requests, ollama
+        import fastapi, uvicorn, pydantic, requests, ollama, httpx, numpy
         print("✅ All Python packages are available")
         return True
     except ImportError as e:
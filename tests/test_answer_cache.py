@@ -0,0 +1,30 @@
+from chat_pipeline.answer_cache import SemanticAnswerCache, normalize_question
+
+VECTOR = [0.1, 0.2, 0.3, 0.4]
+NEAR_VECTOR = [0.1, 0.2, 0.3, 0.41]
+CALL = [{"name": "calculator", "arguments": {"operation": "add", "a": 5, "b": 3}}]
+
+
+def cache_with(question):
+    cache = SemanticAnswerCache({"max_entries": 10})
+    cache.store(normalize_question(question), VECTOR, "The result of 5.0 + 3.0 = 8.0", CALL)
+    return cache
+
+
+def test_same_question_hits():
+    assert cache_with("What is 5 + 3?").lookup(normalize_question("what is 5 + 3"), NEAR_VECTOR) is not None
+
+
+def test_operator_word_matches_symbol():
+    assert cache_with("What is 5 + 3?").lookup(normalize_question("What is 5 plus 3?"), NEAR_VECTOR) is not None
+
+
+def test_other_operator_misses():
+    cache = cache_with("What is 5 + 3?")
+    for question in ("what is 5 - 3", "what is 5 * 3", "what is 5 × 3", "what is 5 / 3", "what is 5 ÷ 3",
+                     "what is 5 minus 3", "what is 5 times 3", "what is 5 divided by 3"):
+        assert cache.lookup(normalize_question(question), NEAR_VECTOR) is None, question
+
+
+def test_other_number_misses():
+    assert cache_with("What is 5 + 3?").lookup(normalize_question("what is 5 + 4"), NEAR_VECTOR) is None
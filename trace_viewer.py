@@ -0,0 +1,124 @@
+"""
+Show traces exported by chat_pipeline.tracing as a waterfall.
+
+Spans from every process (web app, MCP server, ...) are merged by trace id,
+so one chat turn is shown end to end.
+
+Usage:
+    python trace_viewer.py                 # list the most recent traces
+    python trace_viewer.py <trace_id>      # waterfall of one trace (a prefix is enough)
+    python trace_viewer.py --slow          # waterfalls of the traces in the slow-request log
+"""
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BAR_WIDTH = 40
+
+
+def load_config():
+    try:
+        with open(os.path.join(BASE_DIR, "config", "config.json"), "r") as f:
+            return json.load(f).get("tracing", {})
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def read_traces(path):
+    """trace_id -> list of spans, in the order the traces were first seen"""
+    traces = OrderedDict()
+    if not os.path.exists(path):
+        return traces
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            traces.setdefault(record["trace_id"], []).extend(record["spans"])
+    return traces
+
+
+def print_summary(traces, limit):
+    print(f"{'trace id':<34}{'start':<10}{'ms':>9}{'spans':>7}  root")
+    for trace_id, spans in list(traces.items())[-limit:]:
+        root = min(spans, key=lambda s: s["start"])
+        errors = sum(s["status"] == "error" for s in spans)
+        start = root["start"]
+        end = max(s["start"] + s["duration_ms"] / 1000 for s in spans)
+        clock = time.strftime("%H:%M:%S", time.localtime(start))
+        flag = f"  ❌ {errors} error(s)" if errors else ""
+        print(f"{trace_id:<34}{clock:<10}{(end - start) * 1000:>9.0f}{len(spans):>7}  {root['service']}:{root['name']}{flag}")
+
+
+def print_waterfall(trace_id, spans):
+    start = min(s["start"] for s in spans)
+    total_ms = max((s["start"] - start) * 1000 + s["duration_ms"] for s in spans) or 1.0
+    children = {}
+    ids = {s["span_id"] for s in spans}
+    for s in sorted(spans, key=lambda s: s["start"]):
+        parent = s["parent_id"] if s["parent_id"] in ids else None
+        children.setdefault(parent, []).append(s)
+
+    print(f"\n🧵 Trace {trace_id} ({total_ms:.0f} ms, {len(spans)} spans)")
+
+    def show(s, depth):
+        offset_ms = (s["start"] - start) * 1000
+        lead = int(offset_ms / total_ms * BAR_WIDTH)
+        width = max(1, int(s["duration_ms"] / total_ms * BAR_WIDTH))
+        bar = " " * lead + "█" * min(width, BAR_WIDTH - lead)
+        label = ("  " * depth + s["name"])[:44]
+        status = " ❌" if s["status"] == "error" else ""
+        print(f"{label:<44} {s['service']:<11} {offset_ms:>8.0f} {s['duration_ms']:>8.0f}ms |{bar:<{BAR_WIDTH}}|{status}")
+        attributes = {k: v for k, v in s["attributes"].items() if v is not None}
+        if attributes:
+            print(" " * (2 * depth + 2) + json.dumps(attributes)[:160])
+        for child in children.get(s["span_id"], []):
+            show(child, depth + 1)
+
+    for root in children.get(None, []):
+        show(root, 0)
+
+
+def main():
+    settings = load_config()
+    parser = argparse.ArgumentParser(description="Show exported chat traces")
+    parser.add_argument("trace_id", nargs="?", help="Trace to show (a unique prefix is enough)")
+    parser.add_argument("--slow", action="store_true", help="Show the traces in the slow-request log")
+    parser.add_argument("--last", type=int, default=20, help="How many traces to list")
+    parser.add_argument("--file", default=os.path.join(BASE_DIR, settings.get("export_path", "logs/traces.jsonl")),
+                        help="Trace export file")
+    args = parser.parse_args()
+
+    traces = read_traces(args.file)
+    if args.slow:
+        slow_path = os.path.join(BASE_DIR, settings.get("slow_log_path", "logs/slow_traces.jsonl"))
+        slow = read_traces(slow_path)
+        if not slow:
+            print(f"No slow traces in {slow_path}")
+        for trace_id in list(slow)[-args.last:]:
+            # The export file also holds the spans other processes recorded for the trace
+            print_waterfall(trace_id, traces.get(trace_id) or slow[trace_id])
+        return
+
+    if not traces:
+        print(f"No traces in {args.file} (is tracing.enabled set in config/config.json?)")
+        return
+
+    if args.trace_id:
+        matches = [trace_id for trace_id in traces if trace_id.startswith(args.trace_id)]
+        if len(matches) != 1:
+            print(f"❌ {len(matches)} traces match '{args.trace_id}'")
+            return
+        print_waterfall(matches[0], traces[matches[0]])
+    else:
+        print_summary(traces, args.last)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
+from functools import wraps
 import json
 import ollama
-import re
 import sys
 import os
 
@@ -9,6 +9,17 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from mcp_client.client import MCPClient
+from chat_pipeline import profiling, tracing
+from chat_pipeline.answer_cache import SemanticAnswerCache
+from chat_pipeline.direct_answer import DirectAnswerPolicy
+from chat_pipeline.engine import ChatContext, ChatEngine, SyncDriver
+from chat_pipeline.health import HealthMonitor
+from chat_pipeline.models import ROLES, ModelRoles
+from chat_pipeline.prompts import PromptBuilder
+from chat_pipeline.residency import ResidencyManager
+from chat_pipeline.router import RulesRouter
+from chat_pipeline.scheduler import FairScheduler, PRIORITY_INTERACTIVE, PRIORITY_NAMES, QueueFullError
+from chat_pipeline.timings import TimingLog
 
 app = Flask(__name__)
 
@@ -16,259 +27,287 @@ app = Flask(__name__)
 mcp_client = None
 ollama_client = None
 config = None
-
-def extract_json_from_response(response_text):
-    """Extract JSON object from response text that may contain other content"""
-    try:
-        cleaned_text = re.sub(r'<Thinking>.*?</Thinking>', '', response_text, flags=re.DOTALL | re.IGNORECASE)
-        json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-        matches = re.findall(json_pattern, cleaned_text)
-        
-        for match in matches:
-            try:
-                parsed = json.loads(match)
-                if "tool_name" in parsed and "parameters" in parsed:
-                    return parsed
-            except json.JSONDecodeError:
-                continue
-        return None
-    except Exception:
-        return None
+model_roles = None
+rules_router = None
+health_monitor = None
+residency = None
+scheduler = None
+answer_cache = None
+direct_answers = None
+pipeline = None
+profiler = None
 
 def initialize_ai_components():
     """Initialize Ollama and MCP client"""
-    global mcp_client, ollama_client, config
+    global mcp_client, ollama_client, config, model_roles, rules_router, health_monitor, residency, scheduler, answer_cache, direct_answers, pipeline, profiler
     
     try:
         # Load configuration
         with open("config/config.json", "r") as f:
             config = json.load(f)
         
+        tracing.configure(config.get("tracing"), "web_app", os.path.dirname(os.path.abspath(__file__)))
+        profiler = profiling.configure(config.get("profiling"))
+        if profiler is not None:
+            register_profiling()
+        
         # Initialize MCP client
         mcp_client = MCPClient(config["mcp_server"]["host"])
         tools = mcp_client.get_tools()
         
-        # Initialize Ollama client
+        # Initialize rules pre-router
+        rules_router = RulesRouter(
+            [t["name"] for t in tools],
+            enabled=config.get("router", {}).get("rules_enabled", True)
+        )
+        
+        # Initialize Ollama client and the model used by each pipeline stage
         ollama_client = ollama.Client(host=config["ollama"]["host"])
+        model_roles = ModelRoles(config["ollama"])
+        
+        # Semantic cache of finished answers
+        answer_cache = SemanticAnswerCache(config.get("answer_cache"))
+        direct_answers = DirectAnswerPolicy(config.get("direct_answers"))
+        
+        # Admission control in front of Ollama
+        scheduler = FairScheduler.from_config(config.get("scheduler"))
+        
+        # Preload the model so the first chat does not pay the load time
+        answer_model = model_roles.model("answer")
+        residency = ResidencyManager(ollama_client, answer_model, config.get("residency"))
+        if not residency.preload():
+            raise Exception(f"Could not load model '{answer_model}' in Ollama")
+        residency.start()
+        preload_role_models()
+        
+        # One chat pipeline shared with the CLI and the ASGI app
+        engine = ChatEngine(
+            config, PromptBuilder(), model_roles, rules_router, direct_answers, answer_cache,
+            timing_log=TimingLog(config.get("timings"))
+        )
+        pipeline = SyncDriver(engine, ollama_client, mcp_client, scheduler, residency)
         
-        # Test connection
-        test_response = ollama_client.chat(
-            model=config["ollama"]["model"],
-            messages=[{"role": "user", "content": "Test"}],
-            options={"num_predict": 5}
+        # Start background health checks for /api/status
+        health_config = config.get("health", {})
+        health_monitor = HealthMonitor(
+            ollama_client,
+            mcp_client,
+            answer_model,
+            interval=health_config.get("interval", 10),
+            ttl=health_config.get("ttl", 30)
         )
+        health_monitor.start()
         
         print("✅ AI components initialized successfully!")
         print(f"✅ Connected to MCP server with {len(tools)} tools")
-        print(f"✅ Connected to Ollama with model: {config['ollama']['model']}")
+        print(f"✅ Connected to Ollama with models: {', '.join(f'{role}={model_roles.model(role)}' for role in ROLES)}")
         return True
         
     except Exception as e:
         print(f"❌ Failed to initialize AI components: {str(e)}")
         return False
 
+def preload_role_models():
+    """Load the models of the other roles (e.g. a small router) alongside the answer model"""
+    for model in model_roles.models():
+        if model == residency.model:
+            continue
+        try:
+            ollama_client.generate(model=model, prompt="", keep_alive=residency.keep_alive())
+            print(f"🔥 Model '{model}' resident")
+        except Exception as e:
+            print(f"⚠️ Failed to preload model '{model}': {str(e)}")
+
 @app.route('/')
 def index():
     """Serve the main chat interface"""
     return render_template('index.html')
 
+def parse_chat_request():
+    """Return the ChatContext of a chat request, or None if the message is missing"""
+    data = request.json or {}
+    user_message = data.get('message', '')
+    if not user_message:
+        return None
+    
+    print(f"💬 User message: {user_message}")
+    return ChatContext(
+        user_message,
+        session_id=data.get('sessionId') or request.remote_addr,
+        priority=PRIORITY_NAMES.get(data.get('priority'), PRIORITY_INTERACTIVE),
+        polish=bool(data.get('polish')),
+        traceparent=request.headers.get(tracing.TRACEPARENT_HEADER)
+    )
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat messages"""
     try:
-        data = request.json
-        user_message = data.get('message', '')
-        
-        if not user_message:
+        ctx = parse_chat_request()
+        if ctx is None:
             return jsonify({'error': 'No message provided'}), 400
         
-        print(f"💬 User message: {user_message}")
+        result = None
+        for event in pipeline.events(ctx):
+            if event['type'] == 'done':
+                result = event
         
-        # Get available tools
-        tools = mcp_client.get_tools()
-        tool_descriptions = "\n".join([f"- {t['name']}: {t['description']}" for t in tools])
-        
-        # Create prompt for tool decision
-        decision_prompt = f"""
-Available tools:
-{tool_descriptions}
+        response = {'content': result['content'], 'toolCalls': result['toolCalls'], 'timings': result['timings']}
+        if 'error' in result:
+            response['error'] = result['error']
+        if result.get('cached'):
+            response['cached'] = True
+        if result.get('direct'):
+            response['direct'] = True
+        if result.get('traceId'):
+            response['traceId'] = result['traceId']
+        return jsonify(response)
+    
+    except QueueFullError as e:
+        print(f"🚦 Request shed: {str(e)}")
+        return jsonify({'error': str(e), 'queueFull': True}), 503
+                
+    except Exception as e:
+        print(f"❌ Chat API error: {str(e)}")
+        return jsonify({'error': f'Failed to process request: {str(e)}'}), 500
 
-User query: {user_message}
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle chat messages, streaming pipeline events as NDJSON"""
+    ctx = parse_chat_request()
+    if ctx is None:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    def generate():
+        try:
+            for event in pipeline.events(ctx):
+                yield json.dumps(event) + "\n"
+        except QueueFullError as e:
+            print(f"🚦 Request shed: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': str(e), 'queueFull': True}) + "\n"
+        except Exception as e:
+            print(f"❌ Chat stream error: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': f'Failed to process request: {str(e)}'}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
-If this query needs a tool, respond with ONLY this JSON format:
-{{"tool_name": "exact_tool_name", "parameters": {{"param": "value"}}}}
+@app.route('/api/status')
+def status():
+    """Report system status from the cached health snapshot"""
+    snapshot = health_monitor.snapshot()
+    return jsonify(snapshot), 200 if snapshot['status'] == 'healthy' else 503
 
-If no tool is needed, respond with: NO_TOOL_NEEDED
+def is_admin():
+    admin_token = config.get("admin", {}).get("token")
+    return bool(admin_token) and request.headers.get('X-Admin-Token') == admin_token
 
-Examples:
-- "What's 5 + 3?" → {{"tool_name": "calculator", "parameters": {{"operation": "add", "a": 5, "b": 3}}}}
-- "Temperature in Pune" → {{"tool_name": "get_temperature", "parameters": {{"place_name": "Pune"}}}}
-- "Latest AI developments" → {{"tool_name": "gemini_web_search", "parameters": {{"query": "latest AI developments 2024"}}}}
-- "WTC 2025 final" → {{"tool_name": "gemini_web_search", "parameters": {{"query": "WTC 2025 final Australia South Africa"}}}}
-- "Hello" → NO_TOOL_NEEDED
+def admin_required(view):
+    """Only allow requests carrying the configured X-Admin-Token header"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
 
-Response:"""
+@app.route('/api/admin/cache', methods=['GET', 'POST'])
+@admin_required
+def admin_cache():
+    """Inspect the answer cache; POST {"enabled": bool, "clear": bool} to change it"""
+    if request.method == 'POST':
+        data = request.json or {}
+        if 'enabled' in data:
+            answer_cache.set_enabled(bool(data['enabled']))
+            print(f"💾 Answer cache {'enabled' if answer_cache.enabled else 'disabled'}")
+        if data.get('clear'):
+            answer_cache.clear()
+            print("💾 Answer cache cleared")
+    return jsonify(answer_cache.stats())
 
-        ollama_options = {
-            "temperature": config["ollama"]["temperature"],
-            "top_p": config["ollama"]["top_p"],
-            "top_k": config["ollama"]["top_k"],
-            "num_ctx": config["ollama"]["num_ctx"],
-            "num_predict": config["ollama"]["num_predict"]
-        }
-        
-        # Step 1: Ask AI to decide on tool usage
-        print("🔍 Asking AI for tool decision...")
-        decision_response = ollama_client.chat(
-            model=config["ollama"]["model"],
-            messages=[{"role": "user", "content": decision_prompt}],
-            options=ollama_options
-        )
-        
-        decision_content = decision_response["message"]["content"].strip()
-        print(f"🧠 AI decision: {decision_content}")
-        
-        # Step 2: Check if tool is needed
-        if "NO_TOOL_NEEDED" in decision_content.upper():
-            # Direct response without tools
-            print("💬 No tool needed, generating direct response...")
-            direct_prompt = f"User asked: {user_message}\n\nProvide a helpful, friendly answer:"
-            
-            direct_response = ollama_client.chat(
-                model=config["ollama"]["model"],
-                messages=[{"role": "user", "content": direct_prompt}],
-                options=ollama_options
-            )
-            
-            return jsonify({
-                'content': direct_response['message']['content'],
-                'toolCalls': []
-            })
-            
-        else:
-            # Try to extract tool call
-            tool_call = extract_json_from_response(decision_content)
-            
-            if tool_call:
-                print(f"🔧 Tool call extracted: {tool_call}")
-                try:
-                    # Step 3: Execute the tool via MCP
-                    print(f"🚀 Executing tool: {tool_call['tool_name']} with params: {tool_call['parameters']}")
-                    tool_result = mcp_client.execute_tool(
-                        tool_call["tool_name"], 
-                        tool_call["parameters"]
-                    )
-                    print(f"🔍 Tool result received: {len(tool_result)} characters")
-                    print(f"📄 Tool result preview: {tool_result[:200]}...")
-                    
-                    # Step 4: Generate final answer using tool result - IMPROVED PROMPT
-                    final_prompt = f"""
-The user asked: "{user_message}"
+@app.route('/api/queue')
+def queue_stats():
+    """Report scheduler load: active generations, queue depth and estimated wait"""
+    return jsonify(scheduler.stats())
 
-I used the {tool_call['tool_name']} tool and received this information:
+@app.route('/api/residency')
+def residency_metrics():
+    """Report model residency metrics (cold starts, load times, keep_alive)"""
+    return jsonify(residency.metrics())
 
-TOOL RESULT:
-{tool_result}
+@app.route('/api/router/stats')
+def router_stats():
+    """Report how often the rules router skipped the LLM decision call"""
+    return jsonify(rules_router.stats())
 
-IMPORTANT INSTRUCTIONS:
-1. Use ONLY the information from the tool result above to answer the user's question
-2. Do NOT ignore the tool result or say the information is unavailable
-3. If the tool result contains specific facts, dates, scores, or details, include them in your response
-4. Be conversational and helpful
-5. Summarize the key information from the tool result clearly
-6. If the tool result shows that an event has happened, report it as factual information
+def register_profiling():
+    """Admin-only profiling endpoints and the per-request cProfile hook (only when profiling is enabled)"""
+    @app.before_request
+    def start_request_profile():
+        if request.headers.get(profiling.PROFILE_HEADER) == '1' and is_admin():
+            try:
+                g.profile_id = profiler.start_request()
+            except Exception as e:
+                # cProfile is per process: a second concurrent profile would mix both requests
+                return jsonify({'error': str(e)}), 409
 
-Based on the tool result above, provide a complete and accurate answer to the user's question:"""
+    @app.after_request
+    def finish_request_profile(response):
+        profile_id = g.pop('profile_id', None)
+        if profile_id is not None:
+            response.headers[profiling.PROFILE_ID_HEADER] = profile_id
+            # After the body is sent, so streamed responses are profiled to the end
+            label = f"{request.method} {request.path}"
+            response.call_on_close(lambda: profiler.finish_request(profile_id, label))
+        return response
 
-                    print("🤖 Generating final response with tool result...")
-                    final_response = ollama_client.chat(
-                        model=config["ollama"]["model"],
-                        messages=[{"role": "user", "content": final_prompt}],
-                        options={
-                            **ollama_options,
-                            "temperature": 0.3,  # Lower temperature for more factual responses
-                            "num_predict": 500   # Allow longer responses
-                        }
-                    )
-                    
-                    final_content = final_response['message']['content']
-                    print(f"✅ Final response generated: {len(final_content)} characters")
-                    print(f"📝 Final response preview: {final_content[:200]}...")
-                    
-                    return jsonify({
-                        'content': final_content,
-                        'toolCalls': [{
-                            'name': tool_call['tool_name'],
-                            'parameters': tool_call['parameters'],
-                            'result': tool_result[:500] + "..." if len(tool_result) > 500 else tool_result
-                        }]
-                    })
-                    
-                except Exception as tool_error:
-                    print(f"❌ Tool execution error: {str(tool_error)}")
-                    # Fallback response
-                    fallback_prompt = f"User asked: {user_message}\n\nI encountered an error while trying to get current information: {str(tool_error)}\n\nPlease provide a helpful response explaining this limitation and suggest alternative ways to find the information:"
-                    
-                    fallback_response = ollama_client.chat(
-                        model=config["ollama"]["model"],
-                        messages=[{"role": "user", "content": fallback_prompt}],
-                        options=ollama_options
-                    )
-                    
-                    return jsonify({
-                        'content': fallback_response['message']['content'],
-                        'toolCalls': [],
-                        'error': f'Tool execution failed: {str(tool_error)}'
-                    })
-                    
-            else:
-                print("⚠️ Could not extract tool call, providing direct response...")
-                # Fallback to direct response
-                direct_prompt = f"User asked: {user_message}\n\nProvide a helpful answer:"
-                
-                direct_response = ollama_client.chat(
-                    model=config["ollama"]["model"],
-                    messages=[{"role": "user", "content": direct_prompt}],
-                    options=ollama_options
-                )
-                
-                return jsonify({
-                    'content': direct_response['message']['content'],
-                    'toolCalls': []
-                })
-                
-    except Exception as e:
-        print(f"❌ Chat API error: {str(e)}")
-        return jsonify({'error': f'Failed to process request: {str(e)}'}), 500
+    @app.teardown_request
+    def cleanup_request_profile(error):
+        # Still set only if after_request never ran (e.g. the view raised in debug mode)
+        profile_id = g.pop('profile_id', None)
+        if profile_id is not None:
+            profiler.finish_request(profile_id, f"{request.method} {request.path}")
 
-@app.route('/api/status')
-def status():
-    """Check system status"""
-    try:
-        # Check MCP server
-        tools = mcp_client.get_tools()
-        print(f"📡 Fetched {len(tools)} tools from MCP server")
-        
-        # Check Ollama
-        test_response = ollama_client.chat(
-            model=config["ollama"]["model"],
-            messages=[{"role": "user", "content": "Test"}],
-            options={"num_predict": 5}
-        )
-        
-        return jsonify({
-            'status': 'healthy',
-            'mcp_server': 'connected',
-            'ollama': 'connected',
-            'model': config["ollama"]["model"],
-            'tools_available': len(tools)
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'error': str(e)
-        }), 500
+    @app.route('/api/admin/profile/cpu')
+    @admin_required
+    def profile_cpu():
+        """Sample all threads for ?seconds=N; ?format=collapsed returns flamegraph input as text"""
+        try:
+            result = profiler.sample(request.args.get('seconds', 10, type=float),
+                                     request.args.get('interval_ms', type=float))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 409
+        if request.args.get('format') == 'collapsed':
+            return Response(result['collapsed'] + "\n", mimetype='text/plain')
+        return jsonify(result)
+
+    @app.route('/api/admin/profile/requests/<profile_id>')
+    @admin_required
+    def profile_request(profile_id):
+        """pstats report of a request profiled with the X-Profile header"""
+        try:
+            report = profiler.request_report(profile_id, request.args.get('sort', 'cumulative'),
+                                             request.args.get('limit', 40, type=int))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 404
+        return Response(report, mimetype='text/plain')
+
+    @app.route('/api/admin/profile/memory', methods=['GET', 'POST'])
+    @admin_required
+    def profile_memory():
+        """POST {"action": "start"|"stop"}; GET a snapshot of the top allocations (?diff=1 for growth since the last one)"""
+        if request.method == 'POST':
+            action = (request.json or {}).get('action')
+            if action == 'start':
+                return jsonify(profiler.memory_start((request.json or {}).get('frames')))
+            if action == 'stop':
+                return jsonify(profiler.memory_stop())
+            return jsonify({'error': 'action must be "start" or "stop"'}), 400
+        try:
+            return jsonify(profiler.memory_snapshot(request.args.get('limit', 20, type=int),
+                                                    request.args.get('group_by', 'lineno'),
+                                                    request.args.get('diff') == '1'))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 409
 
 if __name__ == '__main__':
     print("🚀 Starting AI Web Interface...")